@@ -0,0 +1,49 @@
+"""
+Compare the rows/sec of the JSON codecs on the test fixtures, for decoding pages of results
+and encoding upsert payloads.
+
+    $ pip install . && python benchmarks/bench_codec.py
+"""
+
+import os
+import timeit
+
+from sodapy.codec import CODECS
+
+TEST_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "tests", "test_data"
+)
+FIXTURES = ["bike_counts_page_1.json", "get_songs.txt", "get_songs_unicode.txt"]
+
+
+def load_fixtures():
+    pages = []
+    for name in FIXTURES:
+        with open(os.path.join(TEST_DATA_PATH, name), "rb") as infile:
+            pages.append(infile.read())
+    return pages
+
+
+def rows_per_second(func, rows, repeat=5, number=20):
+    best = min(timeit.repeat(func, repeat=repeat, number=number))
+    return rows * number / best
+
+
+def main():
+    pages = load_fixtures()
+    print("{:<10} {:>16} {:>16}".format("codec", "decode rows/s", "encode rows/s"))
+    for name, codec_class in sorted(CODECS.items()):
+        try:
+            codec = codec_class()
+        except ImportError:
+            print("{:<10} {:>16}".format(name, "not installed"))
+            continue
+        decoded = [codec.loads(page) for page in pages]
+        rows = sum(len(page) for page in decoded)
+        decode = rows_per_second(lambda: [codec.loads(page) for page in pages], rows)
+        encode = rows_per_second(lambda: [codec.dumps(page) for page in decoded], rows)
+        print("{:<10} {:>16,.0f} {:>16,.0f}".format(name, decode, encode))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure how long `import sodapy` and the first use of the client take, as reported by
+`python -X importtime`. Exits with an error if the cost of `import sodapy` exceeds the
+budget, so that it can be run in CI to catch import-time regressions.
+
+    $ python benchmarks/bench_import.py --budget-ms 20
+"""
+
+import argparse
+import subprocess
+import sys
+
+STATEMENTS = [
+    "import sodapy",
+    "from sodapy import Socrata",
+]
+
+
+def top_level_imports(statement):
+    """
+    Run `statement` in a fresh interpreter and return the cumulative import time, in
+    microseconds, of every module it imported directly.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        # nested imports are indented, and already part of their parent's time
+        if not name[1:].startswith(" "):
+            timings[name.strip()] = int(cumulative)
+    return timings
+
+
+def import_time_us(statement):
+    """
+    Return the time `statement` spends importing modules, leaving out the modules that
+    the interpreter imports at startup.
+    """
+    startup = top_level_imports("pass")
+    timings = top_level_imports(statement)
+    return sum(us for name, us in timings.items() if name not in startup)
+
+
+def best_of(statement, runs):
+    return min(import_time_us(statement) for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms", type=float, help="fail if `import sodapy` takes longer than this"
+    )
+    args = parser.parse_args()
+
+    timings = {statement: best_of(statement, args.runs) for statement in STATEMENTS}
+    for statement, microseconds in timings.items():
+        print("{:<30} {:>8.1f} ms".format(statement, microseconds / 1000))
+
+    if args.budget_ms is not None and timings[STATEMENTS[0]] / 1000 > args.budget_ms:
+        print(
+            "`import sodapy` exceeds the budget of {} ms".format(args.budget_ms),
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
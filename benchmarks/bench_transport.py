@@ -0,0 +1,195 @@
+"""
+Compare the transports on many concurrent requests to local test servers: requests over
+HTTP/1.1, and httpx over HTTP/2, where all requests share one connection. The servers wait
+for --latency-ms before answering each request, to stand in for a remote API.
+
+    $ pip install . httpx[http2] && python benchmarks/bench_transport.py
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import socketserver
+import threading
+import time
+
+from sodapy import Socrata
+from sodapy.transport import HttpxTransport, RequestsTransport
+
+TEST_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "tests", "test_data"
+)
+HEADERS = [("content-type", "application/json; charset=utf-8")]
+
+
+def load_body():
+    with open(os.path.join(TEST_DATA_PATH, "bike_counts_page_1.json"), "rb") as infile:
+        return infile.read()
+
+
+class HTTP1Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, body, latency):
+        self.body = body
+        self.latency = latency
+        self.connections = 0
+        super().__init__(("127.0.0.1", 0), HTTP1Handler)
+
+
+class HTTP1Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        for name, value in HEADERS:
+            self.send_header(name, value)
+        self.send_header("content-length", str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTP2Server(socketserver.ThreadingTCPServer):
+    """
+    A cleartext HTTP/2 server, answering every stream from its own thread so that
+    requests on the same connection are served concurrently.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, body, latency):
+        self.body = body
+        self.latency = latency
+        self.connections = 0
+        super().__init__(("127.0.0.1", 0), HTTP2Handler)
+
+
+class HTTP2Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        self.server.connections += 1
+        config = h2.config.H2Configuration(client_side=False)
+        self.connection = h2.connection.H2Connection(config=config)
+        self.lock = threading.Lock()
+        self.window_open = threading.Condition(self.lock)
+        with self.lock:
+            self.connection.initiate_connection()
+            self.flush()
+
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            with self.lock:
+                events = self.connection.receive_data(data)
+                self.flush()
+                for event in events:
+                    if isinstance(event, h2.events.RequestReceived):
+                        threading.Thread(
+                            target=self.respond, args=(event.stream_id,), daemon=True
+                        ).start()
+                    elif isinstance(event, h2.events.WindowUpdated):
+                        self.window_open.notify_all()
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+
+    def respond(self, stream_id):
+        time.sleep(self.server.latency)
+        body = self.server.body
+        with self.lock:
+            headers = [(":status", "200")] + HEADERS
+            headers.append(("content-length", str(len(body))))
+            self.connection.send_headers(stream_id, headers)
+            while body:
+                size = min(
+                    self.connection.local_flow_control_window(stream_id),
+                    self.connection.max_outbound_frame_size,
+                    len(body),
+                )
+                if size <= 0:
+                    self.window_open.wait()
+                    continue
+                self.connection.send_data(stream_id, body[:size])
+                body = body[size:]
+                self.flush()
+            self.connection.end_stream(stream_id)
+            self.flush()
+
+    def flush(self):
+        try:
+            self.request.sendall(self.connection.data_to_send())
+        except OSError:
+            pass
+
+
+def run(server_class, transport, body, args):
+    server = server_class(body, args.latency_ms / 1000.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    client = Socrata("{}:{}".format(host, port), "FakeAppToken", transport=transport)
+    client.uri_prefix = "http://"
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        pages = list(executor.map(lambda _: client.get("bench"), range(args.requests)))
+    elapsed = time.monotonic() - started
+
+    client.close()
+    server.shutdown()
+    server.server_close()
+    assert all(len(page) == 1000 for page in pages)
+    return elapsed, server.connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+    body = load_body()
+
+    transports = [("requests http/1.1", HTTP1Server, RequestsTransport)]
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+
+        transports.append(
+            (
+                "httpx http/2",
+                HTTP2Server,
+                lambda: HttpxTransport(http1=False, http2=True),
+            )
+        )
+    except ImportError:
+        print("httpx http/2: not installed, run pip install httpx[http2]")
+
+    print(
+        "{:<18} {:>10} {:>12} {:>12}".format(
+            "transport", "seconds", "requests/s", "connections"
+        )
+    )
+    for name, server_class, make_transport in transports:
+        elapsed, connections = run(server_class, make_transport(), body, args)
+        print(
+            "{:<18} {:>10.2f} {:>12,.0f} {:>12}".format(
+                name, elapsed, args.requests / elapsed, connections
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
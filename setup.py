@@ -24,6 +24,12 @@ kwargs = {
     "maintainer_email": "hi@xmunoz.com",
     "license": "MIT",
     "install_requires": required,
+    "extras_require": {
+        "orjson": ["orjson>=3.0"],
+        "zstd": ["zstandard>=0.15"],
+        "http2": ["httpx[http2]>=0.23"],
+    },
+    "entry_points": {"console_scripts": ["sodapy = sodapy.cli:main"]},
     "url": "https://github.com/xmunoz/sodapy",
     "download_url": "https://github.com/xmunoz/sodapy/archive/master.tar.gz",
     "keywords": "soda socrata opendata api",
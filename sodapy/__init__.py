@@ -1,7 +1,56 @@
-from sodapy.socrata import Socrata
+import importlib
+import sys
+
 from sodapy import version
 
 __all__ = [
     "Socrata",
+    "PageSizeTuner",
+    "SocrataPool",
+    "LocalMirror",
+    "PageStore",
+    "MemoryProfiler",
+    "Tracer",
+    "CatalogIndex",
+    "UpsertOutbox",
 ]
 __version__ = version.__version__
+
+# Public names and the modules that define them. These modules pull in requests, which is
+# slow to import, so they are only loaded once one of their names is first used.
+_LAZY_ATTRIBUTES = {
+    "Socrata": "sodapy.socrata",
+    "PageSizeTuner": "sodapy.tuning",
+    "SocrataPool": "sodapy.pool",
+    "LocalMirror": "sodapy.mirror",
+    "PageStore": "sodapy.pagestore",
+    "MemoryProfiler": "sodapy.profiling",
+    "Tracer": "sodapy.tracing",
+    "CatalogIndex": "sodapy.catalog",
+    "UpsertOutbox": "sodapy.outbox",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module 'sodapy' has no attribute {!r}".format(name))
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
+
+
+# module-level __getattr__ is only supported from python 3.7 on
+if sys.version_info < (3, 7):
+    from sodapy.socrata import Socrata  # noqa: F401,E402
+    from sodapy.tuning import PageSizeTuner  # noqa: F401,E402
+    from sodapy.pool import SocrataPool  # noqa: F401,E402
+    from sodapy.mirror import LocalMirror  # noqa: F401,E402
+    from sodapy.pagestore import PageStore  # noqa: F401,E402
+    from sodapy.profiling import MemoryProfiler  # noqa: F401,E402
+    from sodapy.tracing import Tracer  # noqa: F401,E402
+    from sodapy.catalog import CatalogIndex  # noqa: F401,E402
+    from sodapy.outbox import UpsertOutbox  # noqa: F401,E402
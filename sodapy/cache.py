@@ -0,0 +1,65 @@
+from collections import namedtuple
+from email.utils import formatdate
+import threading
+import time
+
+CacheEntry = namedtuple("CacheEntry", ["value", "validators", "fetched_at"])
+
+
+class MetadataCache:
+    """
+    Thread-safe store of dataset metadata, along with what is needed to revalidate it: the
+    ETag and Last-Modified headers it was served with, or failing those, the latest
+    modification time of the dataset's rows and view.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def store(self, key, value, headers):
+        validators = {}
+        if headers.get("etag"):
+            validators["If-None-Match"] = headers["etag"]
+        if headers.get("last-modified"):
+            validators["If-Modified-Since"] = headers["last-modified"]
+        elif isinstance(value, dict):
+            # rows can change without the view, and the rows are what dataset versions
+            # are based on, so the validator is the later of both modification times
+            modified = max(
+                [
+                    value[field]
+                    for field in ("rowsUpdatedAt", "viewLastModified")
+                    if isinstance(value.get(field), (int, float))
+                ],
+                default=None,
+            )
+            if modified is not None:
+                validators["If-Modified-Since"] = formatdate(modified, usegmt=True)
+        with self._lock:
+            self._entries[key] = CacheEntry(value, validators, time.monotonic())
+
+    def touch(self, key):
+        """
+        Mark an entry as fresh, after the server confirmed it has not changed.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = entry._replace(fetched_at=time.monotonic())
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def is_fresh(entry, max_age):
+        return time.monotonic() - entry.fetched_at < max_age
@@ -0,0 +1,322 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from sodapy.soql import UnsupportedQuery
+
+ASSETS_TABLE = "sodapy_assets"
+TERMS_TABLE = "sodapy_terms"
+STATE_TABLE = "sodapy_state"
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+# datasets() filters answered by the index: filter name, indexed field, and whether an
+# asset must match all of the values rather than any of them
+FILTERS = {
+    "ids": ("id", False),
+    "tags": ("tag", False),
+    "categories": ("category", False),
+    "only": ("type", False),
+    "column_names": ("column", True),
+    "for_user": ("owner", False),
+}
+ORDERS = {
+    "name": "name",
+    "updatedat": "updated_at",
+    "createdat": "created_at",
+}
+
+
+def words(text):
+    return WORD.findall(text.lower()) if text else []
+
+
+def asset_terms(result):
+    """
+    Return the (field, term) pairs an asset of the catalog is indexed on.
+    """
+    resource = result.get("resource", {})
+    classification = result.get("classification", {})
+    owner = result.get("owner", {})
+    tags = (classification.get("tags") or []) + (
+        classification.get("domain_tags") or []
+    )
+    categories = list(classification.get("categories") or [])
+    if classification.get("domain_category"):
+        categories.append(classification["domain_category"])
+    columns = (resource.get("columns_field_name") or []) + (
+        resource.get("columns_name") or []
+    )
+
+    terms = set([("id", resource.get("id")), ("type", resource.get("type"))])
+    terms.update(("tag", tag.lower()) for tag in tags)
+    terms.update(("category", category.lower()) for category in categories)
+    terms.update(("column", column.lower()) for column in columns)
+    terms.add(("owner", owner.get("id")))
+    terms.update(("name", word) for word in words(resource.get("name")))
+    for text in (
+        [
+            resource.get("name"),
+            resource.get("description"),
+            resource.get("attribution"),
+            owner.get("display_name"),
+        ]
+        + tags
+        + categories
+        + columns
+    ):
+        terms.update(("text", word) for word in words(text))
+    return [(field, term) for field, term in terms if term]
+
+
+def prefix_range(word):
+    """
+    Return the bounds of the terms starting with `word`.
+    """
+    return word, word[:-1] + chr(ord(word[-1]) + 1)
+
+
+class CatalogIndex:
+    """
+    A local copy of the catalog of a domain in an SQLite file, which answers datasets()
+    calls in milliseconds instead of going to the discovery API. Sample usage:
+        catalog = CatalogIndex(client, "catalog.db")
+        catalog.refresh()
+        catalog.datasets(q="building permits", tags=["construction"])
+
+    Assets are indexed on the words of their names, descriptions, columns, tags,
+    categories and owners. The ids, tags, categories, only, column_names, for_user and q
+    filters are answered locally, as well as orders on name, updatedAt and createdAt.
+    Words of `q` match the words that start with them, and assets must match all of
+    them. Other filters, or calls on an index that was never loaded, are sent to the API
+    through the client.
+
+        client: the Socrata client used to load the catalog and for fallback queries
+        path: the SQLite file to store the index in
+    """
+
+    def __init__(self, client, path):
+        self.client = client
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        db = self._connection
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS {} (id TEXT PRIMARY KEY, name TEXT,"
+            " updated_at TEXT, created_at TEXT, result TEXT)".format(ASSETS_TABLE)
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS {} (field TEXT, term TEXT, id TEXT)".format(
+                TERMS_TABLE
+            )
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS sodapy_terms_term ON {} (field, term)".format(
+                TERMS_TABLE
+            )
+        )
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS sodapy_terms_id ON {} (id)".format(TERMS_TABLE)
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, value)".format(
+                STATE_TABLE
+            )
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM {}".format(ASSETS_TABLE)
+            ).fetchone()[0]
+
+    def _state(self, key):
+        row = self._connection.execute(
+            "SELECT value FROM {} WHERE key = ?".format(STATE_TABLE), [key]
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_loaded(self):
+        with self._lock:
+            return self._state("updated_at") is not None
+
+    def refresh(self, full=False, page_size=1000, **kwargs):
+        """
+        Bring the index up to date. Assets are read from the most recently updated one,
+        until reaching those that were not updated since the last refresh. Assets that
+        were deleted or made private are only removed by a full refresh, which reads the
+        whole catalog. Keyword arguments are passed to datasets(), e.g. to only index
+        some types of assets. Returns the number of assets added or updated.
+        """
+        with self._lock:
+            since = None if full else self._state("updated_at")
+        latest = since
+        seen = set()
+        count = 0
+        offset = 0
+
+        with self._lock:
+            db = self._connection
+            db.execute("BEGIN")
+            try:
+                while True:
+                    results = self.client.datasets(
+                        limit=page_size, offset=offset, order="updatedAt DESC", **kwargs
+                    )
+                    done = len(results) < page_size
+                    for result in results:
+                        updated_at = result.get("resource", {}).get("updatedAt")
+                        if since is not None and updated_at and updated_at < since:
+                            done = True
+                            break
+                        seen.add(self._store(result))
+                        count += 1
+                        if updated_at and (latest is None or updated_at > latest):
+                            latest = updated_at
+                    if done:
+                        break
+                    offset += len(results)
+
+                if since is None:
+                    stale = [
+                        asset_id
+                        for (asset_id,) in db.execute(
+                            "SELECT id FROM {}".format(ASSETS_TABLE)
+                        )
+                        if asset_id not in seen
+                    ]
+                    for asset_id in stale:
+                        self._delete(asset_id)
+                db.execute(
+                    "INSERT OR REPLACE INTO {} VALUES ('updated_at', ?)".format(
+                        STATE_TABLE
+                    ),
+                    [latest or ""],
+                )
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        return count
+
+    def _store(self, result):
+        resource = result.get("resource", {})
+        asset_id = resource["id"]
+        self._delete(asset_id)
+        self._connection.execute(
+            "INSERT INTO {} VALUES (?, ?, ?, ?, ?)".format(ASSETS_TABLE),
+            [
+                asset_id,
+                resource.get("name"),
+                resource.get("updatedAt"),
+                resource.get("createdAt"),
+                json.dumps(result),
+            ],
+        )
+        self._connection.executemany(
+            "INSERT INTO {} VALUES (?, ?, ?)".format(TERMS_TABLE),
+            [(field, term, asset_id) for field, term in asset_terms(result)],
+        )
+        return asset_id
+
+    def _delete(self, asset_id):
+        for table in (ASSETS_TABLE, TERMS_TABLE):
+            self._connection.execute(
+                "DELETE FROM {} WHERE id = ?".format(table), [asset_id]
+            )
+
+    def datasets(self, limit=0, offset=0, order=None, **kwargs):
+        """
+        Same as Socrata.datasets(), answered locally when possible.
+        """
+        if self.is_loaded():
+            try:
+                sql, params = self.translate(limit, offset, order, **kwargs)
+            except UnsupportedQuery as e:
+                logging.debug("Querying the API instead of the catalog index: %s", e)
+            else:
+                with self._lock:
+                    rows = self._connection.execute(sql, params).fetchall()
+                return [json.loads(result) for (result,) in rows]
+        return self.client.datasets(limit=limit, offset=offset, order=order, **kwargs)
+
+    def translate(self, limit=0, offset=0, order=None, **kwargs):
+        """
+        Translate the arguments of a datasets() call to an SQL query and its parameters.
+        Raises UnsupportedQuery if they cannot be answered locally.
+        """
+        conditions = []
+        params = []
+        subquery = "id IN (SELECT id FROM {} WHERE field = ? AND {})".format(
+            TERMS_TABLE, "{}"
+        )
+        for name, values in kwargs.items():
+            if name == "q":
+                continue
+            if name not in FILTERS:
+                raise UnsupportedQuery("Unsupported filter {}".format(name))
+            field, match_all = FILTERS[name]
+            if isinstance(values, str):
+                values = [values]
+            values = [
+                str(value) if field == "id" else str(value).lower() for value in values
+            ]
+            if match_all:
+                for value in values:
+                    conditions.append(subquery.format("term = ?"))
+                    params.extend([field, value])
+            else:
+                conditions.append(
+                    subquery.format(
+                        "term IN ({})".format(", ".join("?" for _ in values))
+                    )
+                )
+                params.extend([field] + values)
+
+        query_words = words(kwargs.get("q"))
+        for word in query_words:
+            conditions.append(subquery.format("term >= ? AND term < ?"))
+            params.extend(["text"] + list(prefix_range(word)))
+
+        sql = "SELECT result FROM {}".format(ASSETS_TABLE)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        orders = []
+        if order:
+            parts = order.split()
+            column = ORDERS.get(parts[0].lower())
+            direction = parts[1].upper() if len(parts) == 2 else "ASC"
+            if column is None or len(parts) > 2 or direction not in ("ASC", "DESC"):
+                raise UnsupportedQuery("Unsupported order {}".format(order))
+            orders.append("{} {}".format(column, direction))
+        elif query_words:
+            # like relevance, rank assets by how many of the words are in their names
+            in_name = (
+                "EXISTS (SELECT 1 FROM {} AS t WHERE t.id = {}.id AND t.field = 'name'"
+                " AND t.term >= ? AND t.term < ?)".format(TERMS_TABLE, ASSETS_TABLE)
+            )
+            orders.append("({}) DESC".format(" + ".join(in_name for _ in query_words)))
+            for word in query_words:
+                params.extend(prefix_range(word))
+        orders.append("updated_at DESC")
+        sql += " ORDER BY " + ", ".join(orders)
+
+        sql += " LIMIT {:d}".format(int(limit) if limit else -1)
+        if offset:
+            sql += " OFFSET {:d}".format(int(offset))
+        return sql, params
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+
+from sodapy.soql import canonical_params
+
+
+def query_fingerprint(domain, dataset_identifier, content_type, params):
+    """
+    Hash everything that determines which rows a paginated query returns. Paging parameters
+    are left out, so the fingerprint stays the same from one page to the next, and SoQL
+    clauses are canonicalized, so that equivalent spellings of a query can resume it.
+    """
+    query = canonical_params(
+        {k: v for k, v in params.items() if k not in ("offset", "limit")}
+    )
+    key = json.dumps(
+        [domain, dataset_identifier, content_type, query], sort_keys=True, default=str
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """
+    Progress of a paginated extraction, persisted to a JSON file after every page so that an
+    interrupted get_all() can pick up where it left off. `data` is a dict of JSON values
+    saved along with the progress, such as the size of the file the rows are written to.
+    """
+
+    def __init__(self, path, fingerprint=None, version=None):
+        self.path = os.path.expanduser(path)
+        self.fingerprint = fingerprint
+        self.version = version
+        self.offset = None
+        self.rows = 0
+        self.pages = 0
+        self.data = {}
+
+    def load(self):
+        """
+        Restore progress from disk. Returns False if there is nothing to resume.
+
+        Raises an exception if the checkpoint was written for a different query, or if the
+        dataset was modified since.
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path) as infile:
+            state = json.load(infile)
+
+        if state["fingerprint"] != self.fingerprint:
+            raise Exception(
+                "Checkpoint {} was written for a different query. Remove it to start"
+                " over.".format(self.path)
+            )
+        if state["version"] != self.version:
+            raise Exception(
+                "The dataset was modified since checkpoint {} was written. Remove it to"
+                " start over.".format(self.path)
+            )
+
+        self.offset = state["offset"]
+        self.rows = state["rows"]
+        self.pages = state["pages"]
+        self.data = state.get("data", {})
+        return True
+
+    def read_data(self):
+        """
+        Return the data saved with the checkpoint on disk, whatever query it was written
+        for, or None if there is no checkpoint.
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as infile:
+            return json.load(infile).get("data", {})
+
+    def save(self, offset, rows):
+        """
+        Record a page as committed. The file is replaced atomically, so a crash mid-write
+        leaves the previous checkpoint intact.
+        """
+        self.offset = offset
+        self.rows += rows
+        self.pages += 1
+        state = {
+            "fingerprint": self.fingerprint,
+            "version": self.version,
+            "offset": self.offset,
+            "rows": self.rows,
+            "pages": self.pages,
+            "data": self.data,
+        }
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, "w") as outfile:
+            json.dump(state, outfile)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """
+        Remove the checkpoint once the extraction has completed.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,652 @@
+"""
+The sodapy command line tool, to export, import and sync the rows of a dataset, and to
+search the catalog of a domain. Run `sodapy --help`, or `python -m sodapy --help`.
+"""
+
+import argparse
+import bz2
+import codecs
+from contextlib import contextmanager
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+import sys
+import time
+
+from sodapy.catalog import CatalogIndex
+from sodapy.checkpoint import Checkpoint
+from sodapy.profiling import format_size
+from sodapy.socrata import Socrata
+import sodapy.utils as utils
+
+# compression name: (file extension, open function)
+COMPRESSIONS = {
+    "gzip": (".gz", gzip.open),
+    "bz2": (".bz2", bz2.open),
+    "xz": (".xz", lzma.open),
+}
+FORMATS = {
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".json": "json",
+    ".csv": "csv",
+}
+
+
+class Progress:
+    """
+    Prints the number of rows and bytes processed so far, and the throughput, to a stream
+    (stderr by default), at most once every `interval` seconds and once more on finish().
+    update() has the signature of the progress callbacks of upsert() and replace().
+    """
+
+    def __init__(self, action, stream=None, interval=1.0, quiet=False):
+        self.action = action
+        self.stream = stream
+        self.interval = interval
+        self.quiet = quiet
+        self.rows = 0
+        self.bytes = 0
+        self.started = self._reported = time.monotonic()
+
+    def update(self, nbytes, rows):
+        self.bytes = nbytes
+        self.rows = rows
+        now = time.monotonic()
+        if now - self._reported >= self.interval:
+            self._reported = now
+            self._report(now)
+
+    def add(self, nbytes, rows):
+        self.update(self.bytes + nbytes, self.rows + rows)
+
+    def finish(self):
+        self._report(time.monotonic())
+
+    def _report(self, now):
+        if self.quiet:
+            return
+        elapsed = max(now - self.started, 1e-6)
+        stream = self.stream or sys.stderr
+        stream.write(
+            "{}: {:,} rows, {} in {:.1f}s ({:,.0f} rows/s, {}/s)\n".format(
+                self.action,
+                self.rows,
+                format_size(self.bytes),
+                elapsed,
+                self.rows / elapsed,
+                format_size(self.bytes / elapsed),
+            )
+        )
+        stream.flush()
+
+
+def file_compression(path, compression="auto"):
+    """
+    Return the name of the compression of a file, or None. For "auto", it is guessed from
+    the extension of the file.
+    """
+    if compression == "none":
+        return None
+    if compression != "auto":
+        return compression
+    for name, (extension, _) in COMPRESSIONS.items():
+        if path.endswith(extension):
+            return name
+    return None
+
+
+def file_format(path, data_format=None, default=None):
+    """
+    Return the format of a file of rows, guessed from its extension unless given. Files
+    with an unknown extension have the `default` format, if any.
+    """
+    if data_format:
+        return data_format
+    compression = file_compression(path)
+    if compression:
+        path = path[: -len(COMPRESSIONS[compression][0])]
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        if default is not None:
+            return default
+        raise Exception(
+            "Cannot tell the format of {} from its extension. Pass --format.".format(
+                path
+            )
+        )
+    return FORMATS[extension]
+
+
+@contextmanager
+def open_file(path, mode, compression=None):
+    """
+    Open a file in binary mode, or stdin or stdout for "-", through `compression`. The
+    standard streams are not closed.
+    """
+    if path == "-":
+        stream = sys.stdin.buffer if "r" in mode else sys.stdout.buffer
+        if compression is None:
+            yield stream
+            stream.flush()
+            return
+        fileobj = COMPRESSIONS[compression][1](stream, mode)
+    elif compression is None:
+        fileobj = open(path, mode)
+    else:
+        fileobj = COMPRESSIONS[compression][1](path, mode)
+    with fileobj:
+        yield fileobj
+
+
+class NdjsonWriter:
+    """
+    Writes rows as newline-delimited JSON. write() and close() return the number of bytes
+    written.
+    """
+
+    def __init__(self, outfile, dumps):
+        self.outfile = outfile
+        self.dumps = dumps
+
+    def write(self, rows):
+        data = b"".join(self.dumps(row) + b"\n" for row in rows)
+        self.outfile.write(data)
+        return len(data)
+
+    def close(self):
+        return 0
+
+
+class JsonWriter(NdjsonWriter):
+    """
+    Writes rows as a JSON array, with one row per line.
+    """
+
+    def __init__(self, outfile, dumps):
+        super().__init__(outfile, dumps)
+        self.separator = b"[\n"
+
+    def write(self, rows):
+        data = b"".join(self._rows(rows))
+        self.outfile.write(data)
+        return len(data)
+
+    def _rows(self, rows):
+        for row in rows:
+            yield self.separator
+            yield self.dumps(row)
+            self.separator = b",\n"
+
+    def close(self):
+        data = b"[]\n" if self.separator == b"[\n" else b"\n]\n"
+        self.outfile.write(data)
+        return len(data)
+
+
+class CsvWriter:
+    """
+    Writes rows as CSV, with nested values such as locations encoded as JSON. The columns
+    are the given ones, followed by the other fields of the first rows written unless
+    `add_columns` is false.
+    """
+
+    def __init__(self, outfile, columns=None, header=True, add_columns=True):
+        self.outfile = outfile
+        self.columns = list(columns or [])
+        self.header = header
+        self.add_columns = add_columns
+        self._writer = None
+        self._buffer = io.StringIO()
+
+    def write(self, rows):
+        if self._writer is None and self.add_columns:
+            for row in rows:
+                for name in row:
+                    if name not in self.columns:
+                        self.columns.append(name)
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._buffer, self.columns)
+            if self.header:
+                self._writer.writeheader()
+        for row in rows:
+            try:
+                self._writer.writerow(
+                    {name: self._format(value) for name, value in row.items()}
+                )
+            except ValueError:
+                raise Exception(
+                    "Row has fields that are not in the CSV header {}: {}".format(
+                        self.columns, row
+                    )
+                )
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self.outfile.write(data)
+        return len(data)
+
+    @staticmethod
+    def _format(value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        return value
+
+    def close(self):
+        return 0
+
+
+def read_rows(infile, data_format):
+    """
+    Return an iterable of the rows of a binary file in the given format.
+    """
+    text = codecs.getreader("utf-8-sig")(infile)
+    if data_format == "ndjson":
+        return utils.read_ndjson(text)
+    if data_format == "csv":
+        # the API leaves out empty fields, rather than returning empty strings
+        return (
+            {name: value for name, value in row.items() if value != ""}
+            for row in csv.DictReader(text)
+        )
+    rows = json.load(text)
+    return [rows] if isinstance(rows, dict) else rows
+
+
+def export_rows(client, args):
+    page_size = args.page_size or Socrata.DEFAULT_LIMIT
+    query = {"limit": page_size}
+    for name in ("select", "where", "order", "q"):
+        if getattr(args, name) is not None:
+            query[name] = getattr(args, name)
+
+    checkpoint = resume_size = None
+    if args.resume is not None:
+        checkpoint = Checkpoint(args.resume)
+        resume_size = resume_output_size(checkpoint, args.output)
+
+    if args.partitions:
+        rows = client.get_partitioned(
+            args.dataset,
+            args.partition_column,
+            partitions=args.partitions,
+            max_workers=args.workers,
+            **query
+        )
+    else:
+        rows = client.get_all(
+            args.dataset,
+            checkpoint=checkpoint,
+            prefetch=args.prefetch,
+            adaptive=args.adaptive,
+            decode_executor=args.decode_processes,
+            **query
+        )
+
+    data_format = file_format(args.output, args.format, default="ndjson")
+    compression = file_compression(args.output, args.compress)
+    mode = "wb" if resume_size is None else "r+b"
+
+    progress = Progress("export", quiet=args.quiet)
+    with open_file(args.output, mode, compression) as outfile:
+        if data_format == "csv":
+            columns = None
+            if resume_size is not None:
+                columns = csv_header(outfile)
+            elif args.select is None:
+                metadata = client.get_metadata(args.dataset)
+                columns = [
+                    column["fieldName"] for column in metadata.get("columns", [])
+                ]
+            writer = CsvWriter(
+                outfile,
+                columns,
+                header=resume_size is None,
+                add_columns=resume_size is None,
+            )
+        elif data_format == "json":
+            writer = JsonWriter(outfile, client.json_codec.dumps)
+        else:
+            writer = NdjsonWriter(outfile, client.json_codec.dumps)
+        if resume_size is not None:
+            # drop what was written after the last saved page
+            outfile.seek(resume_size)
+            outfile.truncate()
+        # write whole pages, and flush them before the next page is requested, which is
+        # when the checkpoint is saved, along with the size of the output that matches it
+        for page in utils.iter_batches(rows, page_size):
+            progress.add(writer.write(page), len(page))
+            outfile.flush()
+            if checkpoint is not None:
+                checkpoint.data["output_size"] = outfile.tell()
+        progress.add(writer.close(), 0)
+    progress.finish()
+    return 0
+
+
+def resume_output_size(checkpoint, output):
+    """
+    Return the size of the output when the checkpoint of an export was last saved, or
+    None if there is no checkpoint to resume from.
+    """
+    data = checkpoint.read_data()
+    if data is None:
+        return None
+    if "output_size" not in data:
+        raise Exception(
+            "Checkpoint {} was not written by an export. Remove it to start over.".format(
+                checkpoint.path
+            )
+        )
+    if not os.path.exists(output) or os.path.getsize(output) < data["output_size"]:
+        raise Exception(
+            "{} is missing or shorter than when checkpoint {} was saved. Remove the"
+            " checkpoint to start over.".format(output, checkpoint.path)
+        )
+    return data["output_size"]
+
+
+def csv_header(infile):
+    """
+    Return the columns of the header line of a binary CSV file.
+    """
+    line = infile.readline()
+    return next(csv.reader([line.decode("utf-8-sig")]), [])
+
+
+def import_rows(client, args):
+    data_format = file_format(args.input, args.format)
+    compression = file_compression(args.input, args.compress)
+    progress = Progress("import", quiet=args.quiet)
+    failures = []
+    with open_file(args.input, "rb", compression) as infile:
+        rows = read_rows(infile, data_format)
+        if args.replace:
+            result = client.replace(args.dataset, rows, progress=progress.update)
+        else:
+            result, failures = client.upsert_rows(
+                args.dataset,
+                rows,
+                args.batch_size,
+                max_workers=args.workers,
+                progress=progress.update,
+                bisect=not args.no_bisect,
+            )
+    progress.finish()
+    print(json.dumps(result, indent=2, sort_keys=True))
+    for failure in failures:
+        if len(failure.rows) == 1:
+            sys.stderr.write(
+                "rejected row {}: {}\n".format(
+                    json.dumps(failure.rows[0]), failure.error
+                )
+            )
+        else:
+            sys.stderr.write(
+                "failed batch of {} rows: {}\n".format(len(failure.rows), failure.error)
+            )
+    return 1 if failures else 0
+
+
+def sync_rows(client, args):
+    data_format = file_format(args.input, args.format)
+    compression = file_compression(args.input, args.compress)
+    row_identifier = args.row_identifier
+    digests = None
+    if args.digests is not None:
+        if os.path.exists(args.digests):
+            with open(args.digests, "r") as f:
+                digests = {
+                    key: bytes.fromhex(value) for key, value in json.load(f).items()
+                }
+        else:
+            if row_identifier is None:
+                row_identifier = client.get_row_identifier(args.dataset)
+            digests = client.row_digests(args.dataset, row_identifier)
+
+    progress = Progress("sync", quiet=args.quiet)
+    with open_file(args.input, "rb", compression) as infile:
+        result = client.replace_diff(
+            args.dataset,
+            read_rows(infile, data_format),
+            row_identifier=row_identifier,
+            digests=digests,
+            batch_size=args.batch_size,
+            progress=progress.update,
+        )
+    progress.finish()
+
+    if args.digests is not None:
+        with open(args.digests + ".tmp", "w") as f:
+            json.dump({key: value.hex() for key, value in digests.items()}, f)
+        os.replace(args.digests + ".tmp", args.digests)
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return 0
+
+
+def search_catalog(client, args):
+    filters = {}
+    for name, value in (
+        ("q", args.q),
+        ("categories", args.category),
+        ("tags", args.tag),
+        ("only", args.only),
+    ):
+        if value:
+            filters[name] = value
+    if args.index is None:
+        results = client.datasets(limit=args.limit, **filters)
+    else:
+        with CatalogIndex(client, args.index) as index:
+            if args.refresh:
+                count = index.refresh()
+                if not args.quiet:
+                    sys.stderr.write("catalog: {:,} assets refreshed\n".format(count))
+            results = index.datasets(limit=args.limit, **filters)
+
+    if args.format == "json":
+        print(json.dumps(results, indent=2))
+    elif args.format == "ndjson":
+        for result in results:
+            print(json.dumps(result))
+    else:
+        for result in results:
+            resource = result.get("resource", {})
+            print(
+                "{:<10} {:<11} {}".format(
+                    resource.get("id", ""),
+                    (resource.get("updatedAt") or "")[:10],
+                    resource.get("name", ""),
+                )
+            )
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="sodapy", description="Work with the datasets of a Socrata domain."
+    )
+    env = os.environ.get
+    parser.add_argument(
+        "--domain",
+        default=env("SODAPY_DOMAIN"),
+        help="the domain to work with, defaults to $SODAPY_DOMAIN",
+    )
+    parser.add_argument(
+        "--app-token",
+        default=env("SODAPY_APP_TOKEN"),
+        help="the application token, defaults to $SODAPY_APP_TOKEN",
+    )
+    parser.add_argument("--username", default=env("SODAPY_USERNAME"))
+    parser.add_argument("--password", default=env("SODAPY_PASSWORD"))
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument(
+        "--transport", choices=["requests", "httpx"], default="requests"
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="do not print progress to stderr"
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    subparsers.required = True
+
+    def add_file_options(subparser, formats_help):
+        subparser.add_argument(
+            "--format", choices=["ndjson", "json", "csv"], help=formats_help
+        )
+        subparser.add_argument(
+            "--compress",
+            choices=["auto", "none"] + list(COMPRESSIONS),
+            default="auto",
+            help="compression of the file, guessed from its extension by default",
+        )
+
+    export = subparsers.add_parser(
+        "export", help="write the rows of a dataset to a file"
+    )
+    export.set_defaults(func=export_rows)
+    export.add_argument("dataset")
+    export.add_argument(
+        "-o", "--output", default="-", help="the file to write, defaults to stdout"
+    )
+    add_file_options(export, "defaults to the extension of the output, or ndjson")
+    export.add_argument("--select")
+    export.add_argument("--where")
+    export.add_argument("--order")
+    export.add_argument("--q", help="full text search")
+    export.add_argument(
+        "--page-size", type=int, help="rows per request, defaults to 1000"
+    )
+    export.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="tune the page size from the observed throughput",
+    )
+    export.add_argument(
+        "--prefetch", type=int, default=0, help="pages to download ahead"
+    )
+    export.add_argument(
+        "--decode-processes", type=int, help="processes that decode pages"
+    )
+    export.add_argument(
+        "--partitions",
+        type=int,
+        help="split the dataset in ranges of --partition-column, read in parallel",
+    )
+    export.add_argument(
+        "--partition-column", help="a numeric or date column, required by --partitions"
+    )
+    export.add_argument(
+        "--workers", type=int, help="partitions read at once, defaults to all"
+    )
+    export.add_argument(
+        "--resume",
+        metavar="CHECKPOINT",
+        help="save progress to this file, and resume from it if it exists",
+    )
+
+    upload = subparsers.add_parser("import", help="upsert the rows of a file")
+    upload.set_defaults(func=import_rows)
+    upload.add_argument("dataset")
+    upload.add_argument("input", help="the file to read, or - for stdin")
+    add_file_options(upload, "defaults to the extension of the input")
+    upload.add_argument("--batch-size", type=int, default=10000)
+    upload.add_argument(
+        "--workers", type=int, default=1, help="batches uploaded at once"
+    )
+    upload.add_argument(
+        "--no-bisect",
+        action="store_true",
+        help="give up on rejected batches, instead of splitting them to find the bad rows",
+    )
+    upload.add_argument(
+        "--replace",
+        action="store_true",
+        help="replace all the rows of the dataset in a single request",
+    )
+
+    sync = subparsers.add_parser(
+        "sync", help="make a dataset match a file, sending only the changed rows"
+    )
+    sync.set_defaults(func=sync_rows)
+    sync.add_argument("dataset")
+    sync.add_argument("input", help="the file to read, or - for stdin")
+    add_file_options(sync, "defaults to the extension of the input")
+    sync.add_argument("--row-identifier")
+    sync.add_argument(
+        "--digests",
+        help="file of the row digests of the last sync, so that the current rows do"
+        " not need to be downloaded",
+    )
+    sync.add_argument("--batch-size", type=int, default=10000)
+
+    catalog = subparsers.add_parser("catalog", help="search the datasets of the domain")
+    catalog.set_defaults(func=search_catalog)
+    catalog.add_argument("q", nargs="?", help="full text search")
+    catalog.add_argument("--category", action="append")
+    catalog.add_argument("--tag", action="append")
+    catalog.add_argument(
+        "--only", action="append", help="asset types, e.g. dataset or map"
+    )
+    catalog.add_argument("--limit", type=int, default=0)
+    catalog.add_argument(
+        "--index", help="search a local index of the catalog kept in this SQLite file"
+    )
+    catalog.add_argument(
+        "--refresh",
+        action="store_true",
+        help="bring the --index up to date with the assets updated since the last time",
+    )
+    catalog.add_argument(
+        "--format", choices=["table", "ndjson", "json"], default="table"
+    )
+    return parser
+
+
+def check_args(parser, args):
+    if not args.domain:
+        parser.error("a domain is required, pass --domain or set $SODAPY_DOMAIN")
+    if args.command == "catalog" and args.refresh and args.index is None:
+        parser.error("--refresh requires --index")
+    if args.command != "export":
+        return
+    if args.partitions and args.partition_column is None:
+        parser.error("--partitions requires --partition-column")
+    if args.resume is None:
+        return
+    if args.partitions:
+        parser.error("--resume cannot be combined with --partitions")
+    if args.adaptive:
+        parser.error("--resume cannot be combined with --adaptive")
+    if args.output == "-":
+        parser.error("--resume requires an --output file")
+    if file_format(args.output, args.format, default="ndjson") == "json":
+        parser.error("--resume requires the ndjson or csv format")
+    if file_compression(args.output, args.compress) is not None:
+        parser.error("--resume cannot be combined with compression")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_args(parser, args)
+    try:
+        with Socrata(
+            args.domain,
+            args.app_token,
+            username=args.username,
+            password=args.password,
+            timeout=args.timeout,
+            transport=args.transport,
+        ) as client:
+            return args.func(client, args)
+    except KeyboardInterrupt:
+        sys.stderr.write("interrupted\n")
+        return 130
+    except Exception as e:
+        sys.stderr.write("sodapy: error: {}\n".format(e))
+        return 1
@@ -1,3 +1,4 @@
 DEFAULT_API_PATH = "/resource/"
 OLD_API_PATH = "/api/views"
 DATASETS_PATH = "/api/catalog/v1"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
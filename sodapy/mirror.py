@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from sodapy.soql import SQLTranslator, UnsupportedQuery, quote_identifier
+import sodapy.utils as utils
+
+# Socrata data types, and how their values are stored in SQLite
+NUMERIC_TYPES = set(["number", "money", "double", "percent"])
+BOOLEAN_TYPES = set(["checkbox"])
+TEXT_TYPES = set(["text", "calendar_date", "floating_timestamp", "fixed_timestamp"])
+
+DATA_TABLE = "data"
+COLUMNS_TABLE = "sodapy_columns"
+STATE_TABLE = "sodapy_state"
+
+
+def storage_type(data_type=None, value=None):
+    """
+    Pick how a column is stored, from its Socrata data type or else from a sample value:
+    "numeric", "boolean", "json" for nested values such as locations, or "text".
+    """
+    if data_type is not None:
+        data_type = data_type.lower()
+        if data_type in NUMERIC_TYPES:
+            return "numeric"
+        if data_type in BOOLEAN_TYPES:
+            return "boolean"
+        if data_type in TEXT_TYPES:
+            return "text"
+        return "json"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (dict, list)):
+        return "json"
+    return "text"
+
+
+def to_sql(value, kind):
+    if value is None:
+        return None
+    if kind == "json":
+        return json.dumps(value, sort_keys=True)
+    if kind == "boolean":
+        return int(bool(value))
+    return value
+
+
+def from_sql(value, kind):
+    """
+    Convert a stored value back to what the API returns. The API returns numbers as
+    strings, which also applies to aggregates over any column.
+    """
+    if value is None:
+        return None
+    if kind == "json":
+        return json.loads(value)
+    if kind == "boolean":
+        return bool(value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value
+
+
+class LocalMirror:
+    """
+    A local copy of a dataset in an SQLite file, which answers get() calls without going
+    to the API whenever the query can be translated to SQL. Sample usage:
+        mirror = LocalMirror(client, "nimj-3ivp", "earthquakes.db", indexes=["region"])
+        mirror.refresh()
+        mirror.get(where="magnitude > 4", order="magnitude DESC", limit=10)
+
+    $select, $where, $order, $group, $limit and $offset are supported, as well as
+    filters on field names, with comparisons, boolean logic, IS NULL, IN, BETWEEN, LIKE
+    and the count, sum, min, max, avg, upper and lower functions. Other queries, or
+    queries on a mirror that was never loaded, are sent to the API through the client.
+
+        client: the Socrata client used to load the dataset and for fallback queries
+        dataset_identifier: the dataset to mirror
+        path: the SQLite file to store the mirror in
+        indexes: columns to index
+    """
+
+    def __init__(self, client, dataset_identifier, path, indexes=()):
+        self.client = client
+        self.dataset_identifier = dataset_identifier
+        self.path = os.path.expanduser(path)
+        self.indexes = list(indexes)
+        self._lock = threading.Lock()
+        # transactions are managed explicitly, so that schema changes are part of them
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA case_sensitive_like = ON")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS {} (name TEXT PRIMARY KEY, kind TEXT)".format(
+                COLUMNS_TABLE
+            )
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, value)".format(
+                STATE_TABLE
+            )
+        )
+        self._load_columns()
+
+    def _load_columns(self):
+        self._columns = dict(
+            self._connection.execute("SELECT name, kind FROM {}".format(COLUMNS_TABLE))
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        self.close()
+
+    def refresh(self, **kwargs):
+        """
+        Load the whole dataset into the mirror, replacing its previous contents. Keyword
+        arguments are passed to get_all(), e.g. to only mirror some of the rows. Returns
+        the number of rows loaded.
+        """
+        metadata = self.client.get_metadata(self.dataset_identifier, max_age=0)
+        columns = {
+            column["fieldName"]: storage_type(column.get("dataTypeName"))
+            for column in metadata.get("columns", [])
+            if "fieldName" in column
+        }
+        version = utils.dataset_version(metadata)
+
+        with self._lock:
+            db = self._connection
+            db.execute("BEGIN")
+            try:
+                count = self._load(columns, version, kwargs)
+            except BaseException:
+                db.execute("ROLLBACK")
+                self._load_columns()
+                raise
+            db.execute("COMMIT")
+        return count
+
+    def _load(self, columns, version, kwargs):
+        db = self._connection
+        db.execute("DROP TABLE IF EXISTS {}".format(DATA_TABLE))
+        db.execute("DELETE FROM {}".format(COLUMNS_TABLE))
+        db.execute(
+            "CREATE TABLE {} (_sodapy_row INTEGER PRIMARY KEY)".format(DATA_TABLE)
+        )
+        self._columns = {}
+        for name, kind in columns.items():
+            self._add_column(name, kind)
+
+        count = 0
+        for row in self.client.get_all(self.dataset_identifier, **kwargs):
+            for name, value in row.items():
+                if name not in self._columns:
+                    self._add_column(name, storage_type(value=value))
+            names = list(row)
+            db.execute(
+                "INSERT INTO {} ({}) VALUES ({})".format(
+                    DATA_TABLE,
+                    ", ".join(quote_identifier(name) for name in names),
+                    ", ".join("?" for _ in names),
+                ),
+                [to_sql(row[name], self._columns[name]) for name in names],
+            )
+            count += 1
+
+        for i, name in enumerate(self.indexes):
+            db.execute(
+                "CREATE INDEX {} ON {} ({})".format(
+                    quote_identifier("index_{}".format(i)),
+                    DATA_TABLE,
+                    quote_identifier(name),
+                )
+            )
+        db.execute(
+            "INSERT OR REPLACE INTO {} VALUES ('version', ?)".format(STATE_TABLE),
+            [version],
+        )
+        return count
+
+    def _add_column(self, name, kind):
+        declared_type = {"numeric": "NUMERIC", "boolean": "INTEGER"}.get(kind, "TEXT")
+        self._connection.execute(
+            "ALTER TABLE {} ADD COLUMN {} {}".format(
+                DATA_TABLE, quote_identifier(name), declared_type
+            )
+        )
+        self._connection.execute(
+            "INSERT INTO {} VALUES (?, ?)".format(COLUMNS_TABLE), [name, kind]
+        )
+        self._columns[name] = kind
+
+    def is_loaded(self):
+        return bool(self._columns)
+
+    def is_stale(self):
+        """
+        Whether the rows of the dataset were modified since the last refresh.
+        """
+        row = self._connection.execute(
+            "SELECT value FROM {} WHERE key = 'version'".format(STATE_TABLE)
+        ).fetchone()
+        return row is None or row[0] != self.client.get_dataset_version(
+            self.dataset_identifier
+        )
+
+    def get(self, content_type="json", **kwargs):
+        """
+        Same as Socrata.get() for the mirrored dataset, answered locally when possible.
+        """
+        if content_type == "json" and self.is_loaded():
+            try:
+                sql, params, names = self.translate(**kwargs)
+            except UnsupportedQuery as e:
+                logging.debug("Querying the API instead of the mirror: %s", e)
+            else:
+                with self._lock:
+                    rows = self._connection.execute(sql, params).fetchall()
+                kinds = [self._columns.get(name) for name in names]
+                return [
+                    {
+                        name: from_sql(value, kind)
+                        for name, kind, value in zip(names, kinds, row)
+                        if value is not None
+                    }
+                    for row in rows
+                ]
+        return self.client.get(self.dataset_identifier, content_type, **kwargs)
+
+    def translate(self, **kwargs):
+        """
+        Translate the arguments of a get() call to an SQL query. Returns the query, its
+        parameters and the names of the result columns.
+        """
+        kwargs = dict(kwargs)
+        translator = SQLTranslator(self._columns)
+        select = kwargs.pop("select", None) or "*"
+        where = kwargs.pop("where", None)
+        order = kwargs.pop("order", None)
+        group = kwargs.pop("group", None)
+        limit = kwargs.pop("limit", self.client.DEFAULT_LIMIT)
+        offset = kwargs.pop("offset", None)
+        for unsupported in ("q", "query", "exclude_system_fields", "format"):
+            if kwargs.pop(unsupported, None) is not None:
+                raise UnsupportedQuery("Unsupported argument {}".format(unsupported))
+
+        select_sql, names = translator.select(select)
+        sql = "SELECT {} FROM {}".format(select_sql, DATA_TABLE)
+
+        conditions = []
+        params = []
+        if where:
+            conditions.append("({})".format(translator.expression(where)))
+        for name, value in kwargs.items():
+            if name not in self._columns:
+                raise UnsupportedQuery("Unknown column {}".format(name))
+            conditions.append("{} = ?".format(quote_identifier(name)))
+            params.append(to_sql(value, self._columns[name]))
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if group:
+            sql += " GROUP BY " + translator.order(group)
+        if order:
+            sql += " ORDER BY " + translator.order(order)
+        sql += " LIMIT {:d}".format(int(limit))
+        if offset:
+            sql += " OFFSET {:d}".format(int(offset))
+        return sql, params, names
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,338 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from sodapy.socrata import BatchFailure
+import sodapy.utils as utils
+
+ROWS_TABLE = "sodapy_outbox"
+REJECTED_TABLE = "sodapy_rejected"
+STATE_TABLE = "sodapy_state"
+
+
+class UpsertOutbox:
+    """
+    A durable write-behind queue of rows to upsert into a dataset. Rows are written to an
+    SQLite file as they are put, and sent with upsert() in batches, once `batch_size`
+    rows are pending or the oldest pending row has waited `max_delay` seconds. Rows that
+    were not sent when the process stopped are sent by the next outbox opened on the same
+    file. Sample usage:
+        with UpsertOutbox(client, "nimj-3ivp", "outbox.db") as outbox:
+            for change in changes:
+                outbox.put(change)
+
+    Pending rows with the same row identifier are coalesced into one: their fields are
+    merged, with the latest values winning, and a row marked as :deleted replaces the
+    pending changes to it. Changes put after a pending delete are coalesced separately,
+    and sent after it. Rows without a row identifier are sent as they are.
+
+    When the API rejects a batch because of the contents of some of its rows, the
+    rows at fault are isolated as with Socrata.upsert_rows(), and set aside with the
+    error of the API, so that they do not hold back the others. See rejected().
+
+    Flushes run on a background thread, and are retried every `max_delay` seconds when
+    they fail. Pass background=False to only send rows when flush() is called.
+
+        client: the Socrata client used to send the rows
+        dataset_identifier: the dataset to upsert the rows into
+        path: the SQLite file to keep the pending rows in
+        row_identifier: the field that identifies rows, defaults to the dataset's row
+            identifier
+        batch_size: max number of rows per upsert request
+        max_delay: max number of seconds a row waits before being sent
+    """
+
+    def __init__(
+        self,
+        client,
+        dataset_identifier,
+        path,
+        row_identifier=None,
+        batch_size=1000,
+        max_delay=5.0,
+        background=True,
+    ):
+        self.client = client
+        self.dataset_identifier = dataset_identifier
+        self.path = os.path.expanduser(path)
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.totals = {}
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        db = self._connection
+        # with a write-ahead log, committed rows survive the process dying, without
+        # waiting for every put to be synced to disk
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS {} (seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT UNIQUE, version INTEGER, row BLOB)".format(ROWS_TABLE)
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS {} (seq INTEGER PRIMARY KEY, row BLOB,"
+            " error TEXT)".format(REJECTED_TABLE)
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, value)".format(
+                STATE_TABLE
+            )
+        )
+
+        # the row identifier is kept with the rows, so that an outbox can be reopened
+        # and flushed without looking it up again
+        row = db.execute(
+            "SELECT value FROM {} WHERE key = 'row_identifier'".format(STATE_TABLE)
+        ).fetchone()
+        if row_identifier is None:
+            if row is not None:
+                row_identifier = row[0]
+            else:
+                row_identifier = client.get_row_identifier(dataset_identifier)
+        db.execute(
+            "INSERT OR REPLACE INTO {} VALUES ('row_identifier', ?)".format(
+                STATE_TABLE
+            ),
+            [row_identifier],
+        )
+        self.row_identifier = row_identifier
+
+        self._pending = db.execute(
+            "SELECT COUNT(*) FROM {}".format(ROWS_TABLE)
+        ).fetchone()[0]
+        self._oldest = time.monotonic() if self._pending else None
+        self._retry_at = None
+        self._closed = False
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(
+                target=self._run, name="sodapy-outbox", daemon=True
+            )
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._pending
+
+    def put(self, row):
+        """
+        Add a row to the outbox. It is on disk once this returns.
+        """
+        self.put_many([row])
+
+    def put_many(self, rows):
+        """
+        Add rows to the outbox, in a single transaction.
+        """
+        with self._lock:
+            db = self._connection
+            db.execute("BEGIN")
+            try:
+                added = sum(self._put(row) for row in rows)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            self._pending += added
+            if self._pending and self._oldest is None:
+                self._oldest = time.monotonic()
+            self._changed.notify_all()
+
+    def _put(self, row):
+        """
+        Store a row, coalesced with the pending row with the same identifier if any.
+        Returns the number of rows added.
+        """
+        db = self._connection
+        codec = self.client.json_codec
+        value = row.get(self.row_identifier)
+        key = None
+        if value is not None:
+            key = json.dumps(utils.normalize_value(value), sort_keys=True)
+            pending = db.execute(
+                "SELECT seq, row FROM {} WHERE key = ?".format(ROWS_TABLE), [key]
+            ).fetchone()
+            if pending is not None:
+                seq, data = pending
+                merged = codec.loads(data)
+                if merged.get(":deleted") and not row.get(":deleted"):
+                    # the row must be deleted before the new fields are sent, or they
+                    # would be merged into it: the delete is left pending on its own, and
+                    # the new fields are queued after it
+                    db.execute(
+                        "UPDATE {} SET key = NULL WHERE seq = ?".format(ROWS_TABLE),
+                        [seq],
+                    )
+                else:
+                    if row.get(":deleted"):
+                        merged = row
+                    else:
+                        merged.update(row)
+                    db.execute(
+                        "UPDATE {} SET row = ?, version = version + 1"
+                        " WHERE seq = ?".format(ROWS_TABLE),
+                        [codec.dumps(merged), seq],
+                    )
+                    return 0
+        db.execute(
+            "INSERT INTO {} (key, version, row) VALUES (?, 0, ?)".format(ROWS_TABLE),
+            [key, codec.dumps(row)],
+        )
+        return 1
+
+    def flush(self):
+        """
+        Upsert the rows pending when it is called, in batches of `batch_size`. Rows are
+        only removed from the outbox once they were accepted or rejected by the API, and
+        rows that were coalesced with newer changes while being sent stay in it. Returns
+        the counts of the responses summed over all batches.
+        """
+        totals = {}
+        with self._flush_lock:
+            with self._lock:
+                last = self._connection.execute(
+                    "SELECT MAX(seq) FROM {}".format(ROWS_TABLE)
+                ).fetchone()[0]
+            after = 0
+            while last is not None:
+                with self._lock:
+                    batch = self._connection.execute(
+                        "SELECT seq, version, row FROM {} WHERE seq > ? AND seq <= ?"
+                        " ORDER BY seq LIMIT ?".format(ROWS_TABLE),
+                        [after, last, self.batch_size],
+                    ).fetchall()
+                if not batch:
+                    break
+                loads = self.client.json_codec.loads
+                rows = [loads(row) for _, _, row in batch]
+                counts, failures = self.client.upsert_rows(
+                    self.dataset_identifier, rows, batch_size=len(rows), max_workers=1
+                )
+                errors = {}
+                for failure in failures:
+                    for row in failure.rows:
+                        errors[id(row)] = failure.error
+                utils.add_counts(totals, counts)
+                self._sent(batch, [errors.get(id(row)) for row in rows], counts)
+                for failure in failures:
+                    if not utils.is_payload_error(failure.error):
+                        raise failure.error
+                after = batch[-1][0]
+        return totals
+
+    def _sent(self, batch, errors, counts):
+        """
+        Remove the rows of a batch that were accepted or rejected, and keep the rejected
+        ones aside.
+        """
+        with self._lock:
+            db = self._connection
+            db.execute("BEGIN")
+            deleted = 0
+            for (seq, version, row), error in zip(batch, errors):
+                if error is not None and not utils.is_payload_error(error):
+                    continue
+                removed = db.execute(
+                    "DELETE FROM {} WHERE seq = ? AND version = ?".format(ROWS_TABLE),
+                    [seq, version],
+                ).rowcount
+                if removed and error is not None:
+                    db.execute(
+                        "INSERT INTO {} (row, error) VALUES (?, ?)".format(
+                            REJECTED_TABLE
+                        ),
+                        [row, str(error)],
+                    )
+                deleted += removed
+            db.execute("COMMIT")
+            utils.add_counts(self.totals, counts)
+            self._pending -= deleted
+            # rows put while the batch was sent have waited since then at most
+            self._oldest = time.monotonic() if self._pending else None
+
+    def rejected(self):
+        """
+        Return the rows rejected by the API, as BatchFailure(rows, error) tuples of a
+        single row and the message of the error. They are kept until clear_rejected() is
+        called.
+        """
+        with self._lock:
+            rejected = self._connection.execute(
+                "SELECT row, error FROM {} ORDER BY seq".format(REJECTED_TABLE)
+            ).fetchall()
+        loads = self.client.json_codec.loads
+        return [BatchFailure([loads(row)], error) for row, error in rejected]
+
+    def clear_rejected(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM {}".format(REJECTED_TABLE))
+
+    def _due(self):
+        """
+        Return the number of seconds until the next flush, or None if no rows are pending.
+        """
+        now = time.monotonic()
+        if self._retry_at is not None and now < self._retry_at:
+            return self._retry_at - now
+        if self._pending >= self.batch_size:
+            return 0
+        if self._oldest is None:
+            return None
+        return max(self._oldest + self.max_delay - now, 0)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while True:
+                    if self._closed:
+                        return
+                    due = self._due()
+                    if due == 0:
+                        break
+                    self._changed.wait(due)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(
+                    "Could not flush the outbox of %s, retrying in %s seconds: %s",
+                    self.dataset_identifier,
+                    self.max_delay,
+                    e,
+                )
+                with self._lock:
+                    self.last_error = e
+                    self._retry_at = time.monotonic() + self.max_delay
+            else:
+                with self._lock:
+                    self.last_error = None
+                    self._retry_at = None
+
+    def close(self, flush=True):
+        """
+        Stop the background thread and, unless `flush` is false, send the pending rows.
+        Rows that could not be sent are kept for the next outbox opened on the file.
+        """
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            if flush:
+                self.flush()
+        finally:
+            self._connection.close()
@@ -0,0 +1,262 @@
+import json
+import mmap
+import os
+import tempfile
+import zlib
+
+from sodapy.codec import get_codec
+
+
+class ZlibCompressor:
+    """
+    Page compression with zlib, from the standard library.
+    """
+
+    name = "zlib"
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class ZstdCompressor:
+    """
+    Page compression with Zstandard, which is both faster and more compact than zlib.
+    Requires the zstandard package.
+    """
+
+    name = "zstd"
+
+    def __init__(self, level=3):
+        import zstandard
+
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def decompress(self, data):
+        return self._decompressor.decompress(data)
+
+
+COMPRESSORS = {
+    "zlib": ZlibCompressor,
+    "zstd": ZstdCompressor,
+}
+
+
+def get_compressor(compression="auto"):
+    """
+    Return the compressor named `compression` ("zlib" or "zstd"), or for "auto", zstd if
+    it is installed and zlib otherwise.
+    """
+    if compression == "auto":
+        try:
+            return ZstdCompressor()
+        except ImportError:
+            return ZlibCompressor()
+
+    if compression not in COMPRESSORS:
+        raise Exception(
+            "Unknown compression {}. Supported compressions are: auto, {}".format(
+                compression, ", ".join(COMPRESSORS)
+            )
+        )
+    return COMPRESSORS[compression]()
+
+
+class PageStore:
+    """
+    A directory of compressed result pages, written as get_all() reads them so that the
+    same query can later be replayed from disk instead of the API. Sample usage:
+        store = PageStore("~/sodapy_pages")
+        for row in client.get_all("nimj-3ivp", page_store=store):
+            validate(row)
+        for row in client.get_all("nimj-3ivp", page_store=store):  # read from disk
+            load(row)
+
+    Every result is kept in a file of compressed pages, and an index written once the
+    result is complete. Stored results are read through memory maps, one page at a time.
+        directory: where to keep the files, created if needed
+        compression: "zstd", "zlib", or "auto" to use zstd when it is installed
+    """
+
+    def __init__(self, directory, compression="auto"):
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.compressor = get_compressor(compression)
+        self.codec = get_codec()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".pages", base + ".index"
+
+    def open(self, key, version=None):
+        """
+        Return the StoredResult for `key`, or None if there is no complete result for it,
+        or if it was stored for another version of the dataset.
+        """
+        data_path, index_path = self._paths(key)
+        try:
+            with open(index_path, "r") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        if index["version"] != version:
+            return None
+        compressor = self.compressor
+        if index["compression"] != compressor.name:
+            compressor = get_compressor(index["compression"])
+        try:
+            result = StoredResult(data_path, index, compressor, self.codec)
+        except FileNotFoundError:
+            return None
+        # the pages may have been replaced by another writer since the index was read
+        if result.size != index.get("size"):
+            result.close()
+            return None
+        return result
+
+    def writer(self, key, version=None):
+        """
+        Return a PageWriter that stores a new result for `key`, replacing the previous one
+        once it is committed.
+        """
+        return PageWriter(self, key, version)
+
+    def delete(self, key):
+        for path in self._paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class PageWriter:
+    """
+    Appends pages to a result of a PageStore. Nothing is visible to readers until
+    commit() is called, and an uncommitted result is discarded by close().
+    """
+
+    def __init__(self, store, key, version):
+        self.store = store
+        self.key = key
+        self.version = version
+        self.pages = []
+        self.rows = 0
+        self._data_path, self._index_path = store._paths(key)
+        # every writer has its own temporary file, so that concurrent writers of the same
+        # key do not write over each other
+        fd, self._temp_path = tempfile.mkstemp(
+            suffix=".tmp",
+            prefix=os.path.basename(self._data_path) + ".",
+            dir=store.directory,
+        )
+        self._file = os.fdopen(fd, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        if exc_type is None and self._file is not None:
+            self.commit()
+        self.close()
+
+    def append(self, rows):
+        data = self.store.compressor.compress(self.store.codec.dumps(rows))
+        self.pages.append([self._file.tell(), len(data), len(rows)])
+        self._file.write(data)
+        self.rows += len(rows)
+
+    def commit(self):
+        """
+        Make the result visible to readers. The previous index is removed before the pages
+        are replaced, so that it is never paired with the new pages, even if the process
+        dies in between, and the new index records the size of the pages it describes, so
+        that readers that opened the previous index detect the replacement.
+        """
+        size = self._file.tell()
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self._index_path)
+        except FileNotFoundError:
+            pass
+        os.replace(self._temp_path, self._data_path)
+        index = {
+            "version": self.version,
+            "compression": self.store.compressor.name,
+            "rows": self.rows,
+            "size": size,
+            "pages": self.pages,
+        }
+        fd, temp_index_path = tempfile.mkstemp(
+            suffix=".tmp",
+            prefix=os.path.basename(self._index_path) + ".",
+            dir=self.store.directory,
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_index_path, self._index_path)
+
+    def close(self):
+        """
+        Discard the result if it was not committed.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._temp_path)
+
+
+class StoredResult:
+    """
+    A result read back from a PageStore. Iterating over it yields rows, and pages can be
+    read in any order with page(i). Only the page being read is held in memory.
+    """
+
+    def __init__(self, path, index, compressor, codec):
+        self.path = path
+        self.rows = index["rows"]
+        self._pages = index["pages"]
+        self._compressor = compressor
+        self._codec = codec
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        self.close()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __iter__(self):
+        for page in self.pages():
+            for row in page:
+                yield row
+
+    def page(self, number):
+        start, length, _ = self._pages[number]
+        end = start + length
+        data = self._compressor.decompress(self._data[start:end])
+        return self._codec.loads(data)
+
+    def pages(self):
+        for number in range(len(self._pages)):
+            yield self.page(number)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
@@ -0,0 +1,125 @@
+import threading
+
+import requests
+
+from sodapy.socrata import Socrata
+
+
+class RequestLimiter:
+    """
+    Context manager that holds a slot of a per-domain semaphore and of a global one for the
+    duration of a request. The domain slot is taken first, so that requests waiting on a
+    busy domain do not hold on to global slots.
+    """
+
+    def __init__(self, domain_semaphore, global_semaphore):
+        self.domain_semaphore = domain_semaphore
+        self.global_semaphore = global_semaphore
+
+    def __enter__(self):
+        self.domain_semaphore.acquire()
+        try:
+            self.global_semaphore.acquire()
+        except BaseException:
+            self.domain_semaphore.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        self.global_semaphore.release()
+        self.domain_semaphore.release()
+
+
+class PooledSocrata(Socrata):
+    """
+    A client handed out by a SocrataPool. Its connections are shared with the other
+    clients of the pool, so close() leaves them open, and the client usable: they are
+    only closed by SocrataPool.close().
+    """
+
+    def close(self):
+        pass
+
+
+class SocrataPool:
+    """
+    Hands out one Socrata client per domain, all sharing the same connection pools, with
+    limits on the number of requests in flight per domain and overall. Sample usage:
+        from sodapy.pool import SocrataPool
+        with SocrataPool(app_token="FakeAppToken", max_in_flight=16) as pool:
+            rows = pool.client("data.cityofchicago.org").get("ydr8-5enu")
+
+    Clients are created on first use with the pool's keyword arguments (e.g. app_token,
+    timeout), and kept so that later jobs reuse their warm connections. They are closed by
+    the pool: closing a client, e.g. at the end of a with block, does nothing.
+
+        max_in_flight: max number of concurrent requests across all domains
+        max_per_domain: max number of concurrent requests to a single domain
+        pool_connections: number of hosts to keep connection pools for
+        pool_maxsize: max number of connections kept open per host
+    """
+
+    def __init__(
+        self,
+        max_in_flight=32,
+        max_per_domain=4,
+        pool_connections=64,
+        pool_maxsize=None,
+        **client_kwargs
+    ):
+        if "session_adapter" in client_kwargs or "limiter" in client_kwargs:
+            raise TypeError("The pool manages session adapters and limiters itself.")
+        client_kwargs.setdefault("app_token", None)
+        self.client_kwargs = client_kwargs
+        self.max_per_domain = max_per_domain
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize or max_per_domain,
+        )
+        self.global_semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        self.close()
+
+    def client(self, domain, **kwargs):
+        """
+        Return the client for `domain`, creating it on first use. Keyword arguments, such
+        as a domain-specific app_token, override the pool's when the client is created.
+        """
+        with self._lock:
+            if domain not in self._clients:
+                client_kwargs = dict(self.client_kwargs)
+                client_kwargs.update(kwargs)
+                limiter = RequestLimiter(
+                    threading.BoundedSemaphore(self.max_per_domain),
+                    self.global_semaphore,
+                )
+                self._clients[domain] = PooledSocrata(
+                    domain,
+                    session_adapter={"prefix": "https://", "adapter": self.adapter},
+                    limiter=limiter,
+                    **client_kwargs
+                )
+            return self._clients[domain]
+
+    def domains(self):
+        """
+        Return the domains that clients were created for.
+        """
+        with self._lock:
+            return list(self._clients)
+
+    def close(self):
+        """
+        Close every client, and the connections they share.
+        """
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.transport.close()
+        self.adapter.close()
@@ -0,0 +1,156 @@
+from collections import namedtuple
+from contextlib import contextmanager
+import threading
+import time
+import tracemalloc
+
+PhaseRecord = namedtuple(
+    "PhaseRecord", ["name", "peak", "retained", "seconds", "details"]
+)
+
+
+def format_size(size):
+    if abs(size) < 1024:
+        return "{:.0f} B".format(size)
+    for unit in ("KiB", "MiB", "GiB"):
+        size /= 1024.0
+        if abs(size) < 1024 or unit == "GiB":
+            return "{:.1f} {}".format(size, unit)
+
+
+class MemoryProfiler:
+    """
+    Records the memory allocated by each phase of the requests a client makes, with
+    tracemalloc. Sample usage:
+        profiler = MemoryProfiler()
+        client = Socrata("sandbox.demo.socrata.com", None, profiler=profiler)
+        rows = list(client.get_all("nimj-3ivp"))
+        print(profiler.report())
+
+    The phases are "body" for sending a request and reading its raw response, "decode"
+    for turning it into Python objects, "encode" for serializing upsert payloads, and
+    for every page of get_all(), "page" from requesting it to having it decoded and
+    "consume" while the caller processes its rows. For every phase, `peak` is the most
+    memory allocated at any point while it ran and `retained` what was still allocated
+    once it ended, such as the decoded rows.
+
+    tracemalloc is started by the profiler if needed, until stop() is called, and slows
+    down allocations noticeably. It tracks the whole process, so phases that run
+    concurrently on several threads are counted in each other's numbers.
+        keep: max number of records to keep, the oldest ones are dropped first
+    """
+
+    def __init__(self, keep=10000):
+        self.keep = keep
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if not hasattr(tracemalloc, "reset_peak"):
+            raise Exception("Memory profiling requires Python 3.9 or later.")
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name, **details):
+        """
+        Measure the memory allocated by the body of the `with` statement. Yields the
+        details of the record, which can be added to before it ends.
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        before, peak = tracemalloc.get_traced_memory()
+        # the peak is reset for every phase, so keep track of the peaks of the phases
+        # around this one, and of the phases nested in it
+        if stack:
+            stack[-1] = max(stack[-1], peak)
+        tracemalloc.reset_peak()
+        stack.append(0)
+        started = time.monotonic()
+        try:
+            yield details
+        finally:
+            seconds = time.monotonic() - started
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, stack.pop())
+            if stack:
+                stack[-1] = max(stack[-1], peak)
+            record = PhaseRecord(
+                name, peak - before, current - before, seconds, details
+            )
+            with self._lock:
+                self.records.append(record)
+                if len(self.records) > self.keep:
+                    del self.records[: len(self.records) - self.keep]
+
+    def summary(self):
+        """
+        Return a dict of the statistics of each phase: the number of calls, the largest
+        peak, and the largest and mean retained memory.
+        """
+        with self._lock:
+            records = list(self.records)
+        phases = {}
+        for record in records:
+            stats = phases.setdefault(
+                record.name, {"calls": 0, "peak": 0, "retained": 0, "retained_total": 0}
+            )
+            stats["calls"] += 1
+            stats["peak"] = max(stats["peak"], record.peak)
+            stats["retained"] = max(stats["retained"], record.retained)
+            stats["retained_total"] += record.retained
+        for stats in phases.values():
+            stats["retained_mean"] = stats.pop("retained_total") / stats["calls"]
+        return phases
+
+    def report(self, top=5):
+        """
+        Format the summary of every phase, followed by the `top` records with the highest
+        peaks, as a table.
+        """
+        lines = [
+            "{:<8} {:>7} {:>12} {:>14} {:>14}".format(
+                "phase", "calls", "max peak", "max retained", "mean retained"
+            )
+        ]
+        for name, stats in sorted(self.summary().items()):
+            lines.append(
+                "{:<8} {:>7} {:>12} {:>14} {:>14}".format(
+                    name,
+                    stats["calls"],
+                    format_size(stats["peak"]),
+                    format_size(stats["retained"]),
+                    format_size(stats["retained_mean"]),
+                )
+            )
+        with self._lock:
+            highest = sorted(self.records, key=lambda record: -record.peak)[:top]
+        if highest:
+            lines.append("")
+            lines.append("highest peaks:")
+            for record in highest:
+                lines.append(
+                    "  {:<8} {:>12} {:>12} retained  {}".format(
+                        record.name,
+                        format_size(record.peak),
+                        format_size(record.retained),
+                        " ".join(
+                            "{}={}".format(k, v)
+                            for k, v in sorted(record.details.items())
+                        ),
+                    )
+                )
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def stop(self):
+        """
+        Stop tracemalloc, if it was started by the profiler. The records are kept.
+        """
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
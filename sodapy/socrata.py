@@ -1,14 +1,35 @@
-import csv
-from io import StringIO, IOBase
-import json
+from collections import deque, namedtuple
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from contextlib import ExitStack, contextmanager
+import copy
+from io import IOBase
 import logging
 import os
-import re
+import threading
+import time
 import requests
 
+from sodapy.cache import MetadataCache
+from sodapy.checkpoint import Checkpoint, query_fingerprint
+from sodapy.codec import get_codec
 from sodapy.constants import DATASETS_PATH
+import sodapy.soql as soql
+from sodapy.transport import get_transport
+from sodapy.tuning import PageSizeTuner
 import sodapy.utils as utils
 
+BatchResult = namedtuple("BatchResult", ["dataset_identifier", "result", "error"])
+BatchFailure = namedtuple("BatchFailure", ["rows", "error"])
+BulkResult = namedtuple("BulkResult", ["counts", "failures"])
+
 
 class Socrata:
     """
@@ -29,6 +50,12 @@ class Socrata:
         access_token=None,
         session_adapter=None,
         timeout=10,
+        json_codec="auto",
+        limiter=None,
+        metadata_ttl=0,
+        transport="requests",
+        profiler=None,
+        tracer=None,
     ):
         """
         The required arguments are:
@@ -52,33 +79,57 @@ class Socrata:
         More information about authentication can be found in the official
         docs:
             http://dev.socrata.com/docs/authentication.html
+
+        JSON payloads are encoded and decoded with orjson when it is installed, and with
+        the standard library otherwise. Pass json_codec="json" to always use the standard
+        library, or any object with loads(bytes) and dumps(obj) -> bytes methods.
+
+        To cap the number of concurrent requests, pass a context manager as the limiter,
+        such as a threading.BoundedSemaphore. It is entered for the duration of every
+        request made by the client.
+
+        Dataset metadata is cached by the client, and revalidated with a conditional
+        request once it is older than metadata_ttl seconds. With the default of 0, every
+        lookup is revalidated, which only transfers the metadata again if it changed. Set
+        metadata_ttl to None to disable the cache.
+
+        Requests are sent with requests, over HTTP/1.1. Pass transport="httpx" to send
+        them with httpx over HTTP/2 instead, so that concurrent requests share one
+        connection, or pass a transport object such as HttpxTransport(**client_kwargs)
+        to configure it. Session adapters can only be used with the requests transport.
+
+        Pass a MemoryProfiler as the profiler to record the memory allocated while
+        reading, decoding and encoding the data of every request, and a Tracer as the
+        tracer to record a timeline of the client's activity.
         """
         if not domain:
             raise Exception("A domain is required.")
         self.domain = domain
 
-        # set up the session with proper authentication crendentials
-        self.session = requests.Session()
+        # set up the transport with proper authentication crendentials
+        self.transport = get_transport(transport)
+        # the requests session, kept for compatibility
+        self.session = getattr(self.transport, "session", None)
         if not app_token:
             logging.warning(
                 "Requests made without an app_token will be"
                 " subject to strict throttling limits."
             )
         else:
-            self.session.headers.update({"X-App-token": app_token})
+            self.transport.headers.update({"X-App-token": app_token})
 
         utils.authentication_validation(username, password, access_token)
 
         # use either basic HTTP auth or OAuth2.0
         if username and password:
-            self.session.auth = (username, password)
+            self.transport.auth = (username, password)
         elif access_token:
-            self.session.headers.update(
+            self.transport.headers.update(
                 {"Authorization": "OAuth {}".format(access_token)}
             )
 
         if session_adapter:
-            self.session.mount(session_adapter["prefix"], session_adapter["adapter"])
+            self.transport.mount(session_adapter["prefix"], session_adapter["adapter"])
             self.uri_prefix = session_adapter["prefix"]
         else:
             self.uri_prefix = "https://"
@@ -86,6 +137,12 @@ class Socrata:
         if not isinstance(timeout, (int, float)):
             raise TypeError("Timeout must be numeric.")
         self.timeout = timeout
+        self.json_codec = get_codec(json_codec)
+        self.limiter = limiter
+        self.metadata_ttl = metadata_ttl
+        self.metadata_cache = MetadataCache()
+        self.profiler = profiler
+        self.tracer = tracer
 
     def __enter__(self):
         """
@@ -220,20 +277,17 @@ class Socrata:
             limit >= num_results
             or limit == len(results["results"])
             or num_results == len(results["results"])
+            or offset + len(results["results"]) == num_results
         ):
             return results["results"]
 
         if limit != 0:
-            raise Exception(
-                "Unexpected number of results returned from endpoint.\
-                    Expected {}, got {}.".format(
-                    limit, len(results["results"])
-                )
-            )
+            raise Exception("Unexpected number of results returned from endpoint.\
+                    Expected {}, got {}.".format(limit, len(results["results"])))
 
         # get all remaining results
         all_results = results["results"]
-        while len(all_results) != num_results:
+        while results["results"] and offset + len(results["results"]) < num_results:
             offset += len(results["results"])
             results = self._perform_request(
                 "get", DATASETS_PATH, params=params + [("offset", offset)]
@@ -286,16 +340,46 @@ class Socrata:
             "value": "public.read" if permission == "public" else permission,
         }
 
+        self.metadata_cache.invalidate(dataset_identifier)
         return self._perform_request("put", resource, params=params)
 
-    def get_metadata(self, dataset_identifier, content_type="json"):
+    def get_metadata(self, dataset_identifier, content_type="json", max_age=None):
         """
         Retrieve the metadata for a particular dataset.
+
+        JSON metadata is served from the client's cache when it is less than `max_age`
+        seconds old (metadata_ttl by default), and revalidated with the server otherwise.
         """
         resource = utils.format_old_api_request(
             dataid=dataset_identifier, content_type=content_type
         )
-        return self._perform_request("get", resource)
+        if self.metadata_ttl is None or content_type != "json":
+            return self._perform_request("get", resource)
+
+        max_age = self.metadata_ttl if max_age is None else max_age
+        entry = self.metadata_cache.get(dataset_identifier)
+        # callers get copies, so that they cannot alter the cached metadata
+        if entry is not None and self.metadata_cache.is_fresh(entry, max_age):
+            return copy.deepcopy(entry.value)
+
+        headers = entry.validators if entry is not None else {}
+        response = self._send("get", resource, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.metadata_cache.touch(dataset_identifier)
+            return copy.deepcopy(entry.value)
+
+        metadata = self._decode(response)
+        if isinstance(metadata, dict):
+            self.metadata_cache.store(dataset_identifier, metadata, response.headers)
+            return copy.deepcopy(metadata)
+        return metadata
+
+    def get_dataset_version(self, dataset_identifier):
+        """
+        Return a value that changes whenever the rows of a dataset are modified, from
+        metadata revalidated with the server.
+        """
+        return utils.dataset_version(self.get_metadata(dataset_identifier, max_age=0))
 
     def update_metadata(self, dataset_identifier, update_fields, content_type="json"):
         """
@@ -308,6 +392,7 @@ class Socrata:
         resource = utils.format_old_api_request(
             dataid=dataset_identifier, content_type=content_type
         )
+        self.metadata_cache.invalidate(dataset_identifier)
         return self._perform_update("put", resource, update_fields)
 
     def download_attachments(
@@ -348,9 +433,7 @@ class Socrata:
             utils.download_file(uri, file_path)
             files.append(file_path)
 
-        logging.info(
-            "The following files were downloaded:\n\t%s", "\n\t".join(files)
-        )
+        logging.info("The following files were downloaded:\n\t%s", "\n\t".join(files))
         return files
 
     def publish(self, dataset_identifier, content_type="json"):
@@ -361,6 +444,7 @@ class Socrata:
         base = utils.format_old_api_request(dataid=dataset_identifier)
         resource = "{}/publication.{}".format(base, content_type)
 
+        self.metadata_cache.invalidate(dataset_identifier)
         return self._perform_request("post", resource)
 
     def get(self, dataset_identifier, content_type="json", **kwargs):
@@ -387,6 +471,19 @@ class Socrata:
         More information about system fields can be found here:
             http://dev.socrata.com/docs/system-fields.html
         """
+        resource, headers, params = self._get_request(
+            dataset_identifier, content_type, kwargs
+        )
+        response = self._perform_request(
+            "get", resource, headers=headers, params=params
+        )
+        return response
+
+    def _get_request(self, dataset_identifier, content_type, kwargs):
+        """
+        Build the resource, headers and query parameters of a get() call.
+        """
+        kwargs = dict(kwargs)
         resource = utils.format_new_api_request(
             dataid=dataset_identifier, content_type=content_type
         )
@@ -407,47 +504,560 @@ class Socrata:
 
         # Additional parameters, such as field names
         params.update(kwargs)
-        params = utils.clear_empty_values(params)
-
-        response = self._perform_request(
-            "get", resource, headers=headers, params=params
-        )
-        return response
+        # equivalent queries are sent as the same URL, for the benefit of caches
+        params = soql.canonical_params(utils.clear_empty_values(params))
+        return resource, headers, params
 
-    def get_all(self, *args, **kwargs):
+    def get_all(
+        self,
+        dataset_identifier,
+        content_type="json",
+        checkpoint=None,
+        prefetch=0,
+        adaptive=False,
+        page_store=None,
+        decode_executor=None,
+        decode_depth=None,
+        **kwargs
+    ):
         """
         Read data from the requested resource, paginating over all results.
         Accepts the same arguments as get(). Returns a generator.
+
+            checkpoint : path to a file where progress is saved after every page. If the
+                file exists, the extraction resumes after the last page that was fully
+                consumed. An exception is raised if the checkpoint belongs to a different
+                query, or if the dataset was modified since it was written. The file is
+                removed once all results have been read. A Checkpoint can be passed
+                instead of a path, for its `data` to be saved along with the progress.
+            prefetch : number of pages to download in the background while the current
+                page is being consumed, defaults to 0. At most this many pages are queued
+                besides the current one, plus the one the background thread holds while
+                waiting for room in the queue.
+            adaptive : if true, the page size is tuned between pages from the observed
+                throughput, response size and errors, starting from `limit`. Pass a
+                PageSizeTuner to configure its bounds.
+            page_store : a PageStore that the pages are written to as they are read.
+                If it already holds the complete result of the same query, for the
+                current version of the dataset, the rows are read from it instead.
+            decode_executor : a concurrent.futures executor, such as a
+                ProcessPoolExecutor, that decodes json and csv pages so that large pages
+                are parsed on several cores, or the number of processes of such a pool to
+                create for this call. Only the decoding is parallel: pages are still
+                requested one at a time, by the thread reading them, ahead of the page
+                being read, and yielded in order. Cannot be combined with `adaptive`.
+            decode_depth : number of pages requested ahead and decoded at once with
+                `decode_executor`. Defaults to its number of processes when it is a
+                number, and to the number of CPUs otherwise.
         """
+        if adaptive and decode_executor is not None:
+            raise Exception("The adaptive and decode_executor arguments are exclusive.")
+        if isinstance(decode_executor, bool) or (
+            isinstance(decode_executor, int) and decode_executor < 1
+        ):
+            raise TypeError(
+                "decode_executor must be an executor or a positive number of processes."
+            )
+        if decode_depth is None:
+            if isinstance(decode_executor, int):
+                decode_depth = decode_executor
+            else:
+                decode_depth = os.cpu_count() or 1
+        elif (
+            isinstance(decode_depth, bool)
+            or not isinstance(decode_depth, int)
+            or decode_depth < 1
+        ):
+            raise TypeError("decode_depth must be a positive number of pages.")
         params = {}
         params.update(kwargs)
         if "offset" not in params:
             params["offset"] = 0
-        limit = params.get("limit", self.DEFAULT_LIMIT)
 
-        while True:
-            response = self.get(*args, **params)
-            for item in response:
+        version = store_key = writer = None
+        if checkpoint is not None or page_store is not None:
+            fingerprint = query_fingerprint(
+                self.domain, dataset_identifier, content_type, params
+            )
+            version = self.get_dataset_version(dataset_identifier)
+
+        if page_store is not None:
+            store_key = self._page_store_key(fingerprint, params)
+            stored = page_store.open(store_key, version)
+            if stored is not None:
+                with stored:
+                    for item in stored:
+                        yield item
+                return
+
+        if checkpoint is not None:
+            if not isinstance(checkpoint, Checkpoint):
+                checkpoint = Checkpoint(checkpoint)
+            checkpoint.fingerprint = fingerprint
+            checkpoint.version = version
+            if checkpoint.load():
+                params["offset"] = checkpoint.offset
+                # a partial result is not worth storing
+                store_key = None
+
+        if store_key is not None:
+            writer = page_store.writer(store_key, version)
+        owned_executor = None
+        if isinstance(decode_executor, int):
+            owned_executor = ProcessPoolExecutor(max_workers=decode_executor)
+        try:
+            for item in self._iter_pages(
+                dataset_identifier,
+                content_type,
+                params,
+                checkpoint,
+                prefetch,
+                adaptive,
+                writer,
+                owned_executor or decode_executor,
+                decode_depth,
+            ):
                 yield item
+        finally:
+            if writer is not None:
+                writer.close()
+            if owned_executor is not None:
+                owned_executor.shutdown(wait=True)
+
+    def get_stored(self, dataset_identifier, page_store, content_type="json", **kwargs):
+        """
+        Return the StoredResult of a get_all() call with the same arguments that was
+        written to `page_store`, to read its pages in any order, e.g.
+            stored = client.get_stored("nimj-3ivp", store, where="depth > 300")
+            last_page = stored.page(len(stored) - 1)
+        Returns None if the page store holds no complete result for the current version
+        of the dataset.
+        """
+        params = dict(kwargs)
+        params.setdefault("offset", 0)
+        fingerprint = query_fingerprint(
+            self.domain, dataset_identifier, content_type, params
+        )
+        return page_store.open(
+            self._page_store_key(fingerprint, params),
+            self.get_dataset_version(dataset_identifier),
+        )
+
+    @staticmethod
+    def _page_store_key(fingerprint, params):
+        # the fingerprint leaves out the offset, which determines where the result starts
+        return "{}-{}".format(fingerprint, params["offset"])
+
+    def _iter_pages(
+        self,
+        dataset_identifier,
+        content_type,
+        params,
+        checkpoint,
+        prefetch,
+        adaptive,
+        writer,
+        decode_executor,
+        decode_depth,
+    ):
+        """
+        Yield the rows of every page of a get_all() call, saving progress to the
+        checkpoint and the pages to the page store writer, if any.
+        """
+        if adaptive:
+            tuner = adaptive if isinstance(adaptive, PageSizeTuner) else PageSizeTuner()
+            pages = self._get_tuned_pages(
+                dataset_identifier, content_type, params, tuner
+            )
+        elif decode_executor is not None:
+            pages = self._get_decoded_pages(
+                dataset_identifier, content_type, params, decode_executor, decode_depth
+            )
+        else:
+            pages = self._get_pages(dataset_identifier, content_type, params)
+        if prefetch:
+            pages = utils.prefetch(pages, prefetch)
+
+        for response, next_offset in self._timed_pages(pages):
+            if writer is not None:
+                writer.append(response)
+                if next_offset is None:
+                    writer.commit()
+
+            with self._phase("consume", rows=len(response)):
+                for item in response:
+                    yield item
+
+            if checkpoint is not None:
+                if next_offset is None:
+                    checkpoint.clear()
+                else:
+                    checkpoint.save(next_offset, len(response))
+            if next_offset is None:
+                return
+
+    def _timed_pages(self, pages):
+        """
+        Yield the (page, next offset) tuples of `pages`, instrumenting the wait for each
+        of them as a "page" phase.
+        """
+        pages = iter(pages)
+        while True:
+            with self._phase("page") as details:
+                page = next(pages, None)
+                if page is not None:
+                    details["rows"] = len(page[0])
+            if page is None:
+                return
+            yield page
+
+    def _get_pages(self, dataset_identifier, content_type, params):
+        """
+        Yield every page of results, along with the offset of the page that follows it (or
+        None for the last page).
+        """
+        limit = params.get("limit", self.DEFAULT_LIMIT)
 
+        while True:
+            response = self.get(dataset_identifier, content_type, **params)
             if len(response) < limit:
+                yield response, None
+                return
+            params["offset"] += limit
+            yield response, params["offset"]
+
+    def _get_decoded_pages(
+        self, dataset_identifier, content_type, params, executor, depth
+    ):
+        """
+        Same as _get_pages, but the pages are decoded by `executor`, with up to `depth`
+        pages requested ahead of the one being read. The requests themselves are made
+        one after the other on the calling thread. Pages are requested before knowing
+        whether the ones before them are the last, until one comes back empty, and the
+        requests past the end are discarded.
+        """
+        limit = params.get("limit", self.DEFAULT_LIMIT)
+        offset = params["offset"]
+        exhausted = False
+        window = deque()
+        try:
+            while True:
+                while not exhausted and len(window) < depth:
+                    resource, headers, query = self._get_request(
+                        dataset_identifier, content_type, dict(params, offset=offset)
+                    )
+                    response = self._send(
+                        "get", resource, headers=headers, params=query
+                    )
+                    window.append(self._submit_decode(executor, response))
+                    exhausted = utils.is_empty_page(
+                        response.content,
+                        utils.response_format(response.headers.get("content-type", "")),
+                    )
+                    offset += limit
+
+                data = window.popleft().result()
+                if len(data) < limit:
+                    yield data, None
+                    return
+                params["offset"] += limit
+                yield data, params["offset"]
+        finally:
+            for future in window:
+                future.cancel()
+
+    def _submit_decode(self, executor, response):
+        """
+        Decode a response with `executor` if its format can be decoded in another
+        process. Returns a future of the decoded data.
+        """
+        response_format = utils.response_format(
+            response.headers.get("content-type", "")
+        )
+        if response.content and response_format in ("json", "csv"):
+            return executor.submit(
+                utils.decode_body,
+                response.content,
+                response_format,
+                self.json_codec.loads,
+                response.encoding,
+            )
+        future = Future()
+        future.set_result(self._decode(response))
+        return future
+
+    def _get_tuned_pages(self, dataset_identifier, content_type, params, tuner):
+        """
+        Same as _get_pages, but the size of each page is picked by `tuner`. Pages that fail
+        with a timeout or a server error are retried with a smaller size.
+        """
+        params["limit"] = tuner.start(params.get("limit", self.DEFAULT_LIMIT))
+        retries = 0
+
+        while True:
+            resource, headers, query = self._get_request(
+                dataset_identifier, content_type, params
+            )
+            started = time.monotonic()
+            try:
+                response = self._send("get", resource, headers=headers, params=query)
+            except requests.exceptions.RequestException as e:
+                if retries >= tuner.max_retries or not utils.is_transient_error(e):
+                    raise
+                retries += 1
+                params["limit"] = tuner.record_error()
+                continue
+            elapsed = time.monotonic() - started
+            retries = 0
+
+            data = self._decode(response)
+            limit = params["limit"]
+            params["limit"] = tuner.record(len(data), elapsed, len(response.content))
+            if len(data) < limit:
+                yield data, None
                 return
             params["offset"] += limit
+            yield data, params["offset"]
+
+    def get_partitioned(
+        self,
+        dataset_identifier,
+        column,
+        partitions=4,
+        max_workers=None,
+        merge=True,
+        **kwargs
+    ):
+        """
+        Read all data from the requested resource by splitting it into disjoint ranges over
+        `column` and paginating over each range in parallel. `column` must be a numeric or
+        date column, or :id on datasets with numeric row ids. Accepts the same keyword
+        arguments as get().
+
+            partitions : number of ranges to split the column into, defaults to 4. Rows
+                where the column is null are fetched as one extra partition.
+            max_workers : max number of partitions fetched at once, defaults to all of them
+            merge : if true (the default), return a generator over all rows, partition by
+                partition. Pages are streamed as they arrive, and each partition being
+                fetched stays at most one page ahead of the caller. Otherwise, return a
+                list of (where clause, rows) tuples.
+        """
+        kwargs.pop("offset", None)
+        kwargs.setdefault("order", ":id")
+        content_type = kwargs.pop("content_type", "json")
+        user_where = kwargs.pop("where", None)
+
+        # the bounds must cover the rows that the partitions return, so they are computed
+        # over the same filters
+        filters = {
+            key: value
+            for key, value in kwargs.items()
+            if key not in ("select", "order", "group", "limit", "format")
+        }
+        bounds = self.get(
+            dataset_identifier,
+            select="min({0}) AS min_value, max({0}) AS max_value".format(column),
+            where=user_where,
+            **filters
+        )
+        bounds = bounds[0] if bounds else {}
+        clauses = utils.partition_where(
+            column, bounds.get("min_value"), bounds.get("max_value"), partitions
+        )
+        if user_where:
+            clauses = ["({}) AND ({})".format(user_where, clause) for clause in clauses]
+
+        def fetch(where):
+            params = dict(kwargs, where=where, offset=0)
+            for page, _ in self._get_pages(dataset_identifier, content_type, params):
+                yield page
 
-    def upsert(self, dataset_identifier, payload, content_type="json"):
+        workers = max_workers or len(clauses)
+        if not merge:
+
+            def fetch_all(where):
+                return [item for page in fetch(where) for item in page]
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(zip(clauses, executor.map(fetch_all, clauses)))
+
+        return self._iter_partitions(fetch, clauses, workers)
+
+    @staticmethod
+    def _iter_partitions(fetch, partitions, max_workers):
+        """
+        Yield the items of the pages of each partition in order. Up to `max_workers`
+        partitions are read at once, each at most one page ahead of the caller, so that
+        at most 3 pages per partition in progress are held in memory.
+        """
+        pages = utils.prefetch_each(
+            (fetch(partition) for partition in partitions), max_workers
+        )
+        try:
+            for page in pages:
+                for item in page:
+                    yield item
+        finally:
+            pages.close()
+
+    def get_tiled(
+        self,
+        dataset_identifier,
+        column,
+        bounds,
+        tiles=(2, 2),
+        max_workers=None,
+        **kwargs
+    ):
+        """
+        Read the GeoJSON features of a geo dataset within a bounding box, by splitting the
+        box into a grid of tiles that are queried with within_box() and paginated over in
+        parallel. Returns a generator of features, tile by tile. Accepts the same keyword
+        arguments as get().
+
+            column : the location or point column to filter on
+            bounds : the bounding box, as (west, south, east, north) coordinates
+            tiles : the size of the grid, as (rows, columns), defaults to (2, 2)
+            max_workers : max number of tiles fetched at once, defaults to all of them
+
+        Features on the edge between two tiles are returned by both, and are only yielded
+        once: features whose `column` is a point belong to the tile north-east of them,
+        and the others are de-duplicated on their row id. The row id is selected along
+        with the other fields, as the :id property of the features.
+        """
+        kwargs.pop("offset", None)
+        kwargs.setdefault("order", ":id")
+        user_where = kwargs.pop("where", None)
+        limit = kwargs.pop("limit", self.DEFAULT_LIMIT)
+        select = kwargs.get("select") or "*"
+        if ":id" not in select:
+            kwargs["select"] = ":id, {}".format(select)
+        grid = utils.tile_bounds(bounds, tiles)
+
+        def fetch(tile):
+            west, south, east, north = tile
+            where = "within_box({}, {}, {}, {}, {})".format(
+                column, north, west, south, east
+            )
+            if user_where:
+                where = "({}) AND {}".format(user_where, where)
+            offset = 0
+            while True:
+                page = self.get(
+                    dataset_identifier,
+                    content_type="geojson",
+                    where=where,
+                    limit=limit,
+                    offset=offset,
+                    **kwargs
+                )
+                page = page.get("features", [])
+                yield [
+                    feature
+                    for feature in page
+                    if utils.owns_feature(tile, bounds, feature, column) is not False
+                ]
+                if len(page) < limit:
+                    return
+                offset += limit
+
+        features = self._iter_partitions(fetch, grid, max_workers or len(grid))
+        return self._iter_unique_features(features, column)
+
+    @staticmethod
+    def _iter_unique_features(features, column):
+        """
+        Skip the features that were already yielded by another tile, other than those
+        whose `column` is a point, which belong to a single tile.
+        """
+        seen = set()
+        for feature in features:
+            if utils.feature_point(feature, column) is None:
+                row_id = (feature.get("properties") or {}).get(":id")
+                if row_id is not None:
+                    if row_id in seen:
+                        continue
+                    seen.add(row_id)
+            yield feature
+
+    def get_many(self, datasets, method="get", max_workers=8, **kwargs):
+        """
+        Run get() or get_metadata() over many datasets at once, with at most `max_workers`
+        requests in flight. Returns a generator of BatchResult(dataset_identifier, result,
+        error) tuples, in the order in which the requests complete. A failed request
+        yields its exception as `error`, and does not stop the others.
+
+            datasets : iterable of dataset identifiers, or of (dataset_identifier, params)
+                tuples to pass different query parameters to each dataset. A dict mapping
+                identifiers to params also works.
+            method : "get" or "get_metadata"
+        Any other keyword argument is passed to every call, e.g.
+            client.get_many(["nimj-3ivp", "eb9n-hr43"], limit=10)
+        """
+        if method not in ("get", "get_metadata"):
+            raise Exception(
+                "Unknown method {}. Supported methods are get and get_metadata.".format(
+                    method
+                )
+            )
+        if isinstance(datasets, dict):
+            datasets = datasets.items()
+
+        calls = []
+        for dataset in datasets:
+            if isinstance(dataset, str):
+                dataset, params = dataset, {}
+            else:
+                dataset, params = dataset
+            call_kwargs = dict(kwargs)
+            call_kwargs.update(params or {})
+            calls.append((dataset, call_kwargs))
+
+        return self._iter_completed(getattr(self, method), calls, max_workers)
+
+    @staticmethod
+    def _iter_completed(func, calls, max_workers):
+        """
+        Yield a BatchResult for every func(dataset_identifier, **kwargs) call, as soon as
+        it completes.
+        """
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {
+            executor.submit(func, dataset, **call_kwargs): dataset
+            for dataset, call_kwargs in calls
+        }
+        try:
+            for future in as_completed(futures):
+                error = future.exception()
+                result = None if error is not None else future.result()
+                yield BatchResult(futures[future], result, error)
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def upsert(self, dataset_identifier, payload, content_type="json", progress=None):
         """
         Insert, update or delete data to/from an existing dataset. Currently
         supports json and csv file objects. See here for the upsert
         documentation:
             http://dev.socrata.com/publishers/upsert.html
+
+        The payload can also be any other iterable of rows, such as a generator,
+        which is encoded and sent one row at a time with chunked transfer encoding
+        instead of being built in memory first.
+
+            progress : a callable invoked as progress(bytes_sent, rows_sent) while the
+                payload is uploaded. For csv files, rows are counted as lines.
         """
         resource = utils.format_new_api_request(
             dataid=dataset_identifier, content_type=content_type
         )
 
-        return self._perform_update("post", resource, payload)
+        self.metadata_cache.invalidate(dataset_identifier)
+        return self._perform_update("post", resource, payload, progress=progress)
 
-    def replace(self, dataset_identifier, payload, content_type="json"):
+    def replace(self, dataset_identifier, payload, content_type="json", progress=None):
         """
         Same logic as upsert, but overwrites existing data with the payload
         using PUT instead of POST.
@@ -456,7 +1066,240 @@ class Socrata:
             dataid=dataset_identifier, content_type=content_type
         )
 
-        return self._perform_update("put", resource, payload)
+        self.metadata_cache.invalidate(dataset_identifier)
+        return self._perform_update("put", resource, payload, progress=progress)
+
+    def upsert_rows(
+        self,
+        dataset_identifier,
+        rows,
+        batch_size=1000,
+        max_workers=4,
+        progress=None,
+        bisect=True,
+    ):
+        """
+        Upsert many rows at once, in batches of `batch_size` rows with at most
+        `max_workers` batches in flight, e.g.
+            result = client.upsert_rows("nimj-3ivp", read_ndjson(f))
+            for failure in result.failures:
+                print(failure.rows, failure.error)
+
+        When a batch is rejected because of its payload, with a 400, 413 or 422 error, it
+        is split in halves that are sent again, until the rows that are rejected on their
+        own are isolated. The other rows go through, and a bad row costs about 2 log2
+        `batch_size` extra requests. Pass bisect=False to give up on the whole batch.
+
+            rows : iterable of rows
+            progress : a callable invoked as progress(bytes_sent, rows_sent). Rows that
+                are sent again while isolating bad rows are counted again.
+
+        Returns a BulkResult(counts, failures) tuple, where `counts` are the counts of the
+        upsert responses summed over all requests, and `failures` is a list of
+        BatchFailure(rows, error) tuples for the rejected rows and failed batches.
+        """
+        failures = []
+        counts = self._upsert_batches(
+            dataset_identifier,
+            rows,
+            batch_size,
+            progress=progress,
+            max_workers=max_workers,
+            failures=failures,
+            bisect=bisect,
+        )
+        return BulkResult(counts, failures)
+
+    def replace_diff(
+        self,
+        dataset_identifier,
+        payload,
+        row_identifier=None,
+        digests=None,
+        batch_size=10000,
+        progress=None,
+    ):
+        """
+        Make the rows of a dataset match the payload, an iterable of rows, by upserting
+        only the rows that were added or changed, and deleting the rows that are no
+        longer in it. Unlike replace(), rows that did not change are not sent.
+
+        Rows are matched on the dataset's row identifier, or on the `row_identifier`
+        field if given, and compared by the digests of their contents.
+
+            digests : a dict of row identifier to digest, as returned by row_digests(),
+                kept from a previous call so that the current rows do not need to be
+                downloaded. It is updated in place once all changes have been sent.
+            batch_size : number of rows per upsert request
+            progress : a callable invoked as progress(bytes_sent, rows_sent)
+
+        Returns the counts of the upsert responses summed over all batches, along with
+        the number of "Rows Unchanged".
+        """
+        if row_identifier is None:
+            row_identifier = self.get_row_identifier(dataset_identifier)
+        if digests is None:
+            digests = self.row_digests(dataset_identifier, row_identifier)
+
+        remaining = set(digests)
+        changed = {}
+        unchanged = [0]
+
+        def changes():
+            for row in payload:
+                if row.get(row_identifier) is None:
+                    raise Exception(
+                        "Row has no value for the row identifier {}: {}".format(
+                            row_identifier, row
+                        )
+                    )
+                key = utils.normalize_value(row[row_identifier])
+                digest = utils.row_digest(row)
+                remaining.discard(key)
+                if digests.get(key) == digest:
+                    unchanged[0] += 1
+                    continue
+                changed[key] = digest
+                yield row
+            for key in remaining:
+                yield {row_identifier: key, ":deleted": True}
+
+        result = self._upsert_batches(
+            dataset_identifier, changes(), batch_size, progress=progress
+        )
+        result["Rows Unchanged"] = unchanged[0]
+
+        digests.update(changed)
+        for key in remaining:
+            del digests[key]
+        return result
+
+    def row_digests(self, dataset_identifier, row_identifier=None, **kwargs):
+        """
+        Download the rows of a dataset and return a dict of the digest of each row, keyed
+        on its row identifier, for use with replace_diff(). Keyword arguments are passed
+        to get_all().
+        """
+        if row_identifier is None:
+            row_identifier = self.get_row_identifier(dataset_identifier)
+        kwargs.setdefault("order", ":id")
+        return {
+            utils.normalize_value(row[row_identifier]): utils.row_digest(row)
+            for row in self.get_all(dataset_identifier, **kwargs)
+            if row.get(row_identifier) is not None
+        }
+
+    def get_row_identifier(self, dataset_identifier):
+        """
+        Return the field name of the column set as the row identifier of a dataset. Raises
+        an exception if the dataset has none.
+        """
+        metadata = self.get_metadata(dataset_identifier)
+        column_id = metadata.get("rowIdentifierColumnId") or metadata.get(
+            "metadata", {}
+        ).get("rowIdentifier")
+        for column in metadata.get("columns", []):
+            if column_id is not None and column_id in (
+                column.get("id"),
+                column.get("fieldName"),
+            ):
+                return column["fieldName"]
+        raise Exception(
+            "Dataset {} has no row identifier. Pass the row_identifier argument to match"
+            " rows on a field instead.".format(dataset_identifier)
+        )
+
+    def _upsert_batches(
+        self,
+        dataset_identifier,
+        rows,
+        batch_size,
+        progress=None,
+        max_workers=1,
+        failures=None,
+        bisect=False,
+    ):
+        """
+        Upsert an iterable of rows in batches of `batch_size`, with at most `max_workers`
+        batches in flight. Returns the counts of the responses summed over all batches.
+
+        A failed batch raises its exception, unless a `failures` list is given, in which
+        case a BatchFailure(rows, error) is appended to it and the other batches go on.
+        With `bisect`, which requires a `failures` list, batches rejected because of their
+        payload are split to isolate the rows at fault.
+        """
+        totals = {}
+        sent = [0, 0]
+        lock = threading.Lock()
+
+        def report(nbytes, nrows):
+            with lock:
+                sent[0] += nbytes
+                sent[1] += nrows
+                if progress is not None:
+                    progress(sent[0], sent[1])
+
+        def send(batch):
+            if bisect:
+                return self._upsert_bisecting(
+                    dataset_identifier, batch, report, failures
+                )
+            return self.upsert(dataset_identifier, batch, progress=report)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = {}
+        try:
+            for batch in utils.iter_batches(rows, batch_size):
+                if len(pending) >= max_workers:
+                    self._collect_batches(pending, totals, failures, FIRST_COMPLETED)
+                pending[executor.submit(send, batch)] = batch
+            self._collect_batches(pending, totals, failures, ALL_COMPLETED)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+        return totals
+
+    def _upsert_bisecting(self, dataset_identifier, rows, progress, failures):
+        """
+        Upsert a batch of rows, splitting it in halves recursively when it is rejected
+        because of its payload. The rows that still fail are appended to `failures`, and
+        the counts of the successful requests are returned.
+        """
+        try:
+            return self.upsert(dataset_identifier, rows, progress=progress)
+        except Exception as e:
+            if len(rows) == 1 or not utils.is_payload_error(e):
+                raise
+
+        totals = {}
+        middle = len(rows) // 2
+        for half in (rows[:middle], rows[middle:]):
+            try:
+                response = self._upsert_bisecting(
+                    dataset_identifier, half, progress, failures
+                )
+            except Exception as e:
+                failures.append(BatchFailure(half, e))
+            else:
+                utils.add_counts(totals, response)
+        return totals
+
+    @staticmethod
+    def _collect_batches(pending, totals, failures, return_when):
+        """
+        Wait for upsert batches to complete, and account for their results.
+        """
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            batch = pending.pop(future)
+            error = future.exception()
+            if error is None:
+                utils.add_counts(totals, future.result())
+            elif failures is None:
+                raise error
+            else:
+                failures.append(BatchFailure(batch, error))
 
     def create_non_data_file(self, params, file_data):
         """
@@ -492,24 +1335,40 @@ class Socrata:
 
         return self._perform_request("post", resource, params=params, files=file_data)
 
-    def _perform_update(self, method, resource, payload):
+    def _perform_update(self, method, resource, payload, progress=None):
         """
         Execute the update task.
         """
 
         if isinstance(payload, (dict, list)):
-            response = self._perform_request(method, resource, data=json.dumps(payload))
+            with self._phase("encode"):
+                data = self.json_codec.dumps(payload)
+            if progress is not None:
+                progress(len(data), len(payload) if isinstance(payload, list) else 1)
+            response = self._perform_request(method, resource, data=data)
         elif isinstance(payload, IOBase):
             headers = {
                 "content-type": "text/csv",
             }
+            if progress is not None:
+                payload = utils.iter_file_chunks(payload, progress)
             response = self._perform_request(
                 method, resource, data=payload, headers=headers
             )
+        elif hasattr(payload, "__iter__") and not isinstance(payload, (str, bytes)):
+            headers = {
+                "content-type": "application/json",
+            }
+            response = self._perform_request(
+                method,
+                resource,
+                data=utils.iter_json_array(payload, progress, self.json_codec.dumps),
+                headers=headers,
+            )
         else:
             raise Exception(
                 "Unrecognized payload {}. Currently only list-, dictionary-,"
-                " and file-types are supported.".format(type(payload))
+                " iterable- and file-types are supported.".format(type(payload))
             )
 
         return response
@@ -529,13 +1388,55 @@ class Socrata:
             resource = utils.format_old_api_request(
                 dataid=dataset_identifier, content_type=content_type
             )
+            self.metadata_cache.invalidate(dataset_identifier)
 
         return self._perform_request("delete", resource)
 
+    def delete_rows(
+        self,
+        dataset_identifier,
+        row_ids,
+        id_field=":id",
+        batch_size=1000,
+        max_workers=4,
+        progress=None,
+    ):
+        """
+        Delete many rows at once, e.g.
+            client.delete_rows("nimj-3ivp", [4, 8, 15, 16, 23, 42])
+        The rows are deleted through upserts of `batch_size` rows marked as `:deleted`,
+        with at most `max_workers` batches in flight, instead of one request per row.
+
+            row_ids : iterable of the values of `id_field` of the rows to delete
+            id_field : ":id", or the dataset's row identifier field
+            progress : a callable invoked as progress(bytes_sent, rows_sent)
+
+        Returns a BulkResult(counts, failures) tuple, where `counts` are the counts of the
+        upsert responses summed over all batches, such as "Rows Deleted", and `failures`
+        is a list of BatchFailure(rows, error) tuples for the batches that failed.
+        """
+        failures = []
+        counts = self._upsert_batches(
+            dataset_identifier,
+            ({id_field: row_id, ":deleted": True} for row_id in row_ids),
+            batch_size,
+            progress=progress,
+            max_workers=max_workers,
+            failures=failures,
+        )
+        return BulkResult(counts, failures)
+
     def _perform_request(self, request_type, resource, **kwargs):
         """
         Utility method that performs all requests.
         """
+        response = self._send(request_type, resource, **kwargs)
+        return self._decode(response)
+
+    def _send(self, request_type, resource, **kwargs):
+        """
+        Send a request and check its status. Returns the raw response.
+        """
         request_type_methods = set(["get", "post", "put", "delete"])
         if request_type not in request_type_methods:
             raise Exception(
@@ -548,36 +1449,94 @@ class Socrata:
         # set a timeout, just to be safe
         kwargs["timeout"] = self.timeout
 
-        response = getattr(self.session, request_type)(uri, **kwargs)
+        with ExitStack() as stack:
+            if self.limiter is not None:
+                with self._phase("wait"):
+                    stack.enter_context(self.limiter)
+            response = self._request(request_type, uri, kwargs)
 
         # handle errors
         if response.status_code not in (200, 202):
             utils.raise_for_status(response)
 
+        return response
+
+    def _request(self, request_type, uri, kwargs):
+        with self._phase("body", method=request_type, uri=uri) as details:
+            response = self.transport.request(request_type, uri, **kwargs)
+            if self.profiler is not None or self.tracer is not None:
+                details["bytes"] = len(response.content)
+        return response
+
+    @contextmanager
+    def _phase(self, name, **details):
+        """
+        Instrument a phase of a request with the profiler and the tracer, if any. Yields
+        a dict of details about the phase, which can be added to.
+        """
+        hooks = [
+            hook
+            for hook in (
+                self.profiler and self.profiler.phase,
+                self.tracer and self.tracer.span,
+            )
+            if hook
+        ]
+        if not hooks:
+            yield details
+            return
+        with ExitStack() as stack:
+            recorded = [stack.enter_context(hook(name, **details)) for hook in hooks]
+            try:
+                yield details
+            finally:
+                for hook_details in recorded:
+                    hook_details.update(details)
+
+    def _decode(self, response):
+        """
+        Turn a raw response into the most useful data for its content type. The body is
+        only ever handled as bytes, unless the content type is a text format.
+        """
         # when responses have no content body (ie. delete, set_permission),
         # simply return the whole response
-        if not response.text:
+        if response.headers.get("content-length") == "0" or not response.content:
             return response
 
         # for other request types, return most useful data
-        content_type = response.headers.get("content-type").strip().lower()
-        if re.match(r"application\/(vnd\.geo\+)?json", content_type):
-            return response.json()
-        if re.match(r"text\/csv", content_type):
-            csv_stream = StringIO(response.text)
-            return list(csv.reader(csv_stream))
-        if re.match(r"application\/rdf\+xml", content_type):
-            return response.content
-        if re.match(r"text\/plain", content_type):
-            try:
-                return json.loads(response.text)
-            except ValueError:
-                return response.text
+        content_type = response.headers.get("content-type", "")
+        decoder = self._DECODERS.get(utils.response_format(content_type))
+        if decoder is None:
+            raise Exception(
+                "Unknown response format: {}".format(content_type.strip().lower())
+            )
+        with self._phase("decode", bytes=len(response.content)):
+            return decoder(self, response)
+
+    def _decode_json(self, response):
+        return self.json_codec.loads(response.content)
+
+    def _decode_csv(self, response):
+        return utils.decode_body(response.content, "csv", encoding=response.encoding)
+
+    def _decode_rdf(self, response):
+        return response.content
+
+    def _decode_text(self, response):
+        try:
+            return self.json_codec.loads(response.content)
+        except ValueError:
+            return utils.decode_text(response)
 
-        raise Exception("Unknown response format: {}".format(content_type))
+    _DECODERS = {
+        "json": _decode_json,
+        "csv": _decode_csv,
+        "rdf": _decode_rdf,
+        "text": _decode_text,
+    }
 
     def close(self):
         """
         Close the session.
         """
-        self.session.close()
+        self.transport.close()
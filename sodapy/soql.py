@@ -0,0 +1,274 @@
+import re
+
+
+class UnsupportedQuery(Exception):
+    """
+    Raised when a SoQL query uses syntax that cannot be translated to SQL.
+    """
+
+
+# (token type, pattern), tried in order
+TOKEN_PATTERNS = [
+    ("space", r"\s+"),
+    ("string", r"'(?:[^']|'')*'"),
+    ("number", r"\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?"),
+    ("name", r":?@?[A-Za-z_][A-Za-z0-9_]*|`[^`]+`"),
+    ("op", r"<=|>=|!=|<>|\|\||[=<>+\-*/%]"),
+    ("punct", r"[(),]"),
+]
+TOKEN_RE = re.compile("|".join("(?P<{}>{})".format(t, p) for t, p in TOKEN_PATTERNS))
+
+KEYWORDS = set(
+    ["and", "or", "not", "is", "null", "in", "between", "like", "as", "asc", "desc"]
+)
+SQL_FUNCTIONS = {
+    "count": "COUNT",
+    "sum": "SUM",
+    "min": "MIN",
+    "max": "MAX",
+    "avg": "AVG",
+    "upper": "UPPER",
+    "lower": "LOWER",
+}
+AGGREGATES = set(["count", "sum", "min", "max", "avg"])
+
+
+def tokenize(soql):
+    """
+    Split a SoQL expression into a list of (type, text) tuples, leaving out whitespace.
+    """
+    tokens = []
+    position = 0
+    while position < len(soql):
+        match = TOKEN_RE.match(soql, position)
+        if match is None:
+            raise UnsupportedQuery(
+                "Unexpected character {!r} in {!r}".format(soql[position], soql)
+            )
+        if match.lastgroup != "space":
+            tokens.append((match.lastgroup, match.group()))
+        position = match.end()
+    return tokens
+
+
+def split_top_level(tokens, separator=","):
+    """
+    Split tokens on a separator that is not nested in parentheses.
+    """
+    parts = [[]]
+    depth = 0
+    for token in tokens:
+        text = token[1]
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        if depth == 0 and text.lower() == separator:
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    return parts
+
+
+def column_name(text):
+    return text[1:-1] if text.startswith("`") else text
+
+
+def quote_identifier(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class SQLTranslator:
+    """
+    Translates the clauses of a SoQL query that only use plain comparisons, boolean
+    logic and a few common functions into SQLite, for the columns of a mirrored table.
+    Anything else raises UnsupportedQuery.
+    """
+
+    def __init__(self, columns):
+        self.columns = set(columns)
+
+    def expression(self, soql):
+        return " ".join(self._translate(tokenize(soql)))
+
+    def _translate(self, tokens):
+        sql = []
+        for i, (kind, text) in enumerate(tokens):
+            following = tokens[i + 1][1] if i + 1 < len(tokens) else None
+            lowered = text.lower()
+            if kind == "name" and lowered in KEYWORDS:
+                sql.append(lowered.upper())
+            elif kind == "name" and following == "(":
+                if lowered not in SQL_FUNCTIONS:
+                    raise UnsupportedQuery("Unsupported function {}".format(text))
+                sql.append(SQL_FUNCTIONS[lowered])
+            elif kind == "name" and lowered in ("true", "false"):
+                sql.append("1" if lowered == "true" else "0")
+            elif kind == "name":
+                name = column_name(text)
+                if name not in self.columns:
+                    raise UnsupportedQuery("Unknown column {}".format(name))
+                sql.append(quote_identifier(name))
+            else:
+                sql.append(text)
+        return sql
+
+    def select(self, soql):
+        """
+        Translate a $select clause. Returns the SQL select list, and the name of each
+        result column as the API would name it.
+        """
+        items = []
+        names = []
+        for item in split_top_level(tokenize(soql)):
+            alias = None
+            if len(item) > 2 and item[-2][1].lower() == "as":
+                alias = column_name(item[-1][1])
+                item = item[:-2]
+            if len(item) == 1 and item[0][1] == "*":
+                for name in sorted(self.columns):
+                    items.append(quote_identifier(name))
+                    names.append(name)
+                continue
+            name = alias or self._default_name(item)
+            expression = " ".join(self._translate(item))
+            items.append("{} AS {}".format(expression, quote_identifier(name)))
+            names.append(name)
+        return ", ".join(items), names
+
+    @staticmethod
+    def _default_name(item):
+        """
+        Name unaliased columns and aggregates the way the API does, e.g. `count` for
+        count(*) and `sum_depth` for sum(depth).
+        """
+        texts = [text for _, text in item]
+        if len(item) == 1 and item[0][0] == "name":
+            return column_name(texts[0])
+        if len(item) == 4 and texts[1] == "(" and texts[3] == ")":
+            function = texts[0].lower()
+            if function == "count" and texts[2] == "*":
+                return "count"
+            if function in AGGREGATES and item[2][0] == "name":
+                return "{}_{}".format(function, column_name(texts[2]))
+        raise UnsupportedQuery(
+            "Expressions in $select need an alias: {}".format(" ".join(texts))
+        )
+
+    def order(self, soql):
+        """
+        Translate an $order or $group clause.
+        """
+        return ", ".join(
+            " ".join(self._translate(item)) for item in split_top_level(tokenize(soql))
+        )
+
+
+# clauses of a query that are SoQL expressions, with or without the leading $
+SOQL_CLAUSES = set(["select", "where", "order", "group", "having", "query"])
+# clauses made of terms that can be reordered without changing the results
+CONJUNCTIVE_CLAUSES = set(["where", "having"])
+
+
+def canonicalize(soql, conjunctive=False):
+    """
+    Rewrite a SoQL clause in a canonical form, so that logically identical queries are
+    spelled the same way: keywords are upper case, function names lower case, spacing is
+    normalized, and if `conjunctive` is true, the terms of a top-level AND are sorted.
+    Clauses that cannot be tokenized are only stripped of surrounding whitespace.
+    """
+    try:
+        tokens = tokenize(soql)
+    except UnsupportedQuery:
+        return soql.strip()
+
+    if conjunctive:
+        terms = split_conjunction(tokens)
+        if len(terms) > 1:
+            return " AND ".join(sorted(format_tokens(term) for term in terms))
+    return format_tokens(tokens)
+
+
+def split_conjunction(tokens):
+    """
+    Split tokens on the ANDs at the top level of an expression. Returns a single term if
+    there is also a top-level OR, since AND takes precedence over it.
+    """
+    terms = [[]]
+    depth = 0
+    in_between = False
+    for token in tokens:
+        text = token[1].lower()
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        if depth == 0 and token[0] == "name":
+            if text == "or":
+                return [tokens]
+            if text == "between":
+                in_between = True
+            elif text == "and" and in_between:
+                in_between = False
+            elif text == "and":
+                terms.append([])
+                continue
+        terms[-1].append(token)
+    return terms
+
+
+def format_tokens(tokens):
+    """
+    Join tokens back into SoQL with normalized case and spacing.
+    """
+    parts = []
+    for i, (kind, text) in enumerate(tokens):
+        previous = tokens[i - 1] if i > 0 else None
+        following = tokens[i + 1][1] if i + 1 < len(tokens) else None
+        lowered = text.lower()
+        if kind == "name" and lowered in KEYWORDS:
+            text = lowered.upper()
+        elif kind == "name" and following == "(":
+            text = lowered
+
+        if previous is not None and not (
+            previous[1] == "("
+            or text in (")", ",")
+            or (text == "(" and is_function_name(previous))
+            or (previous[1] == "-" and is_unary(tokens[i - 2] if i > 1 else None))
+        ):
+            parts.append(" ")
+        parts.append(text)
+    return "".join(parts)
+
+
+def is_function_name(token):
+    return token[0] == "name" and token[1].lower() not in KEYWORDS
+
+
+def is_unary(token):
+    """
+    Whether an operator following `token` applies to the operand after it alone, as in
+    `x > -1`.
+    """
+    return (
+        token is None
+        or token[0] == "op"
+        or token[1] in ("(", ",")
+        or (token[0] == "name" and token[1].lower() in KEYWORDS)
+    )
+
+
+def canonical_params(params):
+    """
+    Canonicalize the SoQL clauses of a dict of query parameters, and order the
+    parameters by name.
+    """
+    result = {}
+    for name in sorted(params):
+        value = params[name]
+        clause = name.lstrip("$")
+        if clause in SOQL_CLAUSES and isinstance(value, str):
+            value = canonicalize(value, conjunctive=clause in CONJUNCTIVE_CLAUSES)
+        result[name] = value
+    return result
@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    """
+    Records a timeline of what a client does, and saves it in the Chrome trace format,
+    which can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing to see
+    where the time of concurrent extracts goes. Sample usage:
+        with Tracer("trace.json") as tracer:
+            client = Socrata("sandbox.demo.socrata.com", None, tracer=tracer)
+            for row in client.get_all("nimj-3ivp", prefetch=2):
+                process(row)
+
+    Every thread gets its own track, with a span for each phase of the client's work:
+    "wait" while the limiter holds a request back, "body" while a request is sent and
+    its response read, "decode" and "encode" for JSON and CSV processing, and for
+    get_all(), "page" while the caller waits for the next page and "consume" while it
+    processes the rows of a page.
+        path: the file that save() writes to, and that the trace is saved to when used
+            as a context manager
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.events = []
+        self._lock = threading.Lock()
+        self._threads = set()
+        self._pid = os.getpid()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        self.save()
+
+    @contextmanager
+    def span(self, name, category="sodapy", **args):
+        """
+        Record the body of the `with` statement as a span. Yields the arguments shown
+        with the span, which can be added to before it ends.
+        """
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            ended = time.perf_counter()
+            self._add(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": started * 1e6,
+                    "dur": (ended - started) * 1e6,
+                    "args": args,
+                }
+            )
+
+    def _add(self, event):
+        thread = threading.current_thread()
+        event["pid"] = self._pid
+        event["tid"] = thread.ident
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                self.events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self._pid,
+                        "tid": thread.ident,
+                        "args": {"name": thread.name},
+                    }
+                )
+            self.events.append(event)
+
+    def to_dict(self):
+        with self._lock:
+            events = list(self.events)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path=None):
+        """
+        Write the trace to `path`, or to the path the tracer was created with.
+        """
+        path = path or self.path
+        if path is None:
+            raise Exception("No path to save the trace to.")
+        with open(os.path.expanduser(path), "w") as outfile:
+            json.dump(self.to_dict(), outfile, default=str)
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+            self._threads = set()
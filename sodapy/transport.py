@@ -0,0 +1,137 @@
+import requests
+
+
+class RequestsTransport:
+    """
+    Sends requests with a requests.Session, over HTTP/1.1. This is the default transport,
+    and the only one that supports session adapters.
+    """
+
+    name = "requests"
+
+    def __init__(self, session=None):
+        self.session = session if session is not None else requests.Session()
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    @property
+    def auth(self):
+        return self.session.auth
+
+    @auth.setter
+    def auth(self, value):
+        self.session.auth = value
+
+    def mount(self, prefix, adapter):
+        self.session.mount(prefix, adapter)
+
+    def request(self, method, uri, **kwargs):
+        return getattr(self.session, method)(uri, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class HttpxTransport:
+    """
+    Sends requests with an httpx.Client, over HTTP/2 when the server supports it, so that
+    concurrent requests from several threads share a single connection instead of opening
+    one each. Requires the httpx package, with its http2 extra:
+        pip install httpx[http2]
+
+    Responses are adapted to look like requests responses, and connection errors and
+    timeouts are raised as their requests equivalents.
+        http2: whether to negotiate HTTP/2
+        client_kwargs: passed to httpx.Client, e.g. limits or a mock transport
+    """
+
+    name = "httpx"
+
+    def __init__(self, http2=True, **client_kwargs):
+        import httpx
+
+        self._httpx = httpx
+        self.client = httpx.Client(http2=http2, **client_kwargs)
+
+    @property
+    def headers(self):
+        return self.client.headers
+
+    @property
+    def auth(self):
+        return self.client.auth
+
+    @auth.setter
+    def auth(self, value):
+        self.client.auth = value
+
+    def mount(self, prefix, adapter):
+        raise TypeError(
+            "Session adapters can only be used with the requests transport."
+        )
+
+    def request(self, method, uri, data=None, **kwargs):
+        # httpx takes raw bodies as content, and iterables rather than files
+        if data is not None:
+            kwargs["content"] = _iter_file(data) if hasattr(data, "read") else data
+        try:
+            response = self.client.request(method.upper(), uri, **kwargs)
+        except self._httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except self._httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        return HttpxResponse(response)
+
+    def close(self):
+        self.client.close()
+
+
+def _iter_file(fileobj, chunk_size=64 * 1024):
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+
+class HttpxResponse:
+    """
+    An httpx response, with the attributes of a requests response that the client uses.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.reason = response.reason_phrase
+        self.url = str(response.url)
+        # like requests, only use the charset declared by the server
+        self.encoding = response.charset_encoding
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+TRANSPORTS = {
+    "requests": RequestsTransport,
+    "httpx": HttpxTransport,
+}
+
+
+def get_transport(transport="requests"):
+    """
+    Return the transport to send requests with. `transport` is either the name of a
+    transport ("requests" or "httpx"), or an object with the same methods as
+    RequestsTransport.
+    """
+    if isinstance(transport, str):
+        if transport not in TRANSPORTS:
+            raise Exception(
+                "Unknown transport {}. Supported transports are: {}".format(
+                    transport, ", ".join(TRANSPORTS)
+                )
+            )
+        return TRANSPORTS[transport]()
+    return transport
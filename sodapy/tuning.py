@@ -0,0 +1,82 @@
+class PageSizeTuner:
+    """
+    Picks the $limit of each page of a paginated read from the latency, size and row count
+    of the pages before it.
+
+    The page size doubles for as long as doing so improves throughput by at least
+    `min_gain`, then settles on the best size seen. It is halved whenever a page takes
+    longer than `max_seconds`, is larger than `max_bytes`, or fails with a timeout or a
+    server error.
+        min_limit: smallest page size to use
+        max_limit: largest page size to use
+        max_seconds: slowest acceptable response time, in seconds
+        max_bytes: largest acceptable response body, in bytes
+        min_gain: relative throughput improvement needed to keep growing the page size
+        max_retries: number of times a failed page is retried with a smaller page size
+    """
+
+    def __init__(
+        self,
+        min_limit=100,
+        max_limit=50000,
+        max_seconds=5.0,
+        max_bytes=64 * 1024 * 1024,
+        min_gain=0.1,
+        max_retries=3,
+    ):
+        if not 0 < min_limit <= max_limit:
+            raise ValueError(
+                "Page size bounds must satisfy 0 < min_limit <= max_limit."
+            )
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.min_gain = min_gain
+        self.max_retries = max_retries
+        self.limit = None
+        self.best_limit = None
+        self.best_rate = 0.0
+        self.growing = True
+
+    def start(self, limit):
+        """
+        Set the size of the first page, forgetting about any previous read.
+        """
+        self.limit = self._clamp(limit)
+        self.best_limit = self.limit
+        self.best_rate = 0.0
+        self.growing = True
+        return self.limit
+
+    def record(self, rows, seconds, nbytes):
+        """
+        Account for a successful page and return the size of the next one.
+        """
+        rate = rows / max(seconds, 1e-6)
+
+        if seconds > self.max_seconds or nbytes > self.max_bytes:
+            self.growing = False
+            self.limit = self._clamp(self.limit // 2)
+            self.best_limit, self.best_rate = self.limit, 0.0
+        elif self.growing:
+            if rate > self.best_rate * (1 + self.min_gain):
+                self.best_limit, self.best_rate = self.limit, rate
+                self.limit = self._clamp(self.limit * 2)
+                self.growing = self.limit != self.best_limit
+            else:
+                self.growing = False
+                self.limit = self.best_limit
+        return self.limit
+
+    def record_error(self):
+        """
+        Account for a failed page and return the size to retry it with.
+        """
+        self.growing = False
+        self.limit = self._clamp(self.limit // 2)
+        self.best_limit, self.best_rate = self.limit, 0.0
+        return self.limit
+
+    def _clamp(self, limit):
+        return max(self.min_limit, min(self.max_limit, limit))
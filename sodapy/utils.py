@@ -1,6 +1,19 @@
+from collections import deque
+import csv
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+import hashlib
+from io import StringIO
+from itertools import islice
+import json
+import math
+import queue
+import re
+import threading
 import requests
 
-from .constants import DEFAULT_API_PATH, OLD_API_PATH
+from .constants import DEFAULT_API_PATH, OLD_API_PATH, TIMESTAMP_FORMAT
 
 
 # Utility methods
@@ -30,6 +43,87 @@ def raise_for_status(response):
         raise requests.exceptions.HTTPError(http_error_msg, response=response)
 
 
+def is_transient_error(error):
+    """
+    Whether a failed request is worth retrying: timeouts, connection errors and server
+    errors are, client errors are not.
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        return response is not None and response.status_code >= 500
+    return isinstance(
+        error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+    )
+
+
+def is_payload_error(error):
+    """
+    Whether a failed upsert was rejected because of its payload, so that sending parts of
+    it could succeed: bad requests, payloads too large and unprocessable entities.
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        return response is not None and response.status_code in (400, 413, 422)
+    return False
+
+
+RESPONSE_FORMATS = [
+    (re.compile(r"application\/(vnd\.geo\+)?json"), "json"),
+    (re.compile(r"text\/csv"), "csv"),
+    (re.compile(r"application\/rdf\+xml"), "rdf"),
+    (re.compile(r"text\/plain"), "text"),
+]
+
+
+@lru_cache(maxsize=64)
+def response_format(content_type):
+    """
+    Map a content-type header to the format used to decode the response body, or None if
+    the format is not supported. Servers only send a handful of distinct content types, so
+    the lookup is cached.
+    """
+    content_type = content_type.strip().lower()
+    for pattern, name in RESPONSE_FORMATS:
+        if pattern.match(content_type):
+            return name
+    return None
+
+
+def decode_text(response):
+    """
+    Decode a response body using the charset declared by the server. Unlike
+    requests.Response.text, this never falls back to guessing the encoding from the
+    content, which means reading the whole body one more time.
+    """
+    return response.content.decode(response.encoding or "utf-8", errors="replace")
+
+
+def decode_body(body, response_format, loads=None, encoding=None):
+    """
+    Decode the body of a json or csv response. This is a plain function of bytes, so that
+    it can be run in another process.
+        loads: the function that decodes json, defaults to the standard library
+        encoding: the charset of csv bodies, defaults to utf-8
+    """
+    if response_format == "json":
+        return (loads or json.loads)(body)
+    if response_format == "csv":
+        text = body.decode(encoding or "utf-8", errors="replace")
+        return list(csv.reader(StringIO(text)))
+    raise Exception("Cannot decode {} responses.".format(response_format))
+
+
+def is_empty_page(body, response_format):
+    """
+    Whether the body of a json or csv page holds no rows. csv pages always start with a
+    header line, so a page with only that line is empty.
+    """
+    body = body.strip()
+    if response_format == "csv":
+        return b"\n" not in body
+    return body in (b"", b"[]")
+
+
 def clear_empty_values(args):
     """
     Scrap junk data from a dict.
@@ -51,9 +145,7 @@ def format_old_api_request(dataid=None, content_type=None):
     if content_type is not None:
         return "{}.{}".format(OLD_API_PATH, content_type)
 
-    raise Exception(
-        "This method requires at least a dataset_id or content_type."
-    )
+    raise Exception("This method requires at least a dataset_id or content_type.")
 
 
 def format_new_api_request(dataid=None, row_id=None, content_type=None):
@@ -92,3 +184,394 @@ def download_file(url, local_filename):
         for chunk in response.iter_content(chunk_size=1024):
             if chunk:  # filter out keep-alive new chunks
                 outfile.write(chunk)
+
+
+def parse_range_value(value):
+    """
+    Parse the result of a min()/max() SoQL aggregate into something that can be split into
+    ranges. Socrata returns numbers as strings, so numeric strings become ints or floats and
+    ISO 8601 timestamps become datetimes.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    for fmt in (TIMESTAMP_FORMAT, "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(value.rstrip("Z")[:23], fmt)
+        except (AttributeError, ValueError):
+            continue
+    raise Exception(
+        "Cannot partition on non-numeric, non-date value {!r}.".format(value)
+    )
+
+
+def format_range_value(value):
+    """
+    Render a partition boundary as a SoQL literal.
+    """
+    if isinstance(value, datetime):
+        return "'{}'".format(value.strftime(TIMESTAMP_FORMAT)[:23])
+    if isinstance(value, float):
+        # SoQL has no scientific notation, which repr() uses for small and large floats
+        return format(Decimal(repr(value)), "f")
+    return repr(value)
+
+
+def partition_bounds(low, high, partitions):
+    """
+    Split the closed interval [low, high] into at most `partitions` contiguous ranges. Returns
+    the sorted list of boundaries, first and last included.
+    """
+    if partitions < 1:
+        raise ValueError("At least one partition is required.")
+
+    if isinstance(low, datetime):
+        step = (high - low) / partitions
+        bounds = [low + step * i for i in range(partitions)]
+        # SoQL timestamps only carry millisecond precision
+        bounds = [b.replace(microsecond=b.microsecond // 1000 * 1000) for b in bounds]
+    elif isinstance(low, int) and isinstance(high, int):
+        step = max(-(-(high - low) // partitions), 1)
+        bounds = list(range(low, high, step))
+    else:
+        step = (high - low) / partitions
+        bounds = [low + step * i for i in range(partitions)]
+
+    bounds = sorted(set(bounds) | {low})
+    bounds.append(high)
+    return bounds
+
+
+def partition_where(column, low, high, partitions):
+    """
+    Build the $where clauses of disjoint partitions covering every row of `column` between
+    `low` and `high`, plus a final partition for rows where the column is null.
+    """
+    clauses = []
+    if low is not None and high is not None:
+        bounds = partition_bounds(
+            parse_range_value(low), parse_range_value(high), partitions
+        )
+        last = len(bounds) - 2
+        for i in range(last + 1):
+            clauses.append(
+                "{col} >= {lo} AND {col} {op} {hi}".format(
+                    col=column,
+                    lo=format_range_value(bounds[i]),
+                    op="<=" if i == last else "<",
+                    hi=format_range_value(bounds[i + 1]),
+                )
+            )
+    clauses.append("{} IS NULL".format(column))
+    return clauses
+
+
+def tile_bounds(bounds, tiles):
+    """
+    Split a (west, south, east, north) bounding box into a grid of `tiles`, given as
+    (rows, columns). Returns the (west, south, east, north) box of every tile, row by row
+    from the south-west corner.
+    """
+    west, south, east, north = bounds
+    rows, columns = tiles
+    if rows < 1 or columns < 1:
+        raise ValueError("There must be at least one row and one column of tiles.")
+    if not (west < east and south < north):
+        raise ValueError("Bounds must be given as (west, south, east, north).")
+    width = (east - west) / columns
+    height = (north - south) / rows
+    return [
+        (
+            west + column * width,
+            south + row * height,
+            east if column == columns - 1 else west + (column + 1) * width,
+            north if row == rows - 1 else south + (row + 1) * height,
+        )
+        for row in range(rows)
+        for column in range(columns)
+    ]
+
+
+def owns_point(tile, bounds, coordinates):
+    """
+    Whether a point belongs to a tile of `bounds`. Tiles include their western and
+    southern edges but not the others, except along the edges of `bounds`, so that a
+    point on the edge between two tiles belongs to exactly one of them.
+    """
+    west, south, east, north = tile
+    longitude, latitude = coordinates[0], coordinates[1]
+    return (
+        west <= longitude
+        and (longitude < east or east == bounds[2])
+        and south <= latitude
+        and (latitude < north or north == bounds[3])
+    )
+
+
+def feature_point(feature, column):
+    """
+    Return the (longitude, latitude) of the value of `column` in a GeoJSON feature, or None
+    if it is not a point. The column is the geometry of the feature, unless it is one of
+    its properties, as point or location values.
+    """
+    properties = feature.get("properties") or {}
+    value = properties[column] if column in properties else feature.get("geometry")
+    if not isinstance(value, dict):
+        return None
+    try:
+        if value.get("type") == "Point":
+            return float(value["coordinates"][0]), float(value["coordinates"][1])
+        if "longitude" in value and "latitude" in value:
+            return float(value["longitude"]), float(value["latitude"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        pass
+    return None
+
+
+def owns_feature(tile, bounds, feature, column):
+    """
+    Whether a feature belongs to a tile of `bounds`, according to owns_point(), or None if
+    its `column` is not a point.
+    """
+    point = feature_point(feature, column)
+    if point is None:
+        return None
+    return owns_point(tile, bounds, point)
+
+
+class _Producer:
+    """
+    Consume an iterable on a background thread, staying at most `depth` items ahead of
+    the consumer of items(). close() stops the thread and closes the iterable.
+    """
+
+    _DONE = object()
+
+    def __init__(self, iterable, depth):
+        self._buffer = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._produce, args=(iterable,), daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterable):
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not self._put((item, None)):
+                    return
+        except Exception as e:
+            self._put((None, e))
+        else:
+            self._put((self._DONE, None))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def items(self):
+        while True:
+            item, error = self._buffer.get()
+            if error is not None:
+                raise error
+            if item is self._DONE:
+                return
+            yield item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def prefetch(iterable, depth):
+    """
+    Consume `iterable` on a background thread, staying at most `depth` items ahead of the
+    caller. Exceptions raised while producing items are re-raised to the caller in order.
+    """
+    producer = _Producer(iterable, depth)
+    try:
+        for item in producer.items():
+            yield item
+    finally:
+        producer.close()
+
+
+def prefetch_each(iterables, width, depth=1):
+    """
+    Chain `iterables`, consuming the current one and up to `width` - 1 of the ones after
+    it on background threads, each at most `depth` items ahead of the caller. At most
+    `width` iterables are in progress at once, and closing the generator stops them.
+    """
+    iterables = iter(iterables)
+    running = deque()
+    try:
+        while True:
+            for iterable in islice(iterables, max(width - len(running), 0)):
+                running.append(_Producer(iterable, depth))
+            if not running:
+                return
+            producer = running[0]
+            for item in producer.items():
+                yield item
+            running.popleft().close()
+    finally:
+        for producer in running:
+            producer.close()
+
+
+def iter_json_array(rows, progress=None, dumps=None, chunk_size=64 * 1024):
+    """
+    Encode an iterable of rows as a JSON array, one chunk of at least `chunk_size` bytes at a
+    time, so that it can be uploaded without building the whole payload in memory.
+    `progress`, if given, is called as progress(bytes_sent, rows_sent) for every chunk.
+    `dumps` encodes a single row to bytes, and defaults to the standard library.
+    """
+    if dumps is None:
+        dumps = _dumps_utf8
+    sent_bytes = sent_rows = 0
+    chunk = [b"["]
+    size = 1
+    for row in rows:
+        encoded = dumps(row)
+        if sent_rows:
+            encoded = b"," + encoded
+        chunk.append(encoded)
+        size += len(encoded)
+        sent_rows += 1
+        if size >= chunk_size:
+            sent_bytes += size
+            if progress is not None:
+                progress(sent_bytes, sent_rows)
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    chunk.append(b"]")
+    size += 1
+    sent_bytes += size
+    if progress is not None:
+        progress(sent_bytes, sent_rows)
+    yield b"".join(chunk)
+
+
+def iter_feature_collection(features, dumps=None, chunk_size=64 * 1024):
+    """
+    Encode an iterable of GeoJSON features as a FeatureCollection, one chunk of bytes at
+    a time, e.g. to write the result of get_tiled() to a file in constant memory.
+    """
+    yield b'{"type":"FeatureCollection","features":'
+    for chunk in iter_json_array(features, dumps=dumps, chunk_size=chunk_size):
+        yield chunk
+    yield b"}"
+
+
+def _dumps_utf8(obj):
+    return json.dumps(obj).encode("utf-8")
+
+
+def iter_file_chunks(fileobj, progress, chunk_size=64 * 1024):
+    """
+    Read a csv file in chunks, calling progress(bytes_sent, rows_sent) for every chunk. The
+    header line is not counted as a row.
+    """
+    sent_bytes = lines = 0
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        sent_bytes += len(chunk)
+        lines += chunk.count(b"\n")
+        progress(sent_bytes, max(lines - 1, 0))
+        yield chunk
+
+
+def read_ndjson(fileobj):
+    """
+    Yield the rows of a newline-delimited JSON file one at a time. Pass the result to
+    upsert() or replace() to upload the file without loading it in memory.
+    """
+    for line in fileobj:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_batches(iterable, size):
+    """
+    Yield lists of at most `size` items from an iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def normalize_value(value):
+    """
+    Convert a value to the form the API returns it in: scalars other than booleans are
+    strings, numbers with no fractional part are written as integers, and nested values
+    are normalized recursively.
+    """
+    if isinstance(value, dict):
+        return {str(k): normalize_value(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, float) and math.isfinite(value):
+        value = Decimal(repr(value))
+    if isinstance(value, Decimal) and value.is_finite():
+        # the API returns 2005 for 2005.0, and never uses scientific notation
+        if value == value.to_integral_value():
+            return str(int(value))
+        return format(value.normalize(), "f")
+    return str(value)
+
+
+def row_digest(row):
+    """
+    Hash the contents of a row, leaving out system fields and null values, which the API
+    does not return. Rows that are equal once normalized have the same digest.
+    """
+    fields = {
+        name: value for name, value in row.items() if not str(name).startswith(":")
+    }
+    encoded = json.dumps(normalize_value(fields), sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).digest()
+
+
+def dataset_version(metadata):
+    """
+    Return the value of dataset metadata that changes whenever the rows are modified.
+    """
+    return metadata.get("rowsUpdatedAt", metadata.get("viewLastModified"))
+
+
+def add_counts(totals, response):
+    """
+    Add the counts of an upsert response, such as "Rows Created", to `totals`.
+    """
+    if isinstance(response, dict):
+        for name, value in response.items():
+            if isinstance(value, int) and not isinstance(value, bool):
+                totals[name] = totals.get(name, 0) + value
+    return totals
@@ -0,0 +1,35 @@
+from sodapy.cache import MetadataCache
+
+
+def test_metadata_cache():
+    cache = MetadataCache()
+    assert cache.get("songs") is None
+
+    cache.store("songs", {"id": "songs"}, {"etag": '"v1"'})
+    entry = cache.get("songs")
+    assert entry.value == {"id": "songs"}
+    assert entry.validators == {"If-None-Match": '"v1"'}
+    assert cache.is_fresh(entry, 60)
+    assert not cache.is_fresh(entry, 0)
+
+    cache.invalidate("songs")
+    assert cache.get("songs") is None
+
+
+def test_metadata_cache_validators():
+    cache = MetadataCache()
+    cache.store("songs", {"viewLastModified": 1451289003}, {})
+    assert cache.get("songs").validators == {
+        "If-Modified-Since": "Mon, 28 Dec 2015 07:50:03 GMT"
+    }
+
+    # a change to the rows only is newer than the view
+    cache.store("songs", {"viewLastModified": 1451289003, "rowsUpdatedAt": 1451289063}, {})
+    assert cache.get("songs").validators == {
+        "If-Modified-Since": "Mon, 28 Dec 2015 07:51:03 GMT"
+    }
+
+    cache.store("songs", {}, {"last-modified": "Mon, 28 Dec 2015 07:50:03 GMT"})
+    assert cache.get("songs").validators == {
+        "If-Modified-Since": "Mon, 28 Dec 2015 07:50:03 GMT"
+    }
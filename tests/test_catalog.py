@@ -0,0 +1,94 @@
+import copy
+import json
+import os
+
+import requests_mock
+
+from sodapy import Socrata
+from sodapy.catalog import CatalogIndex
+from sodapy.constants import DATASETS_PATH
+
+
+PREFIX = "https://"
+DOMAIN = "fakedomain.com"
+APPTOKEN = "FakeAppToken"
+TEST_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+
+
+def setup_client():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    with open(os.path.join(TEST_DATA_PATH, "get_datasets.txt")) as f:
+        catalog = json.load(f)["results"]
+
+    def respond(request, context):
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        offset = int(request.qs["offset"][0])
+        end = offset + int(request.qs["limit"][0])
+        results = sorted(catalog, key=lambda r: r["resource"]["updatedAt"], reverse=True)
+        return {"results": results[offset:end], "resultSetSize": len(results)}
+
+    adapter.register_uri("GET", "{}{}{}".format(PREFIX, DOMAIN, DATASETS_PATH), json=respond)
+    return client, adapter, catalog
+
+
+def ids(results):
+    return [result["resource"]["id"] for result in results]
+
+
+def test_catalog_search(tmp_path):
+    client, adapter, _ = setup_client()
+    with CatalogIndex(client, str(tmp_path / "catalog.db")) as catalog:
+        assert catalog.refresh(page_size=3) == 7
+        assert len(catalog) == 7
+        requests = adapter.call_count
+
+        assert ids(catalog.datasets(tags=["permits"])) == ["kvz2-j5cj", "msk6-43c6"]
+        assert ids(catalog.datasets(categories=["Public Safety"], limit=1)) == ["qccx-65fg"]
+        assert ids(catalog.datasets(column_names=["city", "zip"])) == ["kvz2-j5cj", "msk6-43c6"]
+        # assets with the words in their names come first
+        assert ids(catalog.datasets(q="permit")) == ["kvz2-j5cj", "msk6-43c6", "ic3t-wcy2"]
+        assert ids(catalog.datasets(q="permit", order="name DESC")) == [
+            "ic3t-wcy2",
+            "kvz2-j5cj",
+            "msk6-43c6",
+        ]
+        assert ids(catalog.datasets(q="fire rescue")) == ["xvpn-2pnt"]
+        assert catalog.datasets(q="permits", tags=["dispatch"]) == []
+        assert adapter.call_count == requests
+
+        # unsupported filters are sent to the API
+        catalog.datasets(provenance="official", limit=7, offset=0)
+        assert adapter.call_count == requests + 1
+    client.close()
+
+
+def test_catalog_refresh(tmp_path):
+    client, adapter, results = setup_client()
+    path = str(tmp_path / "catalog.db")
+    with CatalogIndex(client, path) as catalog:
+        assert not catalog.is_loaded()
+        catalog.refresh(page_size=2)
+
+    updated = copy.deepcopy(results[0])
+    updated["resource"]["updatedAt"] = "2019-01-01T00:00:00.000Z"
+    updated["classification"]["domain_tags"].append("renovation")
+    results[0] = updated
+    del results[1]
+
+    with CatalogIndex(client, path) as catalog:
+        requests = adapter.call_count
+        # pages are read until reaching an asset that was not updated
+        assert catalog.refresh(page_size=2) == 2
+        assert adapter.call_count == requests + 2
+        assert ids(catalog.datasets(tags=["renovation"])) == ["msk6-43c6"]
+        assert len(catalog) == 7
+
+        # deleted assets are removed by full refreshes
+        assert catalog.refresh(full=True) == 6
+        assert "kwxv-fwze" not in ids(catalog.datasets())
+    client.close()
@@ -0,0 +1,334 @@
+import csv
+import gzip
+import json
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+
+import pytest
+import requests_mock
+
+import sodapy
+from sodapy.cli import main
+from sodapy.constants import DEFAULT_API_PATH, DATASETS_PATH, OLD_API_PATH
+
+
+DOMAIN = "fakedomain.com"
+DATASET_IDENTIFIER = "songs"
+HEADERS = {"content-type": "application/json; charset=utf-8"}
+URI = "https://{}{}{}.json".format(DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+METADATA_URI = "https://{}{}/{}.json".format(DOMAIN, OLD_API_PATH, DATASET_IDENTIFIER)
+ROWS = [
+    {"song_id": "1", "title": "Hoppípolla"},
+    {"song_id": "2", "title": "Glósóli", "location": {"latitude": "64.1"}},
+    {"song_id": "3", "title": "Sæglópur"},
+]
+
+
+def run(*argv):
+    return main(["--domain", DOMAIN, "--app-token", "FakeAppToken"] + list(argv))
+
+
+def page_response(request, context):
+    context.headers.update(HEADERS)
+    offset = int(request.qs["$offset"][0])
+    end = offset + int(request.qs.get("$limit", ["1000"])[0])
+    return ROWS[offset:end]
+
+
+def test_export(tmp_path, capsys):
+    output = str(tmp_path / "songs.ndjson.gz")
+    with requests_mock.Mocker() as mock:
+        mock.get(URI, json=page_response)
+        assert run("export", DATASET_IDENTIFIER, "-o", output, "--page-size", "2") == 0
+
+    with gzip.open(output, "rt", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == ROWS
+    assert "export: 3 rows" in capsys.readouterr().err
+
+
+def test_export_csv(tmp_path):
+    output = str(tmp_path / "songs.csv")
+    metadata = {"columns": [{"fieldName": "song_id"}, {"fieldName": "title"}]}
+    with requests_mock.Mocker() as mock:
+        mock.get(URI, json=page_response)
+        mock.get(METADATA_URI, json=metadata, headers=HEADERS)
+        assert run("-q", "export", DATASET_IDENTIFIER, "-o", output) == 0
+
+    with open(output, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ["song_id", "title", "location"]
+    assert json.loads(rows[1]["location"]) == {"latitude": "64.1"}
+    assert rows[2] == {"song_id": "3", "title": "Sæglópur", "location": ""}
+
+
+def test_export_resume(tmp_path):
+    output = str(tmp_path / "songs.ndjson")
+    checkpoint = str(tmp_path / "songs.checkpoint")
+    metadata = {"rowsUpdatedAt": 1}
+    args = ["-q", "export", DATASET_IDENTIFIER, "-o", output, "--page-size", "2"]
+
+    def fail_second_page(request, context):
+        if request.qs["$offset"] == ["2"]:
+            context.status_code = 500
+            context.reason = "Server Error"
+            return {"message": "failed"}
+        return page_response(request, context)
+
+    with requests_mock.Mocker() as mock:
+        mock.get(METADATA_URI, json=metadata, headers=HEADERS)
+        mock.get(URI, json=fail_second_page)
+        assert run(*(args + ["--resume", checkpoint])) == 1
+        assert os.path.exists(checkpoint)
+
+        mock.get(URI, json=page_response)
+        assert run(*(args + ["--resume", checkpoint])) == 0
+        assert not os.path.exists(checkpoint)
+
+    with open(output, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == ROWS
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="requires SIGKILL")
+def test_export_resume_after_kill(tmp_path):
+    output = str(tmp_path / "songs.ndjson")
+    checkpoint = str(tmp_path / "songs.checkpoint")
+    args = ["-q", "export", DATASET_IDENTIFIER, "-o", output, "--page-size", "1"]
+    # the process is killed after the second page is written, before its checkpoint
+    script = textwrap.dedent(
+        """
+        import os, signal, sys
+        import requests_mock
+        from sodapy.checkpoint import Checkpoint
+        import test_cli
+
+        save = Checkpoint.save
+
+        def save_or_die(self, offset, rows):
+            if offset == 2:
+                os.kill(os.getpid(), signal.SIGKILL)
+            save(self, offset, rows)
+
+        Checkpoint.save = save_or_die
+        with requests_mock.Mocker() as mock:
+            mock.get(
+                test_cli.METADATA_URI, json={"rowsUpdatedAt": 1}, headers=test_cli.HEADERS
+            )
+            mock.get(test_cli.URI, json=test_cli.page_response)
+            sys.exit(test_cli.run(*sys.argv[1:]))
+        """
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [
+            os.path.dirname(__file__),
+            os.path.dirname(os.path.dirname(sodapy.__file__)),
+            env.get("PYTHONPATH", ""),
+        ]
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", script] + args + ["--resume", checkpoint], env=env
+    )
+    assert process.returncode == -signal.SIGKILL
+    with open(output, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == ROWS[:2]
+    # as if the process had also been killed in the middle of a line
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"song_id": "3", "ti')
+
+    with requests_mock.Mocker() as mock:
+        mock.get(METADATA_URI, json={"rowsUpdatedAt": 1}, headers=HEADERS)
+        mock.get(URI, json=page_response)
+        assert run(*(args + ["--resume", checkpoint])) == 0
+        assert [request.qs["$offset"] for request in mock.request_history[1:]] == [
+            ["1"],
+            ["2"],
+            ["3"],
+        ]
+    assert not os.path.exists(checkpoint)
+
+    with open(output, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == ROWS
+
+
+def test_export_resume_missing_output(tmp_path, capsys):
+    output = str(tmp_path / "songs.ndjson")
+    checkpoint = tmp_path / "songs.checkpoint"
+    checkpoint.write_text(json.dumps({"data": {"output_size": 10}}))
+
+    args = ["-q", "export", DATASET_IDENTIFIER, "-o", output]
+    assert run(*(args + ["--resume", str(checkpoint)])) == 1
+    assert "Remove the checkpoint to start over" in capsys.readouterr().err
+    assert not os.path.exists(output)
+
+
+def test_export_resume_csv(tmp_path):
+    output = str(tmp_path / "songs.csv")
+    checkpoint = str(tmp_path / "songs.checkpoint")
+    args = ["-q", "export", DATASET_IDENTIFIER, "-o", output, "--page-size", "2"]
+    args += ["--select", "song_id, title", "--resume", checkpoint]
+    failed = []
+
+    def respond(request, context):
+        if request.qs["$offset"] == ["2"] and not failed:
+            failed.append(True)
+            context.status_code = 500
+            context.reason = "Server Error"
+            return {"message": "failed"}
+        names = ["song_id", "title"]
+        if failed:
+            # the columns of the header are kept, whatever the order of the fields
+            names.reverse()
+        return [
+            {name: row[name] for name in names}
+            for row in page_response(request, context)
+        ]
+
+    with requests_mock.Mocker() as mock:
+        mock.get(METADATA_URI, json={"rowsUpdatedAt": 1}, headers=HEADERS)
+        mock.get(URI, json=respond)
+        assert run(*args) == 1
+        assert run(*args) == 0
+
+    with open(output, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows == [["song_id", "title"]] + [
+        [row["song_id"], row["title"]] for row in ROWS
+    ]
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["-o", "songs.json", "--resume", "checkpoint"],
+        ["-o", "songs.ndjson.gz", "--resume", "checkpoint"],
+        ["-o", "songs.ndjson", "--compress", "xz", "--resume", "checkpoint"],
+        ["-o", "songs.ndjson", "--partitions", "4"],
+    ],
+)
+def test_export_invalid_args(argv):
+    with pytest.raises(SystemExit):
+        run(*(["export", DATASET_IDENTIFIER] + argv))
+
+
+def test_import(tmp_path, capsys):
+    path = tmp_path / "songs.csv"
+    path.write_text("song_id,title\n1,Hoppípolla\n2,Glósóli\n3,Sæglópur\n", "utf-8")
+    sent = []
+
+    def respond(request, context):
+        sent.append(request.json())
+        context.headers.update(HEADERS)
+        return {"Rows Created": len(sent[-1]), "Rows Updated": 0, "Errors": 0}
+
+    with requests_mock.Mocker() as mock:
+        mock.post(URI, json=respond)
+        code = run(
+            "import", DATASET_IDENTIFIER, str(path), "--batch-size", "2", "--workers", "2"
+        )
+
+    assert code == 0
+    assert sorted(len(batch) for batch in sent) == [1, 2]
+    out, err = capsys.readouterr()
+    assert json.loads(out)["Rows Created"] == 3
+    assert "import: 3 rows" in err
+
+
+def test_sync(tmp_path, capsys):
+    path = tmp_path / "songs.ndjson"
+    path.write_text(
+        "".join(json.dumps(row) + "\n" for row in ROWS[:2] + [{"song_id": "4"}]), "utf-8"
+    )
+    digests = str(tmp_path / "digests.json")
+    sent = []
+
+    def respond(request, context):
+        sent.extend(request.json())
+        context.headers.update(HEADERS)
+        return {"Rows Updated": len(request.json())}
+
+    with requests_mock.Mocker() as mock:
+        mock.get(URI, json=page_response)
+        mock.post(URI, json=respond)
+        args = ["-q", "sync", DATASET_IDENTIFIER, str(path), "--row-identifier"]
+        assert run(*(args + ["song_id", "--digests", digests])) == 0
+        assert sorted(sent, key=str) == [
+            {"song_id": "3", ":deleted": True},
+            {"song_id": "4"},
+        ]
+        assert json.loads(capsys.readouterr().out)["Rows Unchanged"] == 2
+
+        # the digests of the first sync are used instead of the dataset's rows
+        mock.get(URI, status_code=500)
+        assert run(*(args + ["song_id", "--digests", digests])) == 0
+        assert json.loads(capsys.readouterr().out)["Rows Unchanged"] == 3
+
+    with open(digests) as f:
+        assert sorted(json.load(f)) == ["1", "2", "4"]
+
+
+def test_sync_csv(tmp_path, capsys):
+    path = tmp_path / "songs.csv"
+    path.write_text("song_id,title\n1,Hoppípolla\n2,\n", "utf-8")
+    rows = [{"song_id": "1", "title": "Hoppípolla"}, {"song_id": "2"}]
+    sent = []
+
+    def respond(request, context):
+        sent.extend(request.json())
+        context.headers.update(HEADERS)
+        return {"Rows Updated": len(request.json())}
+
+    with requests_mock.Mocker() as mock:
+        mock.get(URI, json=rows, headers=HEADERS)
+        mock.post(URI, json=respond)
+        args = ["-q", "sync", DATASET_IDENTIFIER, str(path), "--row-identifier"]
+        assert run(*(args + ["song_id"])) == 0
+
+    # the empty cell matches the field the API leaves out
+    assert sent == []
+    assert json.loads(capsys.readouterr().out)["Rows Unchanged"] == 2
+
+
+def test_catalog(capsys):
+    path = os.path.join(os.path.dirname(__file__), "test_data", "get_datasets.txt")
+    with open(path) as f:
+        body = json.load(f)
+
+    with requests_mock.Mocker() as mock:
+        mock.get("https://{}{}".format(DOMAIN, DATASETS_PATH), json=body, headers=HEADERS)
+        assert run("catalog", "permits", "--limit", "7") == 0
+        assert mock.last_request.qs["q"] == ["permits"]
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 7
+    assert lines[0].split()[:2] == ["msk6-43c6", "2017-07-21"]
+
+
+def test_catalog_index(tmp_path, capsys):
+    path = os.path.join(os.path.dirname(__file__), "test_data", "get_datasets.txt")
+    with open(path) as f:
+        body = json.load(f)
+    index = str(tmp_path / "catalog.db")
+
+    def respond(request, context):
+        context.headers.update(HEADERS)
+        offset = int(request.qs["offset"][0])
+        end = offset + int(request.qs["limit"][0])
+        return {"results": body["results"][offset:end], "resultSetSize": 7}
+
+    with requests_mock.Mocker() as mock:
+        mock.get("https://{}{}".format(DOMAIN, DATASETS_PATH), json=respond)
+        assert run("catalog", "--index", index, "--refresh", "--tag", "permits") == 0
+        assert mock.call_count == 1
+        assert run("catalog", "--index", index, "--tag", "fire") == 0
+        assert mock.call_count == 1
+
+    out, err = capsys.readouterr()
+    assert "7 assets refreshed" in err
+    assert [line.split()[0] for line in out.splitlines()] == [
+        "kvz2-j5cj",
+        "msk6-43c6",
+        "xvpn-2pnt",
+    ]
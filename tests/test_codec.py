@@ -0,0 +1,32 @@
+import pytest
+
+from sodapy.codec import get_codec, StdlibCodec
+
+
+ROWS = [{"theme": "Love", "year": "1982", "artist": "ABC", "title": "Ünïcödé"}]
+
+
+def test_stdlib_codec():
+    codec = get_codec("json")
+    assert isinstance(codec, StdlibCodec)
+    encoded = codec.dumps(ROWS)
+    assert isinstance(encoded, bytes)
+    assert codec.loads(encoded) == ROWS
+    assert codec.loads(encoded.decode("utf-8")) == ROWS
+
+
+def test_orjson_codec():
+    pytest.importorskip("orjson")
+    codec = get_codec("orjson")
+    assert codec.loads(codec.dumps(ROWS)) == ROWS
+    assert get_codec().name == "orjson"
+
+
+def test_custom_codec():
+    codec = StdlibCodec()
+    assert get_codec(codec) is codec
+
+
+def test_unknown_codec_exception():
+    with pytest.raises(Exception, match="Unknown JSON codec"):
+        get_codec("simplejson")
@@ -0,0 +1,27 @@
+"""
+Validate that importing the package stays cheap.
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+import sodapy
+
+
+def test_import_is_lazy():
+    statement = "import sys, sodapy; print('requests' in sys.modules)"
+    output = subprocess.check_output(
+        [sys.executable, "-c", statement], universal_newlines=True
+    )
+    assert output.strip() == "False"
+
+
+def test_lazy_attributes():
+    from sodapy.socrata import Socrata
+
+    assert sodapy.Socrata is Socrata
+    assert "PageSizeTuner" in dir(sodapy)
+    with pytest.raises(AttributeError):
+        sodapy.NotAThing
@@ -0,0 +1,104 @@
+import requests_mock
+
+from sodapy import Socrata
+from sodapy.constants import DEFAULT_API_PATH, OLD_API_PATH
+from sodapy.mirror import LocalMirror
+
+
+PREFIX = "https://"
+DOMAIN = "fakedomain.com"
+DATASET_IDENTIFIER = "songs"
+APPTOKEN = "FakeAppToken"
+
+METADATA = {
+    "id": DATASET_IDENTIFIER,
+    "rowsUpdatedAt": 1451289003,
+    "columns": [
+        {"fieldName": "artist", "dataTypeName": "text"},
+        {"fieldName": "title", "dataTypeName": "text"},
+        {"fieldName": "year", "dataTypeName": "number"},
+        {"fieldName": "live", "dataTypeName": "checkbox"},
+        {"fieldName": "spotify_url", "dataTypeName": "url"},
+    ],
+}
+ROWS = [
+    {"artist": "ABC", "title": "The Look of Love", "year": "1982", "live": False},
+    {"artist": "Badly Drawn Boy", "title": "The Shining", "year": "2000"},
+    {"artist": "Buddy Holly", "title": "Everyday", "year": "1957", "live": True},
+    {
+        "artist": "ABC",
+        "title": "Poison Arrow",
+        "year": "1982",
+        "spotify_url": {"url": "http://open.spotify.com/track/1"},
+    },
+]
+
+
+def setup_client():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    headers = {"content-type": "application/json; charset=utf-8"}
+    adapter.register_uri(
+        "GET",
+        "{}{}{}/{}.json".format(PREFIX, DOMAIN, OLD_API_PATH, DATASET_IDENTIFIER),
+        json=METADATA,
+        headers=headers,
+    )
+    adapter.register_uri(
+        "GET",
+        "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER),
+        json=ROWS,
+        headers=headers,
+    )
+    return client, adapter
+
+
+def test_mirror_get(tmp_path):
+    client, adapter = setup_client()
+    mirror = LocalMirror(client, DATASET_IDENTIFIER, str(tmp_path / "songs.db"))
+    assert mirror.refresh() == 4
+    calls = adapter.call_count
+
+    assert len(mirror.get()) == 4
+    assert mirror.get(where="year > 1960", order="year DESC, title") == [
+        ROWS[1],
+        ROWS[3],
+        ROWS[0],
+    ]
+    assert mirror.get(artist="ABC", select="title", order="title") == [
+        {"title": "Poison Arrow"},
+        {"title": "The Look of Love"},
+    ]
+    assert mirror.get(where="live = true") == [ROWS[2]]
+    assert mirror.get(
+        select="artist, count(*), max(year)", group="artist", order="artist", limit=2
+    ) == [
+        {"artist": "ABC", "count": "2", "max_year": "1982"},
+        {"artist": "Badly Drawn Boy", "count": "1", "max_year": "2000"},
+    ]
+    assert adapter.call_count == calls
+    assert not mirror.is_stale()
+    mirror.close()
+
+
+def test_mirror_fallback(tmp_path):
+    client, adapter = setup_client()
+    path = str(tmp_path / "songs.db")
+    with LocalMirror(client, DATASET_IDENTIFIER, path) as mirror:
+        # not loaded yet
+        assert mirror.get(where="year > 1960") == ROWS
+        mirror.refresh()
+
+    # reopened mirrors are ready to use
+    with LocalMirror(client, DATASET_IDENTIFIER, path) as mirror:
+        calls = adapter.call_count
+        assert mirror.get(where="year < 1960") == [ROWS[2]]
+        assert adapter.call_count == calls
+
+        assert mirror.get(q="love") == ROWS
+        assert mirror.get(where="within_circle(location, 1, 2, 3)") == ROWS
+        assert adapter.call_count == calls + 2
@@ -0,0 +1,166 @@
+import time
+
+import pytest
+import requests_mock
+
+from sodapy import Socrata
+from sodapy.constants import DEFAULT_API_PATH
+from sodapy.outbox import UpsertOutbox
+
+
+PREFIX = "https://"
+DOMAIN = "fakedomain.com"
+DATASET_IDENTIFIER = "songs"
+APPTOKEN = "FakeAppToken"
+URI = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+
+
+def setup_client(status_code=200, reject=None):
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+    sent = []
+
+    def respond(request, context):
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        context.status_code = status_code
+        context.reason = "OK" if status_code == 200 else "Server Error"
+        if status_code != 200:
+            return {"message": "failed"}
+        if reject is not None and any(reject in row for row in request.json()):
+            context.status_code = 400
+            context.reason = "Bad Request"
+            return {"message": "Unknown column {}".format(reject)}
+        sent.append(request.json())
+        return {"Rows Updated": len(sent[-1]), "Errors": 0}
+
+    adapter.register_uri("POST", URI, json=respond)
+    return client, adapter, sent
+
+
+def test_outbox_coalesce(tmp_path):
+    client, adapter, sent = setup_client()
+    path = str(tmp_path / "outbox.db")
+    with UpsertOutbox(
+        client, DATASET_IDENTIFIER, path, row_identifier="song_id", background=False
+    ) as outbox:
+        outbox.put({"song_id": "1", "title": "Hoppípolla"})
+        outbox.put_many(
+            [
+                {"song_id": 2, "title": "Glósóli"},
+                {"song_id": "1", "year": "2005"},
+                {"title": "Untitled"},
+                {"song_id": "2", ":deleted": True},
+            ]
+        )
+        assert len(outbox) == 3
+
+        assert outbox.flush() == {"Rows Updated": 3, "Errors": 0}
+        assert sent == [
+            [
+                {"song_id": "1", "title": "Hoppípolla", "year": "2005"},
+                {"song_id": "2", ":deleted": True},
+                {"title": "Untitled"},
+            ]
+        ]
+        assert len(outbox) == 0
+    client.close()
+
+
+def test_outbox_delete_then_update(tmp_path):
+    client, adapter, sent = setup_client()
+    path = str(tmp_path / "outbox.db")
+    with UpsertOutbox(
+        client, DATASET_IDENTIFIER, path, row_identifier="song_id", background=False
+    ) as outbox:
+        outbox.put_many(
+            [
+                {"song_id": "1", "title": "Hoppípolla"},
+                {"song_id": "1", ":deleted": True},
+                {"song_id": "1", "title": "Glósóli"},
+                {"song_id": "1", "year": "2005"},
+            ]
+        )
+        assert len(outbox) == 2
+
+        # the row is deleted before it is recreated with only the new fields
+        outbox.flush()
+        assert sent == [
+            [
+                {"song_id": "1", ":deleted": True},
+                {"song_id": "1", "title": "Glósóli", "year": "2005"},
+            ]
+        ]
+        assert len(outbox) == 0
+    client.close()
+
+
+def test_outbox_batches(tmp_path):
+    client, adapter, sent = setup_client()
+    path = str(tmp_path / "outbox.db")
+    outbox = UpsertOutbox(
+        client, DATASET_IDENTIFIER, path, "song_id", batch_size=2, background=False
+    )
+    outbox.put_many({"song_id": str(i)} for i in range(5))
+    outbox.close()
+
+    assert [len(batch) for batch in sent] == [2, 2, 1]
+    assert outbox.totals["Rows Updated"] == 5
+    client.close()
+
+
+def test_outbox_resume(tmp_path):
+    client, adapter, sent = setup_client(status_code=500)
+    path = str(tmp_path / "outbox.db")
+    outbox = UpsertOutbox(client, DATASET_IDENTIFIER, path, "song_id", background=False)
+    outbox.put_many([{"song_id": "1"}, {"song_id": "2"}])
+    with pytest.raises(Exception):
+        outbox.flush()
+    assert len(outbox) == 2
+    outbox.close(flush=False)
+    client.close()
+
+    # the row identifier is read from the file rather than the dataset's metadata
+    client, adapter, sent = setup_client()
+    with UpsertOutbox(client, DATASET_IDENTIFIER, path, background=False) as outbox:
+        assert outbox.row_identifier == "song_id"
+        assert len(outbox) == 2
+    assert sent == [[{"song_id": "1"}, {"song_id": "2"}]]
+    client.close()
+
+
+def test_outbox_rejected(tmp_path):
+    client, adapter, sent = setup_client(reject="tempo")
+    path = str(tmp_path / "outbox.db")
+    with UpsertOutbox(client, DATASET_IDENTIFIER, path, "song_id", background=False) as outbox:
+        outbox.put_many([{"song_id": "1"}, {"song_id": "2", "tempo": 80}, {"song_id": "3"}])
+        assert outbox.flush() == {"Rows Updated": 2, "Errors": 0}
+        assert len(outbox) == 0
+
+        rejected = outbox.rejected()
+        assert [failure.rows for failure in rejected] == [[{"song_id": "2", "tempo": 80}]]
+        assert "Unknown column tempo" in rejected[0].error
+        outbox.clear_rejected()
+        assert outbox.rejected() == []
+    assert sorted(row["song_id"] for batch in sent for row in batch) == ["1", "3"]
+    client.close()
+
+
+def test_outbox_background(tmp_path):
+    client, adapter, sent = setup_client()
+    path = str(tmp_path / "outbox.db")
+    with UpsertOutbox(
+        client, DATASET_IDENTIFIER, path, "song_id", batch_size=3, max_delay=0.05
+    ) as outbox:
+        # a full batch is sent right away
+        outbox.put_many({"song_id": str(i)} for i in range(3))
+        # a partial one once it has waited max_delay
+        outbox.put({"song_id": "3"})
+        deadline = time.monotonic() + 5
+        while len(outbox) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(outbox) == 0
+    assert sorted(len(batch) for batch in sent) == [1, 3]
+    client.close()
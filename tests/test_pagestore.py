@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from sodapy.pagestore import PageStore, get_compressor
+
+
+PAGES = [[{"n": str(n), "name": "Glósóli"} for n in range(i, i + 3)] for i in (0, 3, 6)]
+
+
+def test_page_store(tmp_path):
+    store = PageStore(str(tmp_path), compression="zlib")
+    assert store.open("query", version=1) is None
+
+    with store.writer("query", version=1) as writer:
+        for page in PAGES:
+            writer.append(page)
+
+    with store.open("query", version=1) as stored:
+        assert stored.rows == 9
+        assert len(stored) == 3
+        assert stored.page(2) == PAGES[2]
+        assert stored.page(0) == PAGES[0]
+        assert list(stored) == [row for page in PAGES for row in page]
+        assert list(stored) == [row for page in PAGES for row in page]
+
+    # results stored for another version of the dataset are ignored
+    assert store.open("query", version=2) is None
+
+
+def test_page_store_uncommitted(tmp_path):
+    store = PageStore(str(tmp_path), compression="zlib")
+    with store.writer("query") as writer:
+        writer.append(PAGES[0])
+    writer = store.writer("query")
+    writer.append(PAGES[1])
+    writer.close()
+
+    # the previous result is kept, and the partial one discarded
+    with store.open("query") as stored:
+        assert list(stored) == PAGES[0]
+    assert sorted(os.listdir(str(tmp_path))) == ["query.index", "query.pages"]
+
+    store.delete("query")
+    assert store.open("query") is None
+
+
+def test_page_store_concurrent_writers(tmp_path):
+    store = PageStore(str(tmp_path), compression="zlib")
+    first, second = store.writer("query"), store.writer("query")
+    first.append(PAGES[0])
+    second.append(PAGES[1] + PAGES[2])
+    first.commit()
+    second.commit()
+
+    with store.open("query") as stored:
+        assert list(stored) == PAGES[1] + PAGES[2]
+    assert sorted(os.listdir(str(tmp_path))) == ["query.index", "query.pages"]
+
+
+def test_page_store_replaced_pages(tmp_path):
+    store = PageStore(str(tmp_path), compression="zlib")
+    with store.writer("query") as writer:
+        writer.append(PAGES[0])
+    with open(str(tmp_path / "query.index")) as f:
+        index = f.read()
+
+    with store.writer("query") as writer:
+        writer.append(PAGES[1] + PAGES[2])
+    # an index that does not describe the current pages is a miss, not corrupt pages
+    with open(str(tmp_path / "query.index"), "w") as f:
+        f.write(index)
+    assert store.open("query") is None
+
+
+def test_get_compressor():
+    assert get_compressor("zlib").name == "zlib"
+    assert get_compressor("auto").name in ("zlib", "zstd")
+    with pytest.raises(Exception, match="Unknown compression"):
+        get_compressor("lz4")
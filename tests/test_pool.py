@@ -0,0 +1,73 @@
+import threading
+import time
+
+from sodapy import Socrata
+from sodapy.pool import SocrataPool
+
+
+APPTOKEN = "FakeAppToken"
+DOMAINS = ["fakedomain.com", "otherdomain.com"]
+
+
+def test_pool_client():
+    with SocrataPool(app_token=APPTOKEN) as pool:
+        client = pool.client(DOMAINS[0])
+        assert isinstance(client, Socrata)
+        assert pool.client(DOMAINS[0]) is client
+        other = pool.client(DOMAINS[1], app_token="OtherToken")
+        assert other.session.headers["X-App-token"] == "OtherToken"
+        assert client.session.headers["X-App-token"] == APPTOKEN
+
+        # all clients share the same connection pools
+        uri = "https://{}/resource/songs.json".format(DOMAINS[0])
+        assert client.session.get_adapter(uri) is pool.adapter
+        assert other.session.get_adapter(uri) is pool.adapter
+        assert sorted(pool.domains()) == DOMAINS
+
+    assert pool.domains() == []
+
+
+def test_pool_client_close():
+    with SocrataPool(app_token=APPTOKEN) as pool:
+        uri = "https://{}/resource/songs.json".format(DOMAINS[0])
+        pool.adapter.poolmanager.connection_from_url(uri)
+        with pool.client(DOMAINS[0]) as client:
+            pass
+        # closing a client leaves the shared connections open
+        assert len(pool.adapter.poolmanager.pools) == 1
+        assert pool.client(DOMAINS[0]) is client
+    assert len(pool.adapter.poolmanager.pools) == 0
+
+
+def test_pool_limits():
+    lock = threading.Lock()
+    in_flight = {"now": 0, "max": 0, DOMAINS[0]: 0, DOMAINS[1]: 0}
+    max_per_domain = {DOMAINS[0]: 0, DOMAINS[1]: 0}
+
+    def request(client):
+        with client.limiter:
+            with lock:
+                in_flight["now"] += 1
+                in_flight[client.domain] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["now"])
+                max_per_domain[client.domain] = max(
+                    max_per_domain[client.domain], in_flight[client.domain]
+                )
+            time.sleep(0.02)
+            with lock:
+                in_flight["now"] -= 1
+                in_flight[client.domain] -= 1
+
+    with SocrataPool(app_token=APPTOKEN, max_in_flight=3, max_per_domain=2) as pool:
+        threads = [
+            threading.Thread(target=request, args=(pool.client(domain),))
+            for domain in DOMAINS * 4
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # how many requests overlap depends on thread timing, but never exceeds the limits
+    assert 1 < in_flight["max"] <= 3
+    assert max(max_per_domain.values()) <= 2
@@ -0,0 +1,82 @@
+import os.path
+
+import requests_mock
+
+from sodapy import MemoryProfiler, Socrata
+from sodapy.constants import DEFAULT_API_PATH
+from sodapy.profiling import format_size
+
+
+PREFIX = "https://"
+DOMAIN = "fakedomain.com"
+DATASET_IDENTIFIER = "songs"
+TEST_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+
+
+def test_phase():
+    profiler = MemoryProfiler()
+    with profiler.phase("outer", size=1) as details:
+        kept = bytearray(1024 * 1024)
+        with profiler.phase("inner"):
+            freed = bytearray(4 * 1024 * 1024)
+            del freed
+        details["done"] = True
+
+    inner, outer = profiler.records
+    assert inner.name == "inner"
+    assert inner.peak >= 4 * 1024 * 1024
+    assert inner.retained < 1024 * 1024
+    # the peak of a phase includes those of the phases nested in it
+    assert outer.peak >= inner.peak
+    assert 1024 * 1024 <= outer.retained < 2 * 1024 * 1024
+    assert outer.details == {"size": 1, "done": True}
+    del kept
+
+    summary = profiler.summary()
+    assert summary["inner"]["calls"] == 1
+    assert summary["outer"]["peak"] == outer.peak
+    profiler.clear()
+    assert profiler.summary() == {}
+    profiler.stop()
+
+
+def test_profile_get_all():
+    mock_adapter = {"prefix": PREFIX, "adapter": requests_mock.Adapter()}
+    profiler = MemoryProfiler()
+    client = Socrata(DOMAIN, None, session_adapter=mock_adapter, profiler=profiler)
+
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    headers = {"content-type": "application/json; charset=utf-8"}
+    for offset, name in [(0, "bike_counts_page_1.json"), (1000, "bike_counts_page_2.json")]:
+        with open(os.path.join(TEST_DATA_PATH, name), "rb") as infile:
+            mock_adapter["adapter"].register_uri(
+                "GET",
+                "{}?$offset={}".format(uri, offset),
+                content=infile.read(),
+                headers=headers,
+            )
+
+    assert len(list(client.get_all(DATASET_IDENTIFIER))) == 1001
+
+    summary = profiler.summary()
+    assert {name: stats["calls"] for name, stats in summary.items()} == {
+        "body": 2,
+        "decode": 2,
+        "page": 2,
+        "consume": 2,
+    }
+    pages = [record for record in profiler.records if record.name == "page"]
+    assert [record.details["rows"] for record in pages] == [1000, 1]
+    assert pages[0].peak >= summary["decode"]["retained"] > 0
+
+    report = profiler.report(top=2)
+    assert report.splitlines()[0].split()[:2] == ["phase", "calls"]
+    assert "highest peaks:" in report
+    profiler.stop()
+    client.close()
+
+
+def test_format_size():
+    assert format_size(512) == "512 B"
+    assert format_size(1536) == "1.5 KiB"
+    assert format_size(3 * 1024 ** 3) == "3.0 GiB"
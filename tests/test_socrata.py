@@ -1,3 +1,4 @@
+from email.utils import parsedate_to_datetime
 import inspect
 import json
 import logging
@@ -8,6 +9,8 @@ import pytest
 
 from sodapy import Socrata
 from sodapy.constants import DEFAULT_API_PATH, OLD_API_PATH, DATASETS_PATH
+from sodapy.pagestore import PageStore
+from sodapy.tuning import PageSizeTuner
 
 
 PREFIX = "https://"
@@ -58,6 +61,28 @@ def test_client_oauth():
     assert client.session.headers.get("Authorization") == "OAuth AAAAAAAAAAAA"
 
 
+def test_client_limiter():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    entered = []
+
+    class Limiter:
+        def __enter__(self):
+            entered.append(True)
+
+        def __exit__(self, *args):
+            pass
+
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter, limiter=Limiter())
+    setup_mock(adapter, "GET", "get_songs.txt", 200)
+    client.get(DATASET_IDENTIFIER)
+
+    assert entered == [True]
+    client.close()
+
+
 def test_get():
     mock_adapter = {}
     mock_adapter["prefix"] = PREFIX
@@ -75,6 +100,44 @@ def test_get():
     client.close()
 
 
+def test_get_csv():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    uri = "{}{}{}{}.csv".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    body = '"artist","title"\n"Sigur Rós","Hoppípolla"\n'.encode("utf-8")
+    headers = {"content-type": "text/csv; charset=utf-8"}
+    adapter.register_uri("GET", uri, content=body, headers=headers)
+    response = client.get(DATASET_IDENTIFIER, content_type="csv")
+
+    assert response == [["artist", "title"], ["Sigur Rós", "Hoppípolla"]]
+
+    client.close()
+
+
+def test_get_canonical_query():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    headers = {"content-type": "application/json; charset=utf-8"}
+    adapter.register_uri("GET", uri, json=[], headers=headers)
+    client.get(DATASET_IDENTIFIER, where="year>2000 and  artist='ABC'")
+    client.get(DATASET_IDENTIFIER, where="artist = 'ABC' AND year > 2000")
+
+    first, second = adapter.request_history
+    assert first.url == second.url
+    assert first.qs["$where"] == ["artist = 'abc' and year > 2000"]
+
+    client.close()
+
+
 def test_get_all():
     mock_adapter = {}
     mock_adapter["prefix"] = PREFIX
@@ -95,6 +158,301 @@ def test_get_all():
     client.close()
 
 
+def test_get_all_prefetch():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    setup_mock(adapter, "GET", "bike_counts_page_1.json", 200, query="$offset=0")
+    setup_mock(adapter, "GET", "bike_counts_page_2.json", 200, query="$offset=1000")
+    response = client.get_all(DATASET_IDENTIFIER, prefetch=2)
+
+    assert inspect.isgenerator(response)
+    data = list(response)
+    assert len(data) == 1001
+    assert data[0]["date"] == "2016-09-21T15:45:00.000"
+    assert data[-1]["date"] == "2016-10-02T01:45:00.000"
+
+    client.close()
+
+
+def test_get_all_pages_end(monkeypatch):
+    client = Socrata(DOMAIN, APPTOKEN)
+
+    def pages(dataset_identifier, content_type, params):
+        yield [{"n": "1"}], 1
+
+    # pages that end without a last page end the rows, instead of raising RuntimeError
+    monkeypatch.setattr(client, "_get_pages", pages)
+    assert list(client.get_all(DATASET_IDENTIFIER)) == [{"n": "1"}]
+
+    client.close()
+
+
+def test_get_all_adaptive():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    rows = [{"n": str(n)} for n in range(2500)]
+
+    def respond(request, context):
+        limit = int(request.qs["$limit"][0])
+        if limit > 800:
+            context.status_code = 503
+            context.reason = "Service Unavailable"
+            return {}
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        offset = int(request.qs["$offset"][0])
+        return rows[offset:][:limit]
+
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    adapter.register_uri("GET", uri, json=respond)
+
+    tuner = PageSizeTuner(min_limit=100, max_limit=5000)
+    data = list(client.get_all(DATASET_IDENTIFIER, limit=1600, adaptive=tuner))
+    assert data == rows
+    limits = [int(r.qs["$limit"][0]) for r in adapter.request_history]
+    assert limits == [1600, 800, 800, 800, 800]
+
+    client.close()
+
+
+def test_get_all_checkpoint(tmp_path):
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    setup_old_api_mock(adapter, "GET", "get_song_metadata.txt", 200)
+    setup_mock(adapter, "GET", "bike_counts_page_1.json", 200, query="$offset=0")
+    setup_mock(adapter, "GET", "bike_counts_page_2.json", 200, query="$offset=1000")
+    checkpoint = str(tmp_path / "checkpoint.json")
+
+    # stop part-way through the second page; only the first one is committed
+    response = client.get_all(DATASET_IDENTIFIER, checkpoint=checkpoint)
+    consumed = [next(response) for _ in range(1001)]
+    response.close()
+    assert consumed[-1]["date"] == "2016-10-02T01:45:00.000"
+    with open(checkpoint) as infile:
+        state = json.load(infile)
+    assert state["offset"] == 1000
+    assert state["rows"] == 1000
+
+    # resuming skips the first page entirely
+    data = list(client.get_all(DATASET_IDENTIFIER, checkpoint=checkpoint))
+    assert len(data) == 1
+    assert not os.path.exists(checkpoint)
+    offsets = [r.qs.get("$offset") for r in adapter.request_history if r.qs]
+    assert offsets == [["0"], ["1000"], ["1000"]]
+
+    # a checkpoint for another query cannot be resumed
+    with open(checkpoint, "w") as outfile:
+        json.dump(state, outfile)
+    with pytest.raises(Exception, match="different query"):
+        list(client.get_all(DATASET_IDENTIFIER, checkpoint=checkpoint, where="x=1"))
+
+    client.close()
+
+
+def test_get_all_decode_executor():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    def respond(request, context):
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        offset = int(request.qs["$offset"][0])
+        return [{"n": str(n)} for n in range(offset, min(offset + 10, 45))]
+
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    adapter.register_uri("GET", uri, json=respond)
+
+    data = list(client.get_all(DATASET_IDENTIFIER, limit=10, decode_executor=2))
+    assert [row["n"] for row in data] == [str(n) for n in range(45)]
+    # pages are requested ahead, up to the first empty one
+    offsets = [int(r.qs["$offset"][0]) for r in adapter.request_history]
+    assert offsets == [0, 10, 20, 30, 40, 50]
+
+    with pytest.raises(Exception, match="exclusive"):
+        list(client.get_all(DATASET_IDENTIFIER, adaptive=True, decode_executor=2))
+    with pytest.raises(TypeError):
+        list(client.get_all(DATASET_IDENTIFIER, decode_executor=True))
+    with pytest.raises(TypeError):
+        list(client.get_all(DATASET_IDENTIFIER, decode_executor=2, decode_depth=0))
+
+    client.close()
+
+
+def test_get_all_page_store(tmp_path):
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    setup_old_api_mock(adapter, "GET", "get_song_metadata.txt", 200)
+    setup_mock(adapter, "GET", "bike_counts_page_1.json", 200, query="$offset=0")
+    setup_mock(adapter, "GET", "bike_counts_page_2.json", 200, query="$offset=1000")
+    store = PageStore(str(tmp_path), compression="zlib")
+
+    # an interrupted read leaves nothing behind
+    response = client.get_all(DATASET_IDENTIFIER, page_store=store)
+    next(response)
+    response.close()
+    assert os.listdir(str(tmp_path)) == []
+
+    data = list(client.get_all(DATASET_IDENTIFIER, page_store=store))
+    assert len(data) == 1001
+    pages_read = len([r for r in adapter.request_history if r.qs])
+
+    # the same query is replayed from the store
+    assert list(client.get_all(DATASET_IDENTIFIER, page_store=store)) == data
+    assert len([r for r in adapter.request_history if r.qs]) == pages_read
+    with client.get_stored(DATASET_IDENTIFIER, store) as stored:
+        assert len(stored) == 2
+        assert stored.page(1) == data[1000:]
+    assert client.get_stored(DATASET_IDENTIFIER, store, where="x = 1") is None
+
+    client.close()
+
+
+def test_get_tiled():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    points = [(0, 0), (5, 5), (10, 10), (2, 7), (7, 2), (5, 1)]
+    # distinct rows with the same contents
+    lines = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [[0, 0], [10, 10]]},
+            "properties": {":id": row_id, "name": "diagonal"},
+        }
+        for row_id in ("row-1", "row-2")
+    ]
+
+    def respond(request, context):
+        context.headers["content-type"] = "application/vnd.geo+json;charset=utf-8"
+        assert request.qs["$select"] == [":id, *"]
+        where = request.qs["$where"][0]
+        north, west, south, east = [
+            float(n) for n in where.split("within_box(location, ")[1][:-1].split(", ")
+        ]
+        features = [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [x, y]},
+                "properties": {":id": "point-{}-{}".format(x, y)},
+            }
+            for x, y in points
+            if west <= x <= east and south <= y <= north
+        ] + lines
+        offset = int(request.qs["$offset"][0])
+        limit = int(request.qs["$limit"][0])
+        return {"type": "FeatureCollection", "features": features[offset:offset + limit]}
+
+    uri = "{}{}{}{}.geojson".format(
+        PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER
+    )
+    adapter.register_uri("GET", uri, json=respond)
+
+    features = list(
+        client.get_tiled(DATASET_IDENTIFIER, "location", (0, 0, 10, 10), limit=2)
+    )
+    coordinates = sorted(
+        tuple(f["geometry"]["coordinates"])
+        for f in features
+        if f["geometry"]["type"] == "Point"
+    )
+    assert coordinates == sorted(points)
+    assert [f for f in features if f["geometry"]["type"] != "Point"] == lines
+    assert len(adapter.request_history) > 4
+
+    client.close()
+
+
+def test_get_tiled_property_column():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    # the geometry is another column, and the tiles are assigned on the point property
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [50, 50]},
+        "properties": {
+            ":id": "row-1",
+            "located": {"type": "Point", "coordinates": [5, 5]},
+        },
+    }
+    uri = "{}{}{}{}.geojson".format(
+        PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER
+    )
+    adapter.register_uri(
+        "GET",
+        uri,
+        json={"type": "FeatureCollection", "features": [feature]},
+        headers={"content-type": "application/vnd.geo+json;charset=utf-8"},
+    )
+
+    features = list(client.get_tiled(DATASET_IDENTIFIER, "located", (0, 0, 10, 10)))
+    assert features == [feature]
+
+    client.close()
+
+
+def test_get_partitioned():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    def respond(request, context):
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        if "$select" in request.qs:
+            return [{"min_value": "1", "max_value": "8"}]
+        where = request.qs["$where"][0]
+        if "is null" in where:
+            return [{"n": None}]
+        low = int(where.split(">= ")[1].split(" ")[0])
+        return [{"n": str(n)} for n in range(low, low + 2)]
+
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    adapter.register_uri("GET", uri, json=respond)
+
+    data = list(
+        client.get_partitioned(DATASET_IDENTIFIER, "n", partitions=4, genre="rock")
+    )
+    assert [row["n"] for row in data] == ["1", "2", "3", "4", "5", "6", "7", "8", None]
+    # the bounds are computed over the same filters as the partitions
+    bounds_request = [r for r in adapter.request_history if "$select" in r.qs][-1]
+    assert bounds_request.qs["genre"] == ["rock"]
+    assert "$order" not in bounds_request.qs
+
+    partitions = client.get_partitioned(
+        DATASET_IDENTIFIER, "n", partitions=4, merge=False
+    )
+    assert len(partitions) == 5
+    assert partitions[0] == ("n >= 1 AND n < 3", [{"n": "1"}, {"n": "2"}])
+    assert partitions[-1] == ("n IS NULL", [{"n": None}])
+
+    client.close()
+
+
 def test_get_unicode():
     mock_adapter = {}
     mock_adapter["prefix"] = PREFIX
@@ -127,6 +485,75 @@ def test_get_datasets():
     assert len(response) == 7
 
 
+def test_get_datasets_offset():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    with open(os.path.join(TEST_DATA_PATH, "get_datasets.txt"), "r") as f:
+        results = json.load(f)["results"]
+
+    def respond(request, context):
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        offset = int(request.qs["offset"][0])
+        end = offset + int(request.qs.get("limit", [len(results)])[0])
+        return {"results": results[offset:end], "resultSetSize": len(results)}
+
+    adapter.register_uri("GET", "{}{}{}".format(PREFIX, DOMAIN, DATASETS_PATH), json=respond)
+
+    # the last page holds fewer results than the limit
+    assert len(client.datasets(limit=5, offset=5)) == 2
+    assert len(client.datasets(offset=3)) == 4
+
+    client.close()
+
+
+def test_get_many():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    setup_mock(adapter, "GET", "get_songs.txt", 200, query="$limit=10")
+    setup_mock(
+        adapter, "GET", "get_songs.txt", 200, query="$limit=2", dataset_identifier="a"
+    )
+    setup_mock(
+        adapter,
+        "GET",
+        "403_response_json.txt",
+        403,
+        reason="Forbidden",
+        dataset_identifier="forbidden",
+        query="$limit=10",
+    )
+    datasets = [DATASET_IDENTIFIER, ("a", {"limit": 2}), "forbidden"]
+    response = client.get_many(datasets, max_workers=2, limit=10)
+
+    assert inspect.isgenerator(response)
+    results = {r.dataset_identifier: r for r in response}
+    assert len(results[DATASET_IDENTIFIER].result) == 10
+    assert results[DATASET_IDENTIFIER].error is None
+    assert isinstance(results["a"].result, list)
+    assert results["forbidden"].result is None
+    assert isinstance(results["forbidden"].error, requests.exceptions.HTTPError)
+
+    setup_old_api_mock(adapter, "GET", "get_song_metadata.txt", 200)
+    with open(os.path.join(TEST_DATA_PATH, "get_song_metadata.txt")) as f:
+        expected = json.load(f)
+    metadata = list(client.get_many([DATASET_IDENTIFIER], method="get_metadata"))
+    assert metadata[0].error is None
+    assert metadata[0].result == expected
+
+    with pytest.raises(Exception):
+        client.get_many([DATASET_IDENTIFIER], method="delete")
+
+    client.close()
+
+
 def test_get_metadata_and_attachments():
     mock_adapter = {}
     mock_adapter["prefix"] = PREFIX
@@ -150,6 +577,82 @@ def test_get_metadata_and_attachments():
     client.close()
 
 
+def test_get_metadata_cache():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    path = os.path.join(TEST_DATA_PATH, "get_song_metadata.txt")
+    with open(path, "r") as response_body:
+        body = json.load(response_body)
+
+    def respond(request, context):
+        if request.headers.get("If-None-Match") == '"v1"':
+            context.status_code = 304
+            return None
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        context.headers["etag"] = '"v1"'
+        return body
+
+    uri = "{}{}{}/{}.json".format(PREFIX, DOMAIN, OLD_API_PATH, DATASET_IDENTIFIER)
+    adapter.register_uri("GET", uri, json=respond)
+
+    response = client.get_metadata(DATASET_IDENTIFIER)
+    assert response == body
+    response["name"] = "changed by the caller"
+
+    # revalidated with the server, which has no new version
+    response = client.get_metadata(DATASET_IDENTIFIER)
+    assert response == body
+    assert adapter.call_count == 2
+    assert adapter.last_request.headers["If-None-Match"] == '"v1"'
+
+    # fresh entries are served without any request
+    response = client.get_metadata(DATASET_IDENTIFIER, max_age=60)
+    assert response == body
+    assert adapter.call_count == 2
+
+    client.close()
+
+
+def test_get_metadata_cache_rows_changed():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    metadata = {"viewLastModified": 1451289003, "rowsUpdatedAt": 1451289063}
+
+    def respond(request, context):
+        # no ETag nor Last-Modified, but If-Modified-Since is honoured
+        modified = max(metadata["viewLastModified"], metadata["rowsUpdatedAt"])
+        since = request.headers.get("If-Modified-Since")
+        if since is not None and parsedate_to_datetime(since).timestamp() >= modified:
+            context.status_code = 304
+            return None
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        return dict(metadata)
+
+    uri = "{}{}{}/{}.json".format(PREFIX, DOMAIN, OLD_API_PATH, DATASET_IDENTIFIER)
+    adapter.register_uri("GET", uri, json=respond)
+
+    assert client.get_metadata(DATASET_IDENTIFIER)["rowsUpdatedAt"] == 1451289063
+    assert client.get_metadata(DATASET_IDENTIFIER)["rowsUpdatedAt"] == 1451289063
+    assert adapter.last_request.headers["If-Modified-Since"] == (
+        "Mon, 28 Dec 2015 07:51:03 GMT"
+    )
+
+    # the rows change, but not the view
+    metadata["rowsUpdatedAt"] = 1451289123
+    assert client.get_metadata(DATASET_IDENTIFIER)["rowsUpdatedAt"] == 1451289123
+    assert client.get_dataset_version(DATASET_IDENTIFIER) == 1451289123
+
+    client.close()
+
+
 def test_update_metadata():
     mock_adapter = {}
     mock_adapter["prefix"] = PREFIX
@@ -226,6 +729,36 @@ def test_upsert():
     client.close()
 
 
+def test_upsert_stream():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(
+        DOMAIN,
+        APPTOKEN,
+        username=USERNAME,
+        password=PASSWORD,
+        session_adapter=mock_adapter,
+    )
+
+    response_data = "upsert_songs.txt"
+    setup_mock(adapter, "POST", response_data, 200)
+    rows = ({"title": "Song {}".format(n), "year": "2010"} for n in range(3))
+    progress = []
+    response = client.upsert(
+        DATASET_IDENTIFIER, rows, progress=lambda b, r: progress.append((b, r))
+    )
+
+    assert isinstance(response, dict)
+    request = adapter.request_history[0]
+    body = b"".join(request.body)
+    assert request.headers["content-type"] == "application/json"
+    assert json.loads(body.decode("utf-8"))[2] == {"title": "Song 2", "year": "2010"}
+    assert progress[-1] == (len(body), 3)
+    client.close()
+
+
 def test_replace():
     mock_adapter = {}
     mock_adapter["prefix"] = PREFIX
@@ -262,6 +795,80 @@ def test_replace():
     client.close()
 
 
+def test_replace_diff():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    metadata = {
+        "rowIdentifierColumnId": 2,
+        "columns": [{"id": 1, "fieldName": "title"}, {"id": 2, "fieldName": "song_id"}],
+    }
+    current = [
+        {"song_id": "1", "title": "Hoppípolla", "year": "2005"},
+        {"song_id": "2", "title": "King of the Beach", "year": "2010"},
+        {"song_id": "3", "title": "Glósóli", "year": "2005"},
+    ]
+    headers = {"content-type": "application/json; charset=utf-8"}
+    adapter.register_uri(
+        "GET",
+        "{}{}{}/{}.json".format(PREFIX, DOMAIN, OLD_API_PATH, DATASET_IDENTIFIER),
+        json=metadata,
+        headers=headers,
+    )
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    adapter.register_uri("GET", uri, json=current, headers=headers)
+
+    sent = []
+
+    def respond(request, context):
+        rows = request.json()
+        sent.append(rows)
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        return {
+            "Rows Created": 0,
+            "Rows Updated": len([row for row in rows if ":deleted" not in row]),
+            "Rows Deleted": len([row for row in rows if ":deleted" in row]),
+            "Errors": 0,
+        }
+
+    adapter.register_uri("POST", uri, json=respond)
+    assert client.get_row_identifier(DATASET_IDENTIFIER) == "song_id"
+
+    # the payload's numbers are compared to the strings the API returns
+    payload = [
+        {"song_id": 1, "title": "Hoppípolla", "year": 2005},
+        {"song_id": 2, "title": "King of the Beach", "year": 2011},
+        {"song_id": 4, "title": "Sæglópur", "year": 2005},
+    ]
+    digests = client.row_digests(DATASET_IDENTIFIER)
+    response = client.replace_diff(
+        DATASET_IDENTIFIER, iter(payload), digests=digests, batch_size=2
+    )
+
+    assert sent == [
+        [payload[1], payload[2]],
+        [{"song_id": "3", ":deleted": True}],
+    ]
+    assert response == {
+        "Rows Created": 0,
+        "Rows Updated": 2,
+        "Rows Deleted": 1,
+        "Errors": 0,
+        "Rows Unchanged": 1,
+    }
+    assert sorted(digests) == ["1", "2", "4"]
+
+    # nothing changed since the last call
+    response = client.replace_diff(DATASET_IDENTIFIER, payload, digests=digests)
+    assert response == {"Rows Unchanged": 3}
+    assert len(sent) == 2
+
+    client.close()
+
+
 def test_delete():
     mock_adapter = {}
     mock_adapter["prefix"] = PREFIX
@@ -288,6 +895,74 @@ def test_delete():
         client.close()
 
 
+def test_upsert_rows():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    def respond(request, context):
+        rows = request.json()
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        if any(not row["year"].isdigit() for row in rows):
+            context.status_code = 400
+            context.reason = "Bad Request"
+            return {"message": "Invalid number for column year"}
+        return {"Rows Created": len(rows), "Errors": 0}
+
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    adapter.register_uri("POST", uri, json=respond)
+
+    rows = [{"song_id": str(i), "year": str(2000 + i)} for i in range(10)]
+    rows[5]["year"] = "MMV"
+    result = client.upsert_rows(DATASET_IDENTIFIER, rows, batch_size=8, max_workers=2)
+
+    assert result.counts == {"Rows Created": 9, "Errors": 0}
+    assert len(result.failures) == 1
+    assert result.failures[0].rows == [{"song_id": "5", "year": "MMV"}]
+    assert "Invalid number for column year" in str(result.failures[0].error)
+    # the batch with the bad row is split 3 times, into halves of 4, 2 and 1 rows
+    assert adapter.call_count == 2 + 2 * 3
+
+    result = client.upsert_rows(DATASET_IDENTIFIER, rows, batch_size=8, bisect=False)
+    assert result.counts == {"Rows Created": 2, "Errors": 0}
+    assert [len(failure.rows) for failure in result.failures] == [8]
+    assert adapter.call_count == 8 + 2
+
+    client.close()
+
+
+def test_delete_rows():
+    mock_adapter = {}
+    mock_adapter["prefix"] = PREFIX
+    adapter = requests_mock.Adapter()
+    mock_adapter["adapter"] = adapter
+    client = Socrata(DOMAIN, APPTOKEN, session_adapter=mock_adapter)
+
+    def respond(request, context):
+        rows = request.json()
+        context.headers["content-type"] = "application/json; charset=utf-8"
+        if {":id": 5, ":deleted": True} in rows:
+            context.status_code = 500
+            context.reason = "Internal Server Error"
+            return {"message": "Internal error"}
+        return {"Rows Deleted": len(rows), "Errors": 0}
+
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    adapter.register_uri("POST", uri, json=respond)
+
+    result = client.delete_rows(DATASET_IDENTIFIER, range(10), batch_size=3)
+
+    assert result.counts == {"Rows Deleted": 7, "Errors": 0}
+    assert len(result.failures) == 1
+    assert [row[":id"] for row in result.failures[0].rows] == [3, 4, 5]
+    assert isinstance(result.failures[0].error, requests.exceptions.HTTPError)
+    assert adapter.call_count == 4
+
+    client.close()
+
+
 def test_create():
     mock_adapter = {}
     mock_adapter["prefix"] = PREFIX
@@ -0,0 +1,83 @@
+import pytest
+
+from sodapy.soql import (
+    SQLTranslator,
+    UnsupportedQuery,
+    canonical_params,
+    canonicalize,
+    tokenize,
+)
+
+
+COLUMNS = ["artist", "title", "year", ":id"]
+
+
+def test_tokenize():
+    assert tokenize("year >= 2000 AND title = 'It''s'") == [
+        ("name", "year"),
+        ("op", ">="),
+        ("number", "2000"),
+        ("name", "AND"),
+        ("name", "title"),
+        ("op", "="),
+        ("string", "'It''s'"),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("soql", "sql"),
+    [
+        ("year > 2000", '"year" > 2000'),
+        (
+            "artist = 'ABC' or not (year between 1990 and 2000)",
+            '"artist" = \'ABC\' OR NOT ( "year" BETWEEN 1990 AND 2000 )',
+        ),
+        ("upper(title) like 'THE%'", "UPPER ( \"title\" ) LIKE 'THE%'"),
+        ("`:id` is not null", '":id" IS NOT NULL'),
+        ("year in (1990, 2000)", '"year" IN ( 1990 , 2000 )'),
+    ],
+)
+def test_translate_expression(soql, sql):
+    assert SQLTranslator(COLUMNS).expression(soql) == sql
+
+
+def test_translate_select():
+    translator = SQLTranslator(COLUMNS)
+    assert translator.select("artist, count(*), max(year), title AS name") == (
+        '"artist" AS "artist", COUNT ( * ) AS "count", MAX ( "year" ) AS "max_year",'
+        ' "title" AS "name"',
+        ["artist", "count", "max_year", "name"],
+    )
+    assert translator.order("year DESC, artist") == '"year" DESC, "artist"'
+
+
+@pytest.mark.parametrize(
+    "soql", ["within_box(location, 1, 2, 3, 4)", "genre = 'rock'", "year + 1", "a ~ b"]
+)
+def test_translate_unsupported(soql):
+    with pytest.raises(UnsupportedQuery):
+        SQLTranslator(COLUMNS).select(soql)
+
+
+@pytest.mark.parametrize(
+    "soql,canonical",
+    [
+        ("year>2000 and   artist='ABC'", "artist = 'ABC' AND year > 2000"),
+        ("ARTIST = 'ABC' AND year > 2000", "ARTIST = 'ABC' AND year > 2000"),
+        ("a between 1 and 2 and b=-3", "a BETWEEN 1 AND 2 AND b = -3"),
+        ("z = 1 or y = 2 and x = 3", "z = 1 OR y = 2 AND x = 3"),
+        ("(z = 1 or y = 2) and x in ('a','b')", "(z = 1 OR y = 2) AND x IN ('a', 'b')"),
+        ("UPPER( title ) like 'The  %'", "upper(title) LIKE 'The  %'"),
+        ("  x::number > 1 ", "x::number > 1"),
+    ],
+)
+def test_canonicalize_where(soql, canonical):
+    assert canonicalize(soql, conjunctive=True) == canonical
+
+
+def test_canonical_params():
+    assert canonical_params(
+        {"$where": "b=1 AND a=2", "$select": "COUNT(*) as n, b", "$limit": 10}
+    ) == {"$limit": 10, "$select": "count(*) AS n, b", "$where": "a = 2 AND b = 1"}
+    # the order of select and order by items is significant
+    assert canonical_params({"order": "b desc, a"}) == {"order": "b DESC, a"}
@@ -0,0 +1,76 @@
+import json
+import os.path
+import threading
+
+import pytest
+import requests_mock
+
+from sodapy import Socrata, Tracer
+from sodapy.constants import DEFAULT_API_PATH
+
+
+PREFIX = "https://"
+DOMAIN = "fakedomain.com"
+DATASET_IDENTIFIER = "songs"
+TEST_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+
+
+def test_span(tmp_path):
+    path = str(tmp_path / "trace.json")
+    with Tracer(path) as tracer:
+        with tracer.span("outer", size=1) as args:
+            with tracer.span("inner"):
+                pass
+            args["done"] = True
+
+    with open(path) as infile:
+        trace = json.load(infile)
+    events = trace["traceEvents"]
+    assert events[0]["ph"] == "M"
+    assert events[0]["args"]["name"] == threading.current_thread().name
+    inner, outer = events[1:]
+    assert (inner["name"], outer["name"]) == ("inner", "outer")
+    assert outer["ts"] <= inner["ts"]
+    assert outer["ts"] + outer["dur"] >= inner["ts"] + inner["dur"]
+    assert outer["args"] == {"size": 1, "done": True}
+
+    with pytest.raises(Exception, match="No path"):
+        Tracer().save()
+
+
+def test_trace_get_all():
+    mock_adapter = {"prefix": PREFIX, "adapter": requests_mock.Adapter()}
+    tracer = Tracer()
+    client = Socrata(
+        DOMAIN,
+        None,
+        session_adapter=mock_adapter,
+        limiter=threading.BoundedSemaphore(1),
+        tracer=tracer,
+    )
+
+    uri = "{}{}{}{}.json".format(PREFIX, DOMAIN, DEFAULT_API_PATH, DATASET_IDENTIFIER)
+    headers = {"content-type": "application/json; charset=utf-8"}
+    for offset, name in [(0, "bike_counts_page_1.json"), (1000, "bike_counts_page_2.json")]:
+        with open(os.path.join(TEST_DATA_PATH, name), "rb") as infile:
+            mock_adapter["adapter"].register_uri(
+                "GET",
+                "{}?$offset={}".format(uri, offset),
+                content=infile.read(),
+                headers=headers,
+            )
+
+    assert len(list(client.get_all(DATASET_IDENTIFIER, prefetch=1))) == 1001
+
+    spans = [event for event in tracer.to_dict()["traceEvents"] if event["ph"] == "X"]
+    names = sorted(set(event["name"] for event in spans))
+    assert names == ["body", "consume", "decode", "page", "wait"]
+    # pages are fetched on the prefetch thread, and consumed on this one
+    threads = {
+        name: set(event["tid"] for event in spans if event["name"] == name)
+        for name in names
+    }
+    assert threads["consume"] == threads["page"] == {threading.get_ident()}
+    assert threads["body"].isdisjoint(threads["consume"])
+    assert [e["args"]["rows"] for e in spans if e["name"] == "consume"] == [1000, 1]
+    client.close()
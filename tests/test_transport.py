@@ -0,0 +1,59 @@
+import json
+
+import pytest
+import requests
+
+from sodapy import Socrata
+from sodapy.transport import HttpxTransport, RequestsTransport, get_transport
+
+
+DOMAIN = "fakedomain.com"
+DATASET_IDENTIFIER = "songs"
+APPTOKEN = "FakeAppToken"
+SONGS = [{"artist": "Sigur Rós", "title": "Hoppípolla"}]
+
+
+def test_get_transport():
+    assert isinstance(get_transport(), RequestsTransport)
+    transport = RequestsTransport()
+    assert get_transport(transport) is transport
+    with pytest.raises(Exception, match="Unknown transport"):
+        get_transport("urllib3")
+
+
+def test_httpx_transport():
+    httpx = pytest.importorskip("httpx")
+
+    def handler(request):
+        headers = {"content-type": "application/json; charset=utf-8"}
+        if request.method == "POST":
+            rows = json.loads(request.read())
+            return httpx.Response(200, headers=headers, json={"Rows Created": len(rows)})
+        if request.url.params.get("$where") == "broken":
+            return httpx.Response(400, headers=headers, json={"message": "Bad query"})
+        if request.url.params.get("$where") == "slow":
+            raise httpx.ReadTimeout("timed out", request=request)
+        assert request.headers["X-App-token"] == APPTOKEN
+        return httpx.Response(200, headers=headers, json=SONGS)
+
+    transport = HttpxTransport(transport=httpx.MockTransport(handler))
+    client = Socrata(DOMAIN, APPTOKEN, transport=transport)
+    assert client.session is None
+
+    assert client.get(DATASET_IDENTIFIER) == SONGS
+    response = client.upsert(DATASET_IDENTIFIER, iter(SONGS * 3))
+    assert response == {"Rows Created": 3}
+
+    with pytest.raises(requests.exceptions.HTTPError, match="400 Client Error"):
+        client.get(DATASET_IDENTIFIER, where="broken")
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get(DATASET_IDENTIFIER, where="slow")
+
+    with pytest.raises(TypeError):
+        Socrata(
+            DOMAIN,
+            APPTOKEN,
+            transport=transport,
+            session_adapter={"prefix": "https://", "adapter": None},
+        )
+    client.close()
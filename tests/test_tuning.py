@@ -0,0 +1,34 @@
+import pytest
+
+from sodapy.tuning import PageSizeTuner
+
+
+def test_tuner_grows_while_throughput_improves():
+    tuner = PageSizeTuner(min_limit=100, max_limit=10000)
+    assert tuner.start(1000) == 1000
+    assert tuner.record(1000, 1.0, 1000) == 2000
+    assert tuner.record(2000, 1.0, 2000) == 4000
+    # no gain at 4000 rows per page: settle on the best size seen
+    assert tuner.record(4000, 2.0, 4000) == 2000
+    assert tuner.record(2000, 1.0, 2000) == 2000
+
+
+def test_tuner_stops_at_bounds():
+    tuner = PageSizeTuner(min_limit=100, max_limit=3000)
+    tuner.start(2000)
+    assert tuner.record(2000, 1.0, 1000) == 3000
+    assert tuner.record(3000, 1.0, 1000) == 3000
+
+
+def test_tuner_shrinks_on_slow_or_large_pages():
+    tuner = PageSizeTuner(min_limit=100, max_seconds=5, max_bytes=1000)
+    tuner.start(1000)
+    assert tuner.record(1000, 10.0, 10) == 500
+    assert tuner.record(500, 1.0, 5000) == 250
+    assert tuner.record_error() == 125
+    assert tuner.record_error() == 100
+
+
+def test_tuner_bounds_exception():
+    with pytest.raises(ValueError):
+        PageSizeTuner(min_limit=1000, max_limit=10)
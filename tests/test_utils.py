@@ -1,3 +1,7 @@
+from datetime import datetime
+from decimal import Decimal
+import io
+import json
 import pytest
 import requests
 import requests_mock
@@ -105,3 +109,233 @@ def test_download_file(tmp_path):
         mock.get(url, text=text)
         utils.download_file(url, str(path))
     assert path.read_text() == text
+
+
+@pytest.mark.parametrize(
+    ("low", "high", "partitions", "bounds"),
+    [
+        (1, 8, 4, [1, 3, 5, 7, 8]),
+        (5, 5, 4, [5, 5]),
+        (0.0, 1.0, 2, [0.0, 0.5, 1.0]),
+        (
+            datetime(2016, 9, 21),
+            datetime(2016, 9, 23),
+            2,
+            [datetime(2016, 9, 21), datetime(2016, 9, 22), datetime(2016, 9, 23)],
+        ),
+    ],
+)
+def test_partition_bounds(low, high, partitions, bounds):
+    assert utils.partition_bounds(low, high, partitions) == bounds
+
+
+def test_partition_where():
+    assert utils.partition_where(
+        "date", "2016-09-21T00:00:00.000", "2016-09-23T00:00:00.000", 2
+    ) == [
+        "date >= '2016-09-21T00:00:00.000' AND date < '2016-09-22T00:00:00.000'",
+        "date >= '2016-09-22T00:00:00.000' AND date <= '2016-09-23T00:00:00.000'",
+        "date IS NULL",
+    ]
+    assert utils.partition_where("n", None, None, 4) == ["n IS NULL"]
+    assert utils.partition_where("x", "0.00001", "0.00002", 1) == [
+        "x >= 0.00001 AND x <= 0.00002",
+        "x IS NULL",
+    ]
+
+
+def test_partition_where_exception():
+    with pytest.raises(Exception):
+        utils.partition_where("name", "alpha", "omega", 2)
+
+
+def test_prefetch():
+    assert list(utils.prefetch(iter(range(10)), 2)) == list(range(10))
+
+
+def test_prefetch_exception():
+    def numbers():
+        yield 1
+        raise ValueError("boom")
+
+    items = utils.prefetch(numbers(), 1)
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="boom"):
+        next(items)
+
+
+def test_prefetch_close():
+    closed = []
+
+    def numbers():
+        try:
+            for n in range(100):
+                yield n
+        finally:
+            closed.append(True)
+
+    items = utils.prefetch(numbers(), 1)
+    assert next(items) == 0
+    items.close()
+    assert closed == [True]
+
+
+def test_prefetch_each():
+    items = utils.prefetch_each((range(n) for n in range(5)), 2)
+    assert list(items) == [0, 0, 1, 0, 1, 2, 0, 1, 2, 3]
+
+
+def test_prefetch_each_close():
+    started = []
+    closed = []
+
+    def numbers(n):
+        started.append(n)
+        try:
+            for i in range(100):
+                yield i
+        finally:
+            closed.append(n)
+
+    items = utils.prefetch_each((numbers(n) for n in range(10)), 3)
+    assert next(items) == 0
+    items.close()
+    # only the iterables in progress were started, and they were all stopped
+    assert sorted(started) == [0, 1, 2]
+    assert sorted(closed) == [0, 1, 2]
+
+
+def test_iter_json_array():
+    rows = [{"a": n} for n in range(100)]
+    progress = []
+    chunks = list(
+        utils.iter_json_array(iter(rows), lambda *p: progress.append(p), chunk_size=64)
+    )
+    body = b"".join(chunks)
+    assert len(chunks) > 1
+    assert json.loads(body.decode("utf-8")) == rows
+    assert progress[-1] == (len(body), 100)
+    assert b"".join(utils.iter_json_array([])) == b"[]"
+
+
+def test_iter_file_chunks():
+    data = "a,b\n1,2\n3,4\n"
+    progress = []
+    chunks = list(
+        utils.iter_file_chunks(io.StringIO(data), lambda *p: progress.append(p), 4)
+    )
+    assert b"".join(chunks) == data.encode("utf-8")
+    assert progress[-1] == (len(data), 2)
+
+
+def test_read_ndjson():
+    data = io.StringIO('{"a": 1}\n\n{"a": 2}\n')
+    assert list(utils.read_ndjson(data)) == [{"a": 1}, {"a": 2}]
+
+
+@pytest.mark.parametrize(
+    ("content_type", "response_format"),
+    [
+        ("application/json; charset=utf-8", "json"),
+        (" Application/vnd.geo+json", "json"),
+        ("text/csv; charset=utf-8", "csv"),
+        ("application/rdf+xml", "rdf"),
+        ("text/plain", "text"),
+        ("text/html", None),
+    ],
+)
+def test_response_format(content_type, response_format):
+    assert utils.response_format(content_type) == response_format
+
+
+def test_decode_text():
+    response = requests.models.Response()
+    response._content = "Ünïcödé".encode("utf-8")
+    assert utils.decode_text(response) == "Ünïcödé"
+    response.encoding = "latin-1"
+    assert utils.decode_text(response) == "Ünïcödé".encode("utf-8").decode("latin-1")
+
+
+def test_iter_batches():
+    assert list(utils.iter_batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(utils.iter_batches([], 2)) == []
+
+
+def test_row_digest():
+    row = {"id": "1", "depth": "7.6", "located": {"latitude": "41.1"}, "felt": True}
+    same = {"felt": True, "located": {"latitude": 41.1}, "depth": 7.6, "id": 1}
+    assert utils.row_digest(row) == utils.row_digest(same)
+    # system fields and nulls are not returned by the API
+    assert utils.row_digest(row) == utils.row_digest(
+        dict(row, **{":id": "row-a7e3", "note": None})
+    )
+    assert utils.row_digest(row) != utils.row_digest(dict(row, felt="true"))
+    assert utils.row_digest(row) != utils.row_digest(dict(row, depth="7.60"))
+
+
+@pytest.mark.parametrize(
+    ("value", "normalized"),
+    [
+        (2005, "2005"),
+        (2005.0, "2005"),
+        (Decimal("2005.00"), "2005"),
+        (7.6, "7.6"),
+        (Decimal("7.60"), "7.6"),
+        (1e-05, "0.00001"),
+        (1e20, "100000000000000000000"),
+        (float("nan"), "nan"),
+        ("2005.0", "2005.0"),
+    ],
+)
+def test_normalize_value(value, normalized):
+    assert utils.normalize_value(value) == normalized
+
+
+def test_is_empty_page():
+    assert utils.is_empty_page(b"[]\n", "json")
+    assert not utils.is_empty_page(b'[{"a": "1"}]', "json")
+    assert utils.is_empty_page(b'"a","b"\n', "csv")
+    assert not utils.is_empty_page(b'"a","b"\n"1","2"\n', "csv")
+
+
+def test_decode_body():
+    assert utils.decode_body(b'[{"a": "1"}]', "json") == [{"a": "1"}]
+    assert utils.decode_body(b'"a","b"\n"1","\xe9"\n', "csv", encoding="latin-1") == [
+        ["a", "b"],
+        ["1", "é"],
+    ]
+    with pytest.raises(Exception):
+        utils.decode_body(b"", "rdf")
+
+
+def test_tile_bounds():
+    tiles = utils.tile_bounds((0, 0, 10, 4), (2, 2))
+    assert tiles == [(0, 0, 5, 2), (5, 0, 10, 2), (0, 2, 5, 4), (5, 2, 10, 4)]
+    with pytest.raises(ValueError):
+        utils.tile_bounds((10, 0, 0, 4), (2, 2))
+
+
+def test_owns_point():
+    bounds = (0, 0, 10, 4)
+    tiles = utils.tile_bounds(bounds, (2, 2))
+    for point in [(5, 2), (0, 0), (10, 4), (10, 0), (7.5, 3)]:
+        assert len([t for t in tiles if utils.owns_point(t, bounds, point)]) == 1
+    assert utils.owns_point(tiles[3], bounds, (5, 2))
+
+
+def test_feature_point():
+    point = {"type": "Point", "coordinates": [1, 2]}
+    feature = {"geometry": point, "properties": {"located": {"latitude": "4", "longitude": "3"}}}
+    assert utils.feature_point(feature, "location") == (1.0, 2.0)
+    assert utils.feature_point(feature, "located") == (3.0, 4.0)
+    line = {"type": "LineString", "coordinates": [[0, 0], [1, 1]]}
+    assert utils.feature_point({"geometry": line}, "location") is None
+
+
+def test_iter_feature_collection():
+    features = [{"type": "Feature", "geometry": None, "properties": {}}] * 3
+    encoded = b"".join(utils.iter_feature_collection(iter(features), chunk_size=10))
+    assert json.loads(encoded.decode("utf-8")) == {
+        "type": "FeatureCollection",
+        "features": features,
+    }